@@ -1,16 +1,37 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, Response
 import json
 from datetime import datetime, timedelta
 import random
 import hashlib
+import hmac
 import os
 from werkzeug.utils import secure_filename
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+import shutil
+import tempfile
+import threading
+from store import create_store
+from models import User, AttendanceRecord, PayrollRecord, LeaveRequest, payroll_gross, payroll_deductions
+import pdfs
+import payslips
+from pdf_cache import PdfCache
+from payroll_runs import PayrollRunner
+from jobs import JobQueue
+from dashboard import DashboardCounters
+from rollups import AttendanceRollups, SCOPES, PERIODS
+from json_fast import OrjsonProvider, FragmentCache, dumps_bytes
+from response_cache import ResourceVersions, ResponseCache
+from leave_ledger import LeaveLedger
+import exports
+from attendance_import import AttendanceImporter, READERS, find_employee
+from punches import PunchPipeline, Backpressure, parse_punches
+from events import EventHub
+from shared_state import LeaderElection, ChangeFollower
+from record_log import RecordLog
 
 app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'  # Change this in production
+app.json = OrjsonProvider(app)
+app.secret_key = os.environ.get('HR_SECRET_KEY', 'your-secret-key-here')  # Change this in production
 
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
@@ -21,11 +42,71 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Storage backend: 'sqlite' persists to DATABASE_PATH, 'memory' keeps everything in-process
+app.config['STORAGE_BACKEND'] = os.environ.get('HR_STORAGE_BACKEND', 'sqlite')
+app.config['DATABASE_PATH'] = os.environ.get('HR_DATABASE_PATH', 'hr_data.db')
+# With '1' the memory backend keeps attendance in typed column arrays (opt-in: less memory, slower reads)
+app.config['COLUMNAR_ATTENDANCE'] = os.environ.get('HR_COLUMNAR_ATTENDANCE', '0') == '1'
+
+# Multi-process serving (see wsgi.py): workers share the SQLite database, follow
+# each other's writes and elect one of them to run the background services
+app.config['SHARED_STATE'] = os.environ.get('HR_SHARED_STATE') == '1'
+app.config['SYNC_INTERVAL'] = float(os.environ.get('HR_SYNC_INTERVAL', 0.5))
+
+# Memory backend persistence: writes to users, attendance, payroll and leave
+# requests are logged in the RECORD_LOG directory and restored from its
+# snapshots on restart; a replica tails the log of the one process that writes
+app.config['RECORD_LOG'] = os.environ.get('HR_RECORD_LOG')
+app.config['RECORD_LOG_REPLICA'] = os.environ.get('HR_RECORD_LOG_REPLICA') == '1'
+app.config['SNAPSHOT_EVERY'] = int(os.environ.get('HR_SNAPSHOT_EVERY', 20000))
+app.config['RECORD_LOG_FSYNC'] = os.environ.get('HR_RECORD_LOG_FSYNC', 'always')
+
+# Lazy startup: restoring and seeding the data and starting the background
+# services wait for the first request instead of the import, and the dashboard
+# counters, rollups and leave ledger are computed when they are first read
+app.config['LAZY_STARTUP'] = os.environ.get('HR_LAZY_STARTUP') == '1'
+
+# Payroll runs are computed in chunks on a process pool
+app.config['PAYROLL_WORKERS'] = int(os.environ.get('HR_PAYROLL_WORKERS', os.cpu_count() or 1))
+app.config['PAYROLL_CHUNK_SIZE'] = int(os.environ.get('HR_PAYROLL_CHUNK_SIZE', 1000))
+
+# Background job workers and output folder for generated documents
+app.config['JOB_WORKERS'] = int(os.environ.get('HR_JOB_WORKERS', 2))
+app.config['GENERATED_FOLDER'] = os.environ.get('HR_GENERATED_FOLDER', 'generated')
+app.config['PDF_CACHE_FOLDER'] = os.path.join(app.config['GENERATED_FOLDER'], 'pdf_cache')
+app.config['PDF_CACHE_MAX_BYTES'] = int(os.environ.get('HR_PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Time clock: shift start and late grace period, the consolidation backlog at
+# which devices are told to back off, and the token devices authenticate with
+app.config['SHIFT_START'] = os.environ.get('HR_SHIFT_START', '09:00')
+app.config['LATE_GRACE_MINUTES'] = int(os.environ.get('HR_LATE_GRACE_MINUTES', 15))
+app.config['PUNCH_MAX_PENDING'] = int(os.environ.get('HR_PUNCH_MAX_PENDING', 20000))
+app.config['PUNCH_DEVICE_TOKEN'] = os.environ.get('HR_PUNCH_DEVICE_TOKEN')
+
+# Leave limits as JSON, e.g. {"Vacation": 20, "departments": {"Sales": {"Sick": 7}}}
+app.config['LEAVE_LIMITS'] = json.loads(os.environ.get('HR_LEAVE_LIMITS', '{}'))
+
+# In-memory cache of rendered employee API responses
+app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get('HR_RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Live event streams: events a client may fall behind before it is dropped
+app.config['EVENT_QUEUE_SIZE'] = int(os.environ.get('HR_EVENT_QUEUE_SIZE', 1000))
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# All application data lives in the indexed store
+store = create_store(app.config['STORAGE_BACKEND'], app.config['DATABASE_PATH'],
+                     shared=app.config['SHARED_STATE'], columnar=app.config['COLUMNAR_ATTENDANCE'])
+leader = LeaderElection(app.config['DATABASE_PATH'] + '.leader')
+
+record_log = None
+if app.config['RECORD_LOG']:
+    record_log = RecordLog(store, app.config['RECORD_LOG'], app.config['SNAPSHOT_EVERY'],
+                           replica=app.config['RECORD_LOG_REPLICA'], fsync=app.config['RECORD_LOG_FSYNC'])
+
 # Sample data for demonstration
-users = [
+sample_users = [
     {
         "id": 1, 
         "name": "John Doe", 
@@ -168,160 +249,292 @@ admin_users = [
     }
 ]
 
-# Payroll data with comprehensive salary details
-payroll_data = []
-for user in users:
-    for i in range(6):  # Last 6 months
-        month_date = (datetime.now() - timedelta(days=30*i)).strftime("%Y-%m")
+def seed_sample_data():
+    """Populate an empty store with demo employees, payroll and attendance"""
+    for user in sample_users:
+        store.users.add(User.from_json(user).to_json())
+
+    # Payroll data with comprehensive salary details
+    for user in store.users:
+        for i in range(6):  # Last 6 months
+            month_date = (datetime.now() - timedelta(days=30*i)).strftime("%Y-%m")
         
-        # Calculate detailed salary components
-        basic_salary = user["salary_structure"]["basic"]
-        hra = user["salary_structure"]["hra"]
-        allowances = user["salary_structure"]["allowances"]
-        overtime = random.randint(0, 5000)
-        bonus = random.randint(0, 10000) if i == 0 else 0  # Bonus only for current month
+            # Calculate detailed salary components
+            basic_salary = user["salary_structure"]["basic"]
+            hra = user["salary_structure"]["hra"]
+            allowances = user["salary_structure"]["allowances"]
+            overtime = random.randint(0, 5000)
+            bonus = random.randint(0, 10000) if i == 0 else 0  # Bonus only for current month
         
-        # Additional allowances
-        transport_allowance = random.randint(1000, 3000)
-        medical_allowance = random.randint(500, 2000)
-        food_allowance = random.randint(800, 2500)
+            # Additional allowances
+            transport_allowance = random.randint(1000, 3000)
+            medical_allowance = random.randint(500, 2000)
+            food_allowance = random.randint(800, 2500)
         
-        # Detailed deductions
-        pf_deduction = int(basic_salary * 0.12)  # 12% PF
-        esi_deduction = int((basic_salary + hra) * 0.0175)  # 1.75% ESI
-        professional_tax = 200
-        insurance_premium = random.randint(500, 1500)
-        loan_deduction = random.randint(0, 5000) if random.random() > 0.7 else 0
-        other_deductions = random.randint(0, 1000)
+            # Detailed deductions
+            pf_deduction = int(basic_salary * 0.12)  # 12% PF
+            esi_deduction = int((basic_salary + hra) * 0.0175)  # 1.75% ESI
+            professional_tax = 200
+            insurance_premium = random.randint(500, 1500)
+            loan_deduction = random.randint(0, 5000) if random.random() > 0.7 else 0
+            other_deductions = random.randint(0, 1000)
         
-        # Calculate gross and tax
-        gross_salary = (basic_salary + hra + allowances + overtime + bonus + 
-                       transport_allowance + medical_allowance + food_allowance)
-        income_tax = int(gross_salary * 0.1) if gross_salary > 30000 else int(gross_salary * 0.05)
+            # Calculate gross and tax
+            gross_salary = (basic_salary + hra + allowances + overtime + bonus + 
+                           transport_allowance + medical_allowance + food_allowance)
+            income_tax = int(gross_salary * 0.1) if gross_salary > 30000 else int(gross_salary * 0.05)
         
-        total_deductions = (pf_deduction + esi_deduction + professional_tax + 
-                          insurance_premium + loan_deduction + other_deductions + income_tax)
+            total_deductions = (pf_deduction + esi_deduction + professional_tax + 
+                              insurance_premium + loan_deduction + other_deductions + income_tax)
         
-        net_salary = gross_salary - total_deductions
+            net_salary = gross_salary - total_deductions
         
-        # Bank deposit details
-        bank_details = {
-            "account_number": f"****{random.randint(1000, 9999)}",
-            "bank_name": random.choice(["State Bank", "HDFC Bank", "ICICI Bank", "Axis Bank", "Kotak Bank"]),
-            "ifsc_code": f"SBIN000{random.randint(1000, 9999)}",
-            "deposit_date": (datetime.now() - timedelta(days=30*i + random.randint(25, 30))).strftime("%Y-%m-%d") if i > 0 else None,
-            "transaction_id": f"TXN{random.randint(100000000, 999999999)}" if i > 0 else None,
-            "deposit_status": "Deposited" if i > 0 else "Pending"
-        }
+            # Bank deposit details
+            bank_details = {
+                "account_number": f"****{random.randint(1000, 9999)}",
+                "bank_name": random.choice(["State Bank", "HDFC Bank", "ICICI Bank", "Axis Bank", "Kotak Bank"]),
+                "ifsc_code": f"SBIN000{random.randint(1000, 9999)}",
+                "deposit_date": (datetime.now() - timedelta(days=30*i + random.randint(25, 30))).strftime("%Y-%m-%d") if i > 0 else None,
+                "transaction_id": f"TXN{random.randint(100000000, 999999999)}" if i > 0 else None,
+                "deposit_status": "Deposited" if i > 0 else "Pending"
+            }
         
-        payroll_data.append({
-            "id": len(payroll_data) + 1,
-            "employee_id": user["id"],
-            "month": month_date,
-            "pay_period": f"{month_date}-01 to {month_date}-{random.randint(28, 31)}",
+            store.payroll.add(PayrollRecord(
+                employee_id=user["id"],
+                month=month_date,
+                pay_period=f"{month_date}-01 to {month_date}-{random.randint(28, 31)}",
             
-            # Earnings breakdown
-            "basic_salary": basic_salary,
-            "hra": hra,
-            "allowances": allowances,
-            "transport_allowance": transport_allowance,
-            "medical_allowance": medical_allowance,
-            "food_allowance": food_allowance,
-            "overtime": overtime,
-            "bonus": bonus,
-            "gross_salary": gross_salary,
+                # Earnings breakdown
+                basic_salary=basic_salary,
+                hra=hra,
+                allowances=allowances,
+                transport_allowance=transport_allowance,
+                medical_allowance=medical_allowance,
+                food_allowance=food_allowance,
+                overtime=overtime,
+                bonus=bonus,
+                gross_salary=gross_salary,
             
-            # Deductions breakdown
-            "pf_deduction": pf_deduction,
-            "esi_deduction": esi_deduction,
-            "professional_tax": professional_tax,
-            "insurance_premium": insurance_premium,
-            "loan_deduction": loan_deduction,
-            "other_deductions": other_deductions,
-            "income_tax": income_tax,
-            "total_deductions": total_deductions,
+                # Deductions breakdown; tax and deductions are what the
+                # payslip and the payroll reports read
+                pf_deduction=pf_deduction,
+                esi_deduction=esi_deduction,
+                professional_tax=professional_tax,
+                insurance_premium=insurance_premium,
+                loan_deduction=loan_deduction,
+                other_deductions=other_deductions,
+                income_tax=income_tax,
+                total_deductions=total_deductions,
+                tax=income_tax,
+                deductions=total_deductions - income_tax,
             
-            # Final calculation
-            "net_salary": net_salary,
-            "status": "Paid" if i > 0 else "Pending",
+                # Final calculation
+                net_salary=net_salary,
+                status="Paid" if i > 0 else "Pending",
             
-            # Bank and deposit details
-            "bank_details": bank_details,
-            "created_date": (datetime.now() - timedelta(days=30*i + 35)).strftime("%Y-%m-%d"),
-            "processed_by": "System Auto-Generated" if random.random() > 0.3 else "HR Admin",
+                # Bank and deposit details
+                bank_details=bank_details,
+                created_date=(datetime.now() - timedelta(days=30*i + 35)).strftime("%Y-%m-%d"),
+                processed_by="System Auto-Generated" if random.random() > 0.3 else "HR Admin",
             
-            # Additional metadata
-            "working_days": 22,
-            "present_days": random.randint(18, 22),
-            "leave_days": random.randint(0, 4),
-            "overtime_hours": overtime // 500 if overtime > 0 else 0,
-            "remarks": "Regular monthly salary" if bonus == 0 else "Includes performance bonus"
-        })
+                # Additional metadata
+                working_days=22,
+                present_days=random.randint(18, 22),
+                leave_days=random.randint(0, 4),
+                overtime_hours=overtime // 500 if overtime > 0 else 0,
+                remarks="Regular monthly salary" if bonus == 0 else "Includes performance bonus"
+            ).to_json())
    
 
-# Enhanced attendance data with more detailed information
-attendance_data = []
-for user in users:
-    for i in range(30):  # Last 30 days
-        date = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        status = random.choice(["Present", "Present", "Present", "Present", "Absent", "Late", "Half Day", "Work From Home"])
+    # Enhanced attendance data with more detailed information
+    for user in store.users:
+        for i in range(30):  # Last 30 days
+            date = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
+            status = random.choice(["Present", "Present", "Present", "Present", "Absent", "Late", "Half Day", "Work From Home"])
         
-        # Calculate hours based on status
-        if status == "Present":
-            hours = 8
-            check_in = "09:00"
-            check_out = "18:00"
-        elif status == "Late":
-            hours = 7.5
-            late_minutes = random.randint(15, 120)  # 15 minutes to 2 hours late
-            check_in_hour = 9 + (late_minutes // 60)
-            check_in_minute = late_minutes % 60
-            check_in = f"{check_in_hour:02d}:{check_in_minute:02d}"
-            check_out = "18:00"
-        elif status == "Half Day":
-            hours = 4
-            check_in = "09:00"
-            check_out = "13:00"
-        elif status == "Work From Home":
-            hours = 8
-            check_in = "09:30"
-            check_out = "18:30"
-        else:  # Absent
-            hours = 0
-            check_in = None
-            check_out = None
+            # Calculate hours based on status
+            if status == "Present":
+                hours = 8
+                check_in = "09:00"
+                check_out = "18:00"
+            elif status == "Late":
+                hours = 7.5
+                late_minutes = random.randint(15, 120)  # 15 minutes to 2 hours late
+                check_in_hour = 9 + (late_minutes // 60)
+                check_in_minute = late_minutes % 60
+                check_in = f"{check_in_hour:02d}:{check_in_minute:02d}"
+                check_out = "18:00"
+            elif status == "Half Day":
+                hours = 4
+                check_in = "09:00"
+                check_out = "13:00"
+            elif status == "Work From Home":
+                hours = 8
+                check_in = "09:30"
+                check_out = "18:30"
+            else:  # Absent
+                hours = 0
+                check_in = None
+                check_out = None
             
-        # Generate remarks based on status
-        remarks_options = {
-            "Present": ["On time", "Good performance", ""],
-            "Late": ["Traffic delay", "Personal emergency", "Overslept"],
-            "Absent": ["Sick leave", "Personal work", "Family emergency"],
-            "Half Day": ["Medical appointment", "Personal work", "Early leave"],
-            "Work From Home": ["Remote work", "Client meeting", "Project work"]
-        }
+            # Generate remarks based on status
+            remarks_options = {
+                "Present": ["On time", "Good performance", ""],
+                "Late": ["Traffic delay", "Personal emergency", "Overslept"],
+                "Absent": ["Sick leave", "Personal work", "Family emergency"],
+                "Half Day": ["Medical appointment", "Personal work", "Early leave"],
+                "Work From Home": ["Remote work", "Client meeting", "Project work"]
+            }
         
-        remarks = random.choice(remarks_options.get(status, [""]))
+            remarks = random.choice(remarks_options.get(status, [""]))
             
-        attendance_data.append({
-            "id": len(attendance_data) + 1,
-            "employee_id": user["id"],
-            "date": date,
-            "status": status,
-            "hours_worked": hours,
-            "check_in": check_in,
-            "check_out": check_out,
-            "remarks": remarks,
-            "created_by": "System" if random.random() > 0.3 else "HR Admin",
-            "created_date": date,
-            "overtime_hours": random.randint(0, 2) if status == "Present" and random.random() > 0.8 else 0
-        })
+            store.attendance.add(AttendanceRecord(
+                employee_id=user["id"],
+                date=date,
+                status=status,
+                hours_worked=hours,
+                check_in=check_in,
+                check_out=check_out,
+                remarks=remarks,
+                created_by="System" if random.random() > 0.3 else "HR Admin",
+                created_date=date,
+                overtime_hours=random.randint(0, 2) if status == "Present" and random.random() > 0.8 else 0
+            ).to_json())
 
-# Sample leave requests
-leave_requests = [
-    {"id": 1, "employee_id": 1, "start_date": "2024-01-15", "end_date": "2024-01-17", "type": "Vacation", "status": "Approved", "reason": "Family vacation"},
-    {"id": 2, "employee_id": 2, "start_date": "2024-01-20", "end_date": "2024-01-20", "type": "Sick", "status": "Pending", "reason": "Medical appointment"},
-    {"id": 3, "employee_id": 3, "start_date": "2024-02-01", "end_date": "2024-02-05", "type": "Personal", "status": "Approved", "reason": "Personal matters"}
-]
+    # Sample leave requests
+    for leave_request in [
+        {"id": 1, "employee_id": 1, "start_date": "2024-01-15", "end_date": "2024-01-17", "type": "Vacation", "status": "Approved", "reason": "Family vacation"},
+        {"id": 2, "employee_id": 2, "start_date": "2024-01-20", "end_date": "2024-01-20", "type": "Sick", "status": "Pending", "reason": "Medical appointment"},
+        {"id": 3, "employee_id": 3, "start_date": "2024-02-01", "end_date": "2024-02-05", "type": "Personal", "status": "Approved", "reason": "Personal matters"}
+    ]:
+        store.leave_requests.add(LeaveRequest.from_json(leave_request).to_json())
+
+def normalize_payroll_records():
+    """Give payroll records stored before tax/deductions were always written those fields"""
+    for payroll in store.payroll.all():
+        if 'tax' not in payroll or 'deductions' not in payroll:
+            normalized = PayrollRecord.from_json(payroll)
+            store.payroll.update(payroll['id'], {'tax': normalized.tax, 'deductions': normalized.deductions})
+
+def load_data():
+    """Restore the logged data, then seed an empty store and normalize old records"""
+    if record_log:
+        record_log.restore()
+        if not record_log.replica:
+            record_log.open()
+    # With several workers only the leader seeds, so demo data is created once
+    # A replica only reads what the writer logged
+    if not app.config['RECORD_LOG_REPLICA']:
+        if not store.users and (not app.config['SHARED_STATE'] or leader.try_acquire()):
+            seed_sample_data()
+        normalize_payroll_records()
+
+if not app.config['LAZY_STARTUP']:
+    load_data()
+
+job_queue = JobQueue(store, app.config['JOB_WORKERS'],
+                     poll_interval=1.0 if app.config['SHARED_STATE'] else None)
+payroll_runner = PayrollRunner(store, job_queue, app.config['PAYROLL_WORKERS'], app.config['PAYROLL_CHUNK_SIZE'])
+pdf_cache = PdfCache(app.config['PDF_CACHE_FOLDER'], app.config['PDF_CACHE_MAX_BYTES'])
+
+# Drop cached PDFs as soon as a record they were rendered from changes
+def invalidate_user_pdfs(action, old, new):
+    if old and (not new or any(old.get(f) != new.get(f) for f in pdfs.OFFER_LETTER_FIELDS)):
+        pdf_cache.invalidate(('user', old['id']))
+
+def invalidate_payroll_pdfs(action, old, new):
+    if old and (not new or any(old.get(f) != new.get(f) for f in pdfs.PAYSLIP_PAYROLL_FIELDS)):
+        pdf_cache.invalidate(('payroll', old['id']))
+
+store.users.subscribe(invalidate_user_pdfs)
+store.payroll.subscribe(invalidate_payroll_pdfs)
+
+# Dashboard numbers are maintained incrementally on every write
+dashboard_counters = DashboardCounters(store, build=not app.config['LAZY_STARTUP'])
+
+# Deltas of every write pushed to live admin dashboards over server-sent events
+event_hub = EventHub(
+    store,
+    {'attendance': (), 'leave_requests': (), 'payroll': (), 'users': ('password',)},
+    summary=lambda: dashboard_counters.snapshot(datetime.now().strftime("%Y-%m-%d")),
+    summary_on=('users', 'attendance', 'leave_requests'),
+    queue_size=app.config['EVENT_QUEUE_SIZE']
+)
+
+# Attendance reports are served from rollups maintained on every write
+attendance_rollups = AttendanceRollups(store, build=not app.config['LAZY_STARTUP'])
+
+# List endpoints return every record by default; ?limit= and ?cursor= switch
+# to keyset pages in id order and ?fields= picks the fields to return
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Raw time-clock punches are logged and consolidated into attendance in micro-batches
+punch_pipeline = PunchPipeline(store, shift_start=app.config['SHIFT_START'],
+                               grace_minutes=app.config['LATE_GRACE_MINUTES'],
+                               max_pending=app.config['PUNCH_MAX_PENDING'],
+                               shared=app.config['SHARED_STATE'])
+
+# Approved leave days per employee and year, kept current on every leave request write
+leave_ledger = LeaveLedger(store, app.config['LEAVE_LIMITS'], build=not app.config['LAZY_STARTUP'])
+
+# Employee views are cached per user until one of their records changes
+response_cache = ResponseCache(
+    ResourceVersions(store, {
+        'attendance': 'employee_id',
+        'payroll': 'employee_id',
+        'leave_requests': 'employee_id',
+        'users': 'id'
+    }),
+    app.config['RESPONSE_CACHE_MAX_BYTES']
+)
+
+# Encoded JSON of every record, so full-record lists are joined from cached fragments
+record_fragments = {
+    name: FragmentCache(getattr(store, name))
+    for name in ('users', 'attendance', 'payroll', 'leave_requests')
+}
+
+def list_response(collection, index_name=None, key=None, hidden=()):
+    """jsonify the records of a collection (or of one index key), paginated and projected"""
+    fields = [f for f in request.args.get('fields', '').split(',') if f and f not in hidden]
+    paged = 'limit' in request.args or 'cursor' in request.args
+    
+    if paged:
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+            after = int(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError:
+            return jsonify({"error": "limit and cursor must be integers"}), 400
+        if limit < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+        limit = min(limit, MAX_PAGE_SIZE)
+    
+    fragments = record_fragments.get(collection.name)
+    version = fragments.version if fragments else None
+    if not paged:
+        records = collection.all() if index_name is None else collection.find(index_name, key)
+        next_cursor = None
+    else:
+        # One extra record tells whether there is a next page
+        records = collection.page(index_name, key, after=after, limit=limit + 1)
+        next_cursor = str(records[limit - 1]['id']) if len(records) > limit else None
+        records = records[:limit]
+    
+    if fields:
+        records = [{f: record[f] for f in fields if f in record} for record in records]
+    elif hidden:
+        records = [{k: v for k, v in record.items() if k not in hidden} for record in records]
+    elif fragments:
+        items = fragments.encode_list(records, version)
+        if paged:
+            items = (b'{"items":' + items + b',"limit":' + str(limit).encode() +
+                     b',"next_cursor":' + dumps_bytes(next_cursor) + b'}')
+        return app.response_class(items + b'\n', mimetype='application/json')
+    
+    if not paged:
+        return jsonify(records)
+    return jsonify({"items": records, "next_cursor": next_cursor, "limit": limit})
 
 @app.route('/')
 def index():
@@ -362,10 +575,8 @@ def login():
         
         # Find employee by email and employee_id (removed role requirement)
         employee = None
-        for u in users:
-            if (u['email'] == username and 
-                u['password'] == hashed_password and 
-                u['employee_id'] == employee_id):
+        for u in store.users.find('email', username):
+            if u['password'] == hashed_password and u['employee_id'] == employee_id:
                 employee = u
                 break
         
@@ -389,11 +600,10 @@ def get_employee_profile():
     if 'user_type' not in session or session['user_type'] != 'employee':
         return jsonify({"error": "Unauthorized"}), 401
     
-    employee = next((u for u in users if u['id'] == session['user_id']), None)
+    employee = store.users.get(session['user_id'])
     if employee:
         # Remove password from response
-        profile = {k: v for k, v in employee.items() if k != 'password'}
-        return jsonify(profile)
+        return jsonify(User.from_json(employee).public_json())
     return jsonify({"error": "Employee not found"}), 404
 
 @app.route('/api/employee/profile', methods=['PUT'])
@@ -401,27 +611,25 @@ def update_employee_profile():
     if 'user_type' not in session or session['user_type'] != 'employee':
         return jsonify({"error": "Unauthorized"}), 401
     
-    employee = next((u for u in users if u['id'] == session['user_id']), None)
+    employee = store.users.get(session['user_id'])
     if not employee:
         return jsonify({"error": "Employee not found"}), 404
     
     data = request.get_json()
     # Allow employees to update only certain fields
     updatable_fields = ['phone', 'address', 'profile_photo']
-    for field in updatable_fields:
-        if field in data:
-            employee[field] = data[field]
+    store.users.update(employee['id'], {field: data[field] for field in updatable_fields if field in data})
     
     return jsonify({"success": True, "message": "Profile updated successfully"})
 
 # Employee attendance endpoints
 @app.route('/api/employee/attendance', methods=['GET'])
+@response_cache.cached('attendance')
 def get_employee_attendance():
     if 'user_type' not in session or session['user_type'] != 'employee':
         return jsonify({"error": "Unauthorized"}), 401
     
-    employee_attendance = [a for a in attendance_data if a['employee_id'] == session['user_id']]
-    return jsonify(employee_attendance)
+    return list_response(store.attendance, 'employee_id', session['user_id'])
 
 # Employee leave requests endpoints
 @app.route('/api/employee/leave-requests', methods=['GET'])
@@ -429,7 +637,7 @@ def get_employee_leave_requests():
     if 'user_type' not in session or session['user_type'] != 'employee':
         return jsonify({"error": "Unauthorized"}), 401
     
-    employee_leaves = [r for r in leave_requests if r['employee_id'] == session['user_id']]
+    employee_leaves = store.leave_requests.find('employee_id', session['user_id'])
     return jsonify(employee_leaves)
 
 @app.route('/api/employee/leave-requests', methods=['POST'])
@@ -447,44 +655,57 @@ def submit_employee_leave_request():
     end_dt = datetime.strptime(end_date, '%Y-%m-%d')
     leave_days = (end_dt - start_dt).days + 1
     
-    # Check leave balance
-    balance_response = get_employee_leave_balance()
-    balance_data = balance_response.get_json()
+    # Check leave balance for the year the leave starts in
+    remaining_leaves = leave_ledger.balance(session['user_id'], start_dt.year)['remaining_leaves']
     
-    if leave_type not in balance_data['remaining_leaves']:
+    if leave_type not in remaining_leaves:
         return jsonify({"error": "Invalid leave type"}), 400
     
-    remaining = balance_data['remaining_leaves'][leave_type]
+    remaining = remaining_leaves[leave_type]
     
     # Determine if leave will be paid or unpaid
     paid_days = min(leave_days, remaining)
     unpaid_days = max(0, leave_days - remaining)
     
-    new_request = {
-        "id": len(leave_requests) + 1,
-        "employee_id": session['user_id'],
-        "start_date": start_date,
-        "end_date": end_date,
-        "type": leave_type,
-        "status": "Pending",
-        "reason": data.get('reason', ''),
-        "applied_date": datetime.now().strftime("%Y-%m-%d"),
-        "total_days": leave_days,
-        "paid_days": paid_days,
-        "unpaid_days": unpaid_days
-    }
-    leave_requests.append(new_request)
+    new_request = LeaveRequest(
+        employee_id=session['user_id'],
+        start_date=start_date,
+        end_date=end_date,
+        type=leave_type,
+        reason=data.get('reason', ''),
+        applied_date=datetime.now().strftime("%Y-%m-%d"),
+        total_days=leave_days,
+        paid_days=paid_days,
+        unpaid_days=unpaid_days
+    ).to_json()
+    store.leave_requests.add(new_request)
     return jsonify(new_request), 201
 
 # Employee payroll endpoints
 @app.route('/api/employee/payroll', methods=['GET'])
+@response_cache.cached('payroll')
 def get_employee_payroll():
     if 'user_type' not in session or session['user_type'] != 'employee':
         return jsonify({"error": "Unauthorized"}), 401
     
-    employee_payroll = [p for p in payroll_data if p['employee_id'] == session['user_id']]
+    employee_payroll = store.payroll.find('employee_id', session['user_id'])
     return jsonify(employee_payroll)
 
+def week_of_attendance(employee_id, start_date):
+    """Attendance for the 7 days from start_date, with a "No Record" entry for days without one"""
+    days = [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
+    by_date = {}
+    for record in store.attendance.find_range('employee_date', days[0], days[-1], prefix=(employee_id,)):
+        by_date.setdefault(record['date'], record)
+    return [by_date.get(day) or {
+        "employee_id": employee_id,
+        "date": day,
+        "status": "No Record",
+        "hours_worked": 0,
+        "check_in": None,
+        "check_out": None
+    } for day in days]
+
 # Weekly attendance endpoint
 @app.route('/api/employee/attendance/weekly', methods=['GET'])
 def get_employee_weekly_attendance():
@@ -492,27 +713,8 @@ def get_employee_weekly_attendance():
         return jsonify({"error": "Unauthorized"}), 401
     
     # Get last 7 days attendance
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=6)
-    
-    weekly_attendance = []
-    for i in range(7):
-        current_date = (start_date + timedelta(days=i)).strftime("%Y-%m-%d")
-        attendance_record = next((a for a in attendance_data if a['employee_id'] == session['user_id'] and a['date'] == current_date), None)
-        
-        if attendance_record:
-            weekly_attendance.append(attendance_record)
-        else:
-            weekly_attendance.append({
-                "employee_id": session['user_id'],
-                "date": current_date,
-                "status": "No Record",
-                "hours_worked": 0,
-                "check_in": None,
-                "check_out": None
-            })
-    
-    return jsonify(weekly_attendance)
+    start_date = datetime.now() - timedelta(days=6)
+    return jsonify(week_of_attendance(session['user_id'], start_date))
 
 # Document upload endpoints
 @app.route('/api/employee/upload-document', methods=['POST'])
@@ -538,19 +740,38 @@ def upload_employee_document():
         file.save(file_path)
         
         # Update employee document record
-        employee = next((u for u in users if u['id'] == session['user_id']), None)
+        employee = store.users.get(session['user_id'])
         if employee:
+            documents = dict(employee['documents'])
             if document_type == 'resume':
-                employee['documents']['resume'] = filename
+                documents['resume'] = filename
             elif document_type == 'certificates':
-                if 'certificates' not in employee['documents']:
-                    employee['documents']['certificates'] = []
-                employee['documents']['certificates'].append(filename)
+                documents['certificates'] = documents.get('certificates', []) + [filename]
+            store.users.update(employee['id'], {'documents': documents})
         
         return jsonify({"success": True, "filename": filename, "message": f"{document_type.title()} uploaded successfully"})
     
     return jsonify({"error": "Invalid file type"}), 400
 
+def send_cached_pdf(key, render, owners, download_name):
+    """Send a cached PDF, using its content key as ETag so repeat downloads get a 304"""
+    if key in request.if_none_match:
+        response = Response(status=304)
+    else:
+        data = pdf_cache.get(key)
+        if data is None:
+            data = render()
+            pdf_cache.put(key, data, owners)
+        response = send_file(
+            io.BytesIO(data),
+            as_attachment=True,
+            download_name=download_name,
+            mimetype='application/pdf'
+        )
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 # Download salary slip
 @app.route('/api/employee/download-payslip/<int:payroll_id>')
 def download_payslip(payroll_id):
@@ -558,84 +779,21 @@ def download_payslip(payroll_id):
         return jsonify({"error": "Unauthorized"}), 401
     
     # Find payroll record
-    payroll = next((p for p in payroll_data if p['id'] == payroll_id and p['employee_id'] == session['user_id']), None)
-    if not payroll:
+    payroll = store.payroll.get(payroll_id)
+    if not payroll or payroll['employee_id'] != session['user_id']:
         return jsonify({"error": "Payroll record not found"}), 404
     
-    employee = next((u for u in users if u['id'] == session['user_id']), None)
+    employee = store.users.get(session['user_id'])
     if not employee:
         return jsonify({"error": "Employee not found"}), 404
     
-    # Generate PDF payslip
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Header
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, height - 50, "PAYSLIP")
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 80, f"Employee: {employee['name']}")
-    p.drawString(50, height - 100, f"Employee ID: {employee['employee_id']}")
-    p.drawString(50, height - 120, f"Month: {payroll['month']}")
-    p.drawString(50, height - 140, f"Department: {employee['department']}")
-    
-    # Earnings
-    y_pos = height - 180
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, y_pos, "EARNINGS")
-    y_pos -= 30
-    
-    p.setFont("Helvetica", 12)
-    earnings = [
-        ("Basic Salary", payroll['basic_salary']),
-        ("HRA", payroll['hra']),
-        ("Allowances", payroll['allowances']),
-        ("Overtime", payroll['overtime']),
-        ("Bonus", payroll['bonus'])
-    ]
-    
-    total_earnings = 0
-    for item, amount in earnings:
-        p.drawString(50, y_pos, item)
-        p.drawString(300, y_pos, f"${amount:,.2f}")
-        total_earnings += amount
-        y_pos -= 20
-    
-    # Deductions
-    y_pos -= 20
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, y_pos, "DEDUCTIONS")
-    y_pos -= 30
-    
-    p.setFont("Helvetica", 12)
-    deductions = [
-        ("Tax", payroll['tax']),
-        ("Other Deductions", payroll['deductions'])
-    ]
-    
-    total_deductions = 0
-    for item, amount in deductions:
-        p.drawString(50, y_pos, item)
-        p.drawString(300, y_pos, f"${amount:,.2f}")
-        total_deductions += amount
-        y_pos -= 20
-    
-    # Net Salary
-    y_pos -= 30
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, y_pos, "NET SALARY")
-    p.drawString(300, y_pos, f"${payroll['net_salary']:,.2f}")
-    
-    p.showPage()
-    p.save()
-    
-    buffer.seek(0)
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=f"payslip_{employee['employee_id']}_{payroll['month']}.pdf",
-        mimetype='application/pdf'
+    # Serve the payslip from the PDF cache, rendering it only when its inputs changed
+    fields = pdfs.payslip_fields(employee, payroll)
+    return send_cached_pdf(
+        payslips.payslip_key(fields),
+        lambda: pdfs.PAYSLIP_TEMPLATE.render(fields),
+        [('payroll', payroll['id']), ('user', employee['id'])],
+        f"payslip_{employee['employee_id']}_{payroll['month']}.pdf"
     )
 
 # Download offer letter
@@ -644,65 +802,26 @@ def download_offer_letter():
     if 'user_type' not in session or session['user_type'] != 'employee':
         return jsonify({"error": "Unauthorized"}), 401
     
-    employee = next((u for u in users if u['id'] == session['user_id']), None)
+    employee = store.users.get(session['user_id'])
     if not employee or not employee['documents'].get('offer_letter'):
         return jsonify({"error": "Offer letter not found"}), 404
     
-    # Generate offer letter PDF
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Header
-    p.setFont("Helvetica-Bold", 18)
-    p.drawString(50, height - 50, "OFFER LETTER")
-    
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 100, f"Date: {employee['hire_date']}")
-    p.drawString(50, height - 130, f"Dear {employee['name']},")
-    
-    # Content
-    content = [
-        "",
-        "We are pleased to offer you the position of " + employee['role'],
-        "in the " + employee['department'] + " department.",
-        "",
-        "Your starting salary will be $" + f"{employee['salary']:,}" + " per annum.",
-        "",
-        "We look forward to having you join our team.",
-        "",
-        "Sincerely,",
-        "HR Department"
-    ]
-    
-    y_pos = height - 160
-    for line in content:
-        p.drawString(50, y_pos, line)
-        y_pos -= 20
-    
-    p.showPage()
-    p.save()
-    
-    buffer.seek(0)
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=f"offer_letter_{employee['employee_id']}.pdf",
-        mimetype='application/pdf'
+    # Serve the offer letter from the PDF cache
+    return send_cached_pdf(
+        payslips.offer_letter_key(pdfs.offer_letter_fields(employee)),
+        lambda: pdfs.render_offer_letter(employee),
+        [('user', employee['id'])],
+        f"offer_letter_{employee['employee_id']}.pdf"
     )
 
 @app.route('/api/users', methods=['GET'])
 def get_users():
     if 'user_type' in session and session['user_type'] == 'admin':
         # Admin gets full details including salary
-        return jsonify(users)
+        return list_response(store.users)
     else:
         # Non-admin gets limited info
-        limited_users = []
-        for user in users:
-            limited_user = {k: v for k, v in user.items() if k not in ['password', 'salary', 'salary_structure']}
-            limited_users.append(limited_user)
-        return jsonify(limited_users)
+        return list_response(store.users, hidden=('password', 'salary', 'salary_structure'))
 
 # Admin endpoint to view employee documents
 @app.route('/api/admin/employee-documents/<int:employee_id>')
@@ -710,7 +829,7 @@ def get_employee_documents(employee_id):
     if 'user_type' not in session or session['user_type'] != 'admin':
         return jsonify({"error": "Unauthorized"}), 401
     
-    employee = next((u for u in users if u['id'] == employee_id), None)
+    employee = store.users.get(employee_id)
     if not employee:
         return jsonify({"error": "Employee not found"}), 404
     
@@ -726,12 +845,12 @@ def get_salary_details(employee_id):
     if 'user_type' not in session or session['user_type'] != 'admin':
         return jsonify({"error": "Unauthorized"}), 401
     
-    employee = next((u for u in users if u['id'] == employee_id), None)
+    employee = store.users.get(employee_id)
     if not employee:
         return jsonify({"error": "Employee not found"}), 404
     
     # Get recent payroll data
-    employee_payroll = [p for p in payroll_data if p['employee_id'] == employee_id]
+    employee_payroll = store.payroll.find('employee_id', employee_id)
     
     return jsonify({
         "employee_id": employee_id,
@@ -747,85 +866,44 @@ def get_employee_weekly_attendance_admin(employee_id):
     if 'user_type' not in session or session['user_type'] != 'admin':
         return jsonify({"error": "Unauthorized"}), 401
     
-    employee = next((u for u in users if u['id'] == employee_id), None)
+    employee = store.users.get(employee_id)
     if not employee:
         return jsonify({"error": "Employee not found"}), 404
     
     # Get last 7 days attendance
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=6)
-    
-    weekly_attendance = []
-    for i in range(7):
-        current_date = (start_date + timedelta(days=i)).strftime("%Y-%m-%d")
-        attendance_record = next((a for a in attendance_data if a['employee_id'] == employee_id and a['date'] == current_date), None)
-        
-        if attendance_record:
-            weekly_attendance.append(attendance_record)
-        else:
-            weekly_attendance.append({
-                "employee_id": employee_id,
-                "date": current_date,
-                "status": "No Record",
-                "hours_worked": 0,
-                "check_in": None,
-                "check_out": None
-            })
+    start_date = datetime.now() - timedelta(days=6)
     
     return jsonify({
         "employee_name": employee['name'],
         "employee_id": employee['employee_id'],
-        "weekly_attendance": weekly_attendance
+        "weekly_attendance": week_of_attendance(employee_id, start_date),
+        "summary": attendance_rollups.range_stats('employee', employee_id, start_date.strftime("%Y-%m-%d"), 7)
     })
 
 # Get employee leave balance
 @app.route('/api/employee/leave-balance')
+@response_cache.cached('leave_requests', 'users', vary=lambda: datetime.now().year)
 def get_employee_leave_balance():
     if 'user_type' not in session or session['user_type'] != 'employee':
         return jsonify({"error": "Unauthorized"}), 401
     
-    # Calculate used leaves for current year
-    current_year = datetime.now().year
-    employee_leaves = [r for r in leave_requests if r['employee_id'] == session['user_id']]
-    
-    # Count approved leaves by type for current year
-    used_leaves = {
-        "Sick": 0,
-        "Emergency": 0,
-        "Vacation": 0
-    }
-    
-    for leave in employee_leaves:
-        if leave['status'] == 'Approved':
-            start_date = datetime.strptime(leave['start_date'], '%Y-%m-%d')
-            if start_date.year == current_year:
-                leave_type = leave['type']
-                if leave_type in used_leaves:
-                    end_date = datetime.strptime(leave['end_date'], '%Y-%m-%d')
-                    days = (end_date - start_date).days + 1
-                    used_leaves[leave_type] += days
-    
-    # Leave limits
-    leave_limits = {
-        "Sick": 5,
-        "Emergency": 3,
-        "Vacation": 15
-    }
+    return jsonify(leave_ledger.balance(session['user_id']))
+
+# Admin view of any employee's leave balance, optionally for another ?year=
+@app.route('/api/admin/leave-balance/<int:employee_id>')
+def get_employee_leave_balance_admin(employee_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
     
-    # Calculate remaining leaves
-    remaining_leaves = {}
-    for leave_type, limit in leave_limits.items():
-        remaining_leaves[leave_type] = max(0, limit - used_leaves[leave_type])
+    if not store.users.get(employee_id):
+        return jsonify({"error": "Employee not found"}), 404
     
-    return jsonify({
-        "leave_limits": leave_limits,
-        "used_leaves": used_leaves,
-        "remaining_leaves": remaining_leaves
-    })
+    year = request.args.get('year', datetime.now().year, type=int)
+    return jsonify({"employee_id": employee_id, "year": year, **leave_ledger.balance(employee_id, year)})
 
 @app.route('/api/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
-    user = next((u for u in users if u['id'] == user_id), None)
+    user = store.users.get(user_id)
     if user:
         return jsonify(user)
     return jsonify({"error": "User not found"}), 404
@@ -836,58 +914,53 @@ def add_user():
         return jsonify({"error": "Unauthorized"}), 401
         
     data = request.get_json()
-    new_user = {
-        "id": len(users) + 1,
-        "name": data.get('name'),
-        "email": data.get('email'),
-        "password": hashlib.md5("password123".encode()).hexdigest(),  # Default password
-        "role": data.get('role'),
-        "department": data.get('department', 'General'),
-        "salary": data.get('salary', 50000),
-        "hire_date": data.get('hire_date', datetime.now().strftime("%Y-%m-%d")),
-        "status": "Active",
-        "phone": data.get('phone', ''),
-        "address": data.get('address', ''),
-        "employee_id": f"EMP{len(users) + 1:03d}",
-        "profile_photo": None,
-        "documents": {
-            "resume": None,
-            "certificates": [],
-            "offer_letter": None
-        },
-        "salary_structure": {
-            "basic": int(data.get('salary', 50000) * 0.6),
-            "hra": int(data.get('salary', 50000) * 0.2),
-            "allowances": int(data.get('salary', 50000) * 0.15),
-            "deductions": int(data.get('salary', 50000) * 0.05)
+    user_id = store.users.next_id()
+    salary = data.get('salary', 50000)
+    new_user = User(
+        id=user_id,
+        name=data.get('name'),
+        email=data.get('email'),
+        password=hashlib.md5("password123".encode()).hexdigest(),  # Default password
+        role=data.get('role'),
+        department=data.get('department', 'General'),
+        salary=salary,
+        hire_date=data.get('hire_date', datetime.now().strftime("%Y-%m-%d")),
+        phone=data.get('phone', ''),
+        address=data.get('address', ''),
+        employee_id=f"EMP{user_id:03d}",
+        salary_structure={
+            "basic": int(salary * 0.6),
+            "hra": int(salary * 0.2),
+            "allowances": int(salary * 0.15),
+            "deductions": int(salary * 0.05)
         }
-    }
-    users.append(new_user)
+    ).to_json()
+    store.users.add(new_user)
     return jsonify(new_user), 201
 
 @app.route('/api/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
-    user = next((u for u in users if u['id'] == user_id), None)
+    user = store.users.get(user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
     
     data = request.get_json()
-    user.update({
-        "name": data.get('name', user['name']),
-        "email": data.get('email', user['email']),
-        "role": data.get('role', user['role']),
-        "department": data.get('department', user['department']),
-        "salary": data.get('salary', user['salary']),
-        "phone": data.get('phone', user['phone']),
-        "address": data.get('address', user['address']),
-        "status": data.get('status', user['status'])
+    user = User.from_json(user)
+    user = store.users.update(user_id, {
+        "name": data.get('name', user.name),
+        "email": data.get('email', user.email),
+        "role": data.get('role', user.role),
+        "department": data.get('department', user.department),
+        "salary": data.get('salary', user.salary),
+        "phone": data.get('phone', user.phone),
+        "address": data.get('address', user.address),
+        "status": data.get('status', user.status)
     })
     return jsonify(user)
 
 @app.route('/api/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
-    global users
-    users = [user for user in users if user['id'] != user_id]
+    store.users.delete(user_id)
     return jsonify({"message": "User deleted successfully"})
 
 # Attendance endpoints
@@ -895,101 +968,81 @@ def delete_user(user_id):
 def get_attendance():
     employee_id = request.args.get('employee_id')
     if employee_id:
-        filtered_data = [a for a in attendance_data if a['employee_id'] == int(employee_id)]
-        return jsonify(filtered_data)
-    return jsonify(attendance_data)
-
-@app.route('/api/attendance', methods=['POST'])
-def add_attendance():
-    data = request.get_json()
-    new_attendance = {
-        "employee_id": data.get('employee_id'),
-        "date": data.get('date'),
-        "status": data.get('status'),
-        "hours_worked": data.get('hours_worked', 8)
-    }
-    attendance_data.append(new_attendance)
-    return jsonify(new_attendance), 201
+        return list_response(store.attendance, 'employee_id', int(employee_id))
+    return list_response(store.attendance)
 
 # Leave requests endpoints
 @app.route('/api/leave-requests', methods=['GET'])
 def get_leave_requests():
-    return jsonify(leave_requests)
+    return list_response(store.leave_requests)
 
 @app.route('/api/leave-requests', methods=['POST'])
 def add_leave_request():
     data = request.get_json()
-    new_request = {
-        "id": len(leave_requests) + 1,
-        "employee_id": data.get('employee_id'),
-        "start_date": data.get('start_date'),
-        "end_date": data.get('end_date'),
-        "type": data.get('type'),
-        "status": "Pending",
-        "reason": data.get('reason', '')
-    }
-    leave_requests.append(new_request)
+    new_request = LeaveRequest(
+        employee_id=data.get('employee_id'),
+        start_date=data.get('start_date'),
+        end_date=data.get('end_date'),
+        type=data.get('type'),
+        reason=data.get('reason', '')
+    ).to_json()
+    store.leave_requests.add(new_request)
     return jsonify(new_request), 201
 
 @app.route('/api/leave-requests/<int:request_id>', methods=['PUT'])
 def update_leave_request(request_id):
-    leave_request = next((r for r in leave_requests if r['id'] == request_id), None)
+    leave_request = store.leave_requests.get(request_id)
     if not leave_request:
         return jsonify({"error": "Leave request not found"}), 404
     
     data = request.get_json()
-    leave_request['status'] = data.get('status', leave_request['status'])
+    leave_request = store.leave_requests.update(request_id, {'status': data.get('status', leave_request['status'])})
     return jsonify(leave_request)
 
 # Reports endpoints
 @app.route('/api/reports/dashboard', methods=['GET'])
 def get_dashboard_stats():
-    total_employees = len(users)
-    active_employees = len([u for u in users if u['status'] == 'Active'])
-    departments = list(set([u['department'] for u in users]))
-    avg_salary = sum([u['salary'] for u in users]) / len(users) if users else 0
+    return jsonify(dashboard_counters.snapshot(datetime.now().strftime("%Y-%m-%d")))
+
+# Live dashboard updates: attendance, leave, payroll and employee deltas plus
+# the dashboard numbers, as server-sent events. Reconnecting clients resume
+# from Last-Event-ID; a client that falls behind gets a reset event.
+@app.route('/api/events/stream', methods=['GET'])
+def stream_events():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
     
-    # Recent attendance summary
-    recent_attendance = [a for a in attendance_data if a['date'] >= (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")]
-    present_today = len([a for a in recent_attendance if a['status'] == 'Present' and a['date'] == datetime.now().strftime("%Y-%m-%d")])
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = event_hub.subscribe(last_event_id)
+    response = Response(event_hub.stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Verify the materialized dashboard counters against the raw data
+@app.route('/api/admin/dashboard/check', methods=['GET'])
+def check_dashboard_counters():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
     
-    return jsonify({
-        "total_employees": total_employees,
-        "active_employees": active_employees,
-        "departments": len(departments),
-        "avg_salary": round(avg_salary, 2),
-        "present_today": present_today,
-        "pending_leaves": len([r for r in leave_requests if r['status'] == 'Pending'])
-    })
+    differences = dashboard_counters.check()
+    return jsonify({"consistent": not differences, "differences": differences})
+
+@app.route('/api/admin/dashboard/rebuild', methods=['POST'])
+def rebuild_dashboard_counters():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    dashboard_counters.rebuild()
+    return jsonify({"message": "Dashboard counters rebuilt"})
 
 @app.route('/api/reports/attendance', methods=['GET'])
 def get_attendance_report():
-    # Group attendance by employee
-    employee_attendance = {}
-    for attendance in attendance_data:
-        emp_id = attendance['employee_id']
-        if emp_id not in employee_attendance:
-            employee_attendance[emp_id] = {
-                "present": 0,
-                "absent": 0,
-                "late": 0,
-                "total_hours": 0
-            }
-        
-        status = attendance['status']
-        if status == 'Present':
-            employee_attendance[emp_id]['present'] += 1
-        elif status == 'Absent':
-            employee_attendance[emp_id]['absent'] += 1
-        elif status == 'Late':
-            employee_attendance[emp_id]['late'] += 1
-        
-        employee_attendance[emp_id]['total_hours'] += attendance['hours_worked']
-    
-    # Add employee names
     report = []
-    for emp_id, stats in employee_attendance.items():
-        employee = next((u for u in users if u['id'] == emp_id), None)
+    employee_attendance = attendance_rollups.buckets('employee', 'all')
+    for emp_id in sorted(employee_attendance, key=lambda e: (e is None, e)):
+        stats = employee_attendance[emp_id]
+        employee = store.users.get(emp_id)
         if employee:
             total_days = stats['present'] + stats['absent'] + stats['late']
             attendance_rate = (stats['present'] / total_days * 100) if total_days > 0 else 0
@@ -997,17 +1050,49 @@ def get_attendance_report():
                 "employee_name": employee['name'],
                 "department": employee['department'],
                 "attendance_rate": round(attendance_rate, 1),
-                "total_hours": stats['total_hours'],
-                **stats
+                "total_hours": round(stats['hours'], 2),
+                "present": stats['present'],
+                "absent": stats['absent'],
+                "late": stats['late']
             })
     
     return jsonify(report)
 
+# Raw rollup buckets, e.g. ?scope=department&period=month&key=2024-01
+@app.route('/api/reports/attendance/rollups', methods=['GET'])
+def get_attendance_rollups():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    scope = request.args.get('scope', 'department')
+    period = request.args.get('period', 'month')
+    if scope not in SCOPES or period not in PERIODS:
+        return jsonify({"error": f"scope must be one of {', '.join(SCOPES)} and period one of {', '.join(PERIODS)}"}), 400
+    key = request.args.get('key') if period != 'all' else None
+    if period != 'all' and not key:
+        return jsonify({"error": "key is required for this period"}), 400
+    
+    buckets = attendance_rollups.buckets(scope, period, key)
+    return jsonify({
+        "scope": scope,
+        "period": period,
+        "key": key,
+        "buckets": [{"id": scope_id, **stats} for scope_id, stats in buckets.items()]
+    })
+
+@app.route('/api/admin/rollups/rebuild', methods=['POST'])
+def rebuild_attendance_rollups():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    attendance_rollups.rebuild()
+    return jsonify({"message": "Attendance rollups rebuilt"})
+
 @app.route('/api/reports/salary', methods=['GET'])
 def get_salary_report():
     # Group by department
     dept_salaries = {}
-    for user in users:
+    for user in store.users:
         dept = user['department']
         if dept not in dept_salaries:
             dept_salaries[dept] = []
@@ -1026,15 +1111,12 @@ def get_salary_report():
     
     return jsonify(report)
 
-if __name__ == '__main__':
-    app.run(debug=True)
-
 # Payroll endpoints (Admin only)
 @app.route('/api/payroll', methods=['GET'])
 def get_payroll():
     if 'user_type' not in session or session['user_type'] != 'admin':
         return jsonify({"error": "Unauthorized"}), 401
-    return jsonify(payroll_data)
+    return list_response(store.payroll)
 
 @app.route('/api/payroll', methods=['POST'])
 def add_payroll():
@@ -1042,21 +1124,13 @@ def add_payroll():
         return jsonify({"error": "Unauthorized"}), 401
         
     data = request.get_json()
-    new_payroll = {
-        "id": len(payroll_data) + 1,
-        "employee_id": data.get('employee_id'),
-        "month": data.get('month'),
-        "basic_salary": data.get('basic_salary'),
-        "hra": data.get('hra'),
-        "allowances": data.get('allowances'),
-        "overtime": data.get('overtime', 0),
-        "bonus": data.get('bonus', 0),
-        "deductions": data.get('deductions'),
-        "tax": data.get('tax'),
-        "net_salary": data.get('net_salary'),
-        "status": "Pending"
-    }
-    payroll_data.append(new_payroll)
+    # Amounts left out (or null) take the model defaults, so totals can always be summed
+    fields = ('employee_id', 'month', 'basic_salary', 'hra', 'allowances', 'overtime',
+              'bonus', 'deductions', 'tax', 'net_salary')
+    new_payroll = PayrollRecord.from_json({
+        name: data[name] for name in fields if data.get(name) is not None
+    }).to_json()
+    store.payroll.add(new_payroll)
     return jsonify(new_payroll), 201
 
 @app.route('/api/payroll/<int:payroll_id>', methods=['PUT'])
@@ -1064,12 +1138,18 @@ def update_payroll(payroll_id):
     if 'user_type' not in session or session['user_type'] != 'admin':
         return jsonify({"error": "Unauthorized"}), 401
         
-    payroll = next((p for p in payroll_data if p['id'] == payroll_id), None)
+    payroll = store.payroll.get(payroll_id)
     if not payroll:
         return jsonify({"error": "Payroll record not found"}), 404
     
     data = request.get_json()
-    payroll.update(data)
+    record = dict(payroll, **data)
+    # Edits in the detailed layout (income_tax, total_deductions) carry over to tax and deductions
+    if not {'tax', 'deductions'} & data.keys() and {'income_tax', 'total_deductions'} & data.keys():
+        record.pop('tax', None)
+        record.pop('deductions', None)
+    record = PayrollRecord.from_json(record)
+    payroll = store.payroll.update(payroll_id, dict(data, tax=record.tax, deductions=record.deductions))
     return jsonify(payroll)
 
 # Test endpoint for payroll generation
@@ -1079,122 +1159,83 @@ def test_payroll_generation():
         return jsonify({'error': 'Unauthorized'}), 401
     
     return jsonify({
-        'users_count': len(users),
-        'active_users': len([u for u in users if u.get('status') == 'Active']),
-        'users_with_salary': len([u for u in users if u.get('salary')]),
-        'current_payroll_count': len(payroll_data),
-        'sample_user': users[0] if users else None
+        'users_count': len(store.users),
+        'active_users': store.users.count('status', 'Active'),
+        'users_with_salary': len([u for u in store.users if u.get('salary')]),
+        'current_payroll_count': len(store.payroll),
+        'sample_user': store.users.all()[0] if store.users else None
     })
 
+# Record counts per collection, with the heap footprint of columnar ones
+@app.route('/api/admin/storage', methods=['GET'])
+def get_storage_usage():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    collections = {}
+    for name in ('users', 'attendance', 'payroll', 'leave_requests', 'jobs', 'punches'):
+        collection = getattr(store, name)
+        usage = getattr(collection, 'memory_usage', None)
+        collections[name] = usage() if usage else {'records': len(collection)}
+    return jsonify({'backend': app.config['STORAGE_BACKEND'], 'collections': collections})
+
 # Auto-generate payroll for all employees
 @app.route('/api/admin/generate-payroll', methods=['POST'])
 def generate_monthly_payroll():
-    print("Payroll generation endpoint called")
-    
     if 'user_type' not in session or session['user_type'] != 'admin':
-        print("Unauthorized access attempt")
+        app.logger.warning("Unauthorized payroll generation attempt")
         return jsonify({'error': 'Unauthorized'}), 401
     
     data = request.get_json()
     target_month = data.get('month')
     
-    print(f"Target month: {target_month}")
+    app.logger.debug("Payroll generation requested for %s", target_month)
     
     if not target_month:
         return jsonify({'error': 'Month is required'}), 400
     
-    # Check if payroll already exists for this month
-    existing_payroll = [p for p in payroll_data if p['month'] == target_month]
-    if existing_payroll:
-        print(f"Payroll already exists for {target_month}")
+    # A failed or interrupted run for this month is resumed from its last checkpoint
+    run = payroll_runner.find_run(target_month)
+    if run and run['status'] != 'Completed':
+        app.logger.info("Resuming payroll run %s for %s", run['id'], target_month)
+        run = payroll_runner.resume(run['id'], session.get('username'))
+    elif run or store.payroll.count('month', target_month):
+        app.logger.info("Payroll for %s already exists", target_month)
         return jsonify({'error': f'Payroll for {target_month} already exists'}), 400
-    
-    generated_count = 0
-    print(f"Number of users: {len(users)}")
-    
-    # Generate payroll for all active employees
-    for employee in users:
-        print(f"Processing employee: {employee.get('name')} - Status: {employee.get('status')} - Salary: {employee.get('salary')}")
-        
-        if employee.get('status') == 'Active' and employee.get('salary'):
-            base_salary = employee['salary']
-            
-            # Calculate salary components (standard breakdown)
-            basic_salary = int(base_salary * 0.5)  # 50% basic
-            hra = int(base_salary * 0.2)  # 20% HRA
-            allowances = int(base_salary * 0.15)  # 15% allowances
-            
-            # Calculate attendance-based adjustments
-            monthly_attendance = get_employee_monthly_attendance(employee['id'], target_month)
-            working_days = 22  # Standard working days per month
-            present_days = len([a for a in monthly_attendance if a['status'] in ['Present', 'Late']])
-            
-            print(f"Employee {employee['name']}: {present_days}/{working_days} days present")
-            
-            # Adjust salary based on attendance
-            attendance_ratio = present_days / working_days if working_days > 0 else 1
-            basic_salary = int(basic_salary * attendance_ratio)
-            hra = int(hra * attendance_ratio)
-            allowances = int(allowances * attendance_ratio)
-            
-            # Calculate overtime (if any late days, reduce overtime)
-            late_days = len([a for a in monthly_attendance if a['status'] == 'Late'])
-            overtime = max(0, int(base_salary * 0.05) - (late_days * 500))  # Reduce overtime for late days
-            
-            # Calculate bonus (performance-based, random for demo)
-            bonus = random.randint(0, int(base_salary * 0.1))
-            
-            # Calculate deductions
-            pf_deduction = int(basic_salary * 0.12)  # 12% PF
-            insurance = 2000  # Fixed insurance
-            other_deductions = random.randint(0, 1000)
-            total_deductions = pf_deduction + insurance + other_deductions
-            
-            # Calculate tax (simplified tax calculation)
-            gross_salary = basic_salary + hra + allowances + overtime + bonus
-            tax = int(gross_salary * 0.1) if gross_salary > 30000 else int(gross_salary * 0.05)
-            
-            # Calculate net salary
-            net_salary = gross_salary - total_deductions - tax
-            
-            # Create payroll entry
-            new_payroll = {
-                'id': len(payroll_data) + 1,
-                'employee_id': employee['id'],
-                'month': target_month,
-                'basic_salary': basic_salary,
-                'hra': hra,
-                'allowances': allowances,
-                'overtime': overtime,
-                'bonus': bonus,
-                'deductions': total_deductions,
-                'tax': tax,
-                'net_salary': net_salary,
-                'status': 'Pending',
-                'generated_date': datetime.now().strftime("%Y-%m-%d"),
-                'working_days': working_days,
-                'present_days': present_days,
-                'attendance_ratio': round(attendance_ratio * 100, 2)
-            }
-            
-            payroll_data.append(new_payroll)
-            generated_count += 1
-            print(f"Generated payroll for {employee['name']}")
-    
-    print(f"Total payroll records generated: {generated_count}")
+    else:
+        # Generate payroll for all active employees in the background
+        run = payroll_runner.start(target_month, datetime.now().strftime("%Y-%m-%d"), session.get('username'))
     
     return jsonify({
-        'message': f'Payroll generated successfully for {target_month}',
-        'count': generated_count,
-        'month': target_month
-    })
+        'message': f'Payroll generation started for {target_month}',
+        'run_id': run['id'],
+        'month': target_month,
+        'status': run['status'],
+        'job_id': run['job_id'],
+        'status_url': url_for('get_payroll_run', run_id=run['id'])
+    }), 202
+
+# Payroll run status
+@app.route('/api/admin/payroll-runs/<int:run_id>', methods=['GET'])
+def get_payroll_run(run_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    run = store.payroll_runs.get(run_id)
+    if not run:
+        return jsonify({'error': 'Payroll run not found'}), 404
+    return jsonify(run)
 
-# Get employee monthly attendance for payroll calculation
-def get_employee_monthly_attendance(employee_id, month):
-    """Get attendance records for an employee for a specific month"""
-    year_month = month  # Format: YYYY-MM
-    return [a for a in attendance_data 
-            if a['employee_id'] == employee_id and a['date'].startswith(year_month)]
+# Resume a failed payroll run
+@app.route('/api/admin/payroll-runs/<int:run_id>/resume', methods=['POST'])
+def resume_payroll_run(run_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    run = payroll_runner.resume(run_id, session.get('username'))
+    if not run:
+        return jsonify({'error': 'Payroll run not found'}), 404
+    return jsonify(run), 202
 
 # Bulk update payroll status
 @app.route('/api/admin/payroll/bulk-update', methods=['POST'])
@@ -1207,11 +1248,11 @@ def bulk_update_payroll():
     new_status = data.get('status', 'Paid')
     
     updated_count = 0
-    for payroll in payroll_data:
-        if payroll['id'] in payroll_ids:
-            payroll['status'] = new_status
-            if new_status == 'Paid':
-                payroll['paid_date'] = datetime.now().strftime("%Y-%m-%d")
+    for payroll_id in payroll_ids:
+        changes = {'status': new_status}
+        if new_status == 'Paid':
+            changes['paid_date'] = datetime.now().strftime("%Y-%m-%d")
+        if store.payroll.update(payroll_id, changes):
             updated_count += 1
     
     return jsonify({
@@ -1225,8 +1266,7 @@ def delete_payroll(payroll_id):
     if 'user_type' not in session or session['user_type'] != 'admin':
         return jsonify({'error': 'Unauthorized'}), 401
     
-    global payroll_data
-    payroll_data = [p for p in payroll_data if p['id'] != payroll_id]
+    store.payroll.delete(payroll_id)
     
     return jsonify({'message': 'Payroll deleted successfully'})
 
@@ -1239,18 +1279,18 @@ def get_payroll_summary():
     month = request.args.get('month')
     
     if month:
-        month_payroll = [p for p in payroll_data if p['month'] == month]
+        month_payroll = store.payroll.find('month', month)
     else:
         # Current month
         current_month = datetime.now().strftime("%Y-%m")
-        month_payroll = [p for p in payroll_data if p['month'] == current_month]
+        month_payroll = store.payroll.find('month', current_month)
     
     total_employees = len(month_payroll)
-    total_gross = sum(p['basic_salary'] + p['hra'] + p['allowances'] + p['overtime'] + p['bonus'] for p in month_payroll)
-    total_deductions = sum(p['deductions'] + p['tax'] for p in month_payroll)
-    total_net = sum(p['net_salary'] for p in month_payroll)
-    paid_count = len([p for p in month_payroll if p['status'] == 'Paid'])
-    pending_count = len([p for p in month_payroll if p['status'] == 'Pending'])
+    total_gross = sum(payroll_gross(p) for p in month_payroll)
+    total_deductions = sum(payroll_deductions(p) for p in month_payroll)
+    total_net = sum(p.get('net_salary') or 0 for p in month_payroll)
+    paid_count = len([p for p in month_payroll if p.get('status') == 'Paid'])
+    pending_count = len([p for p in month_payroll if p.get('status', 'Pending') == 'Pending'])
     
     return jsonify({
         'month': month or datetime.now().strftime("%Y-%m"),
@@ -1270,8 +1310,8 @@ def get_payroll_report():
         
     # Group payroll by month
     monthly_payroll = {}
-    for payroll in payroll_data:
-        month = payroll['month']
+    for payroll in store.payroll:
+        month = payroll.get('month')
         if month not in monthly_payroll:
             monthly_payroll[month] = {
                 "month": month,
@@ -1282,9 +1322,9 @@ def get_payroll_report():
             }
         
         monthly_payroll[month]["total_employees"] += 1
-        monthly_payroll[month]["total_gross"] += payroll["basic_salary"] + payroll["hra"] + payroll["allowances"] + payroll["overtime"] + payroll["bonus"]
-        monthly_payroll[month]["total_deductions"] += payroll["deductions"] + payroll["tax"]
-        monthly_payroll[month]["total_net"] += payroll["net_salary"]
+        monthly_payroll[month]["total_gross"] += payroll_gross(payroll)
+        monthly_payroll[month]["total_deductions"] += payroll_deductions(payroll)
+        monthly_payroll[month]["total_net"] += payroll.get('net_salary') or 0
     
     return jsonify(list(monthly_payroll.values()))
 # Enhanced Attendance Management Endpoints
@@ -1306,49 +1346,48 @@ def add_attendance():
     if not employee_id or not date or not status:
         return jsonify({"error": "Missing required fields"}), 400
     
-    # Check if attendance already exists for this employee and date
-    existing_attendance = next((a for a in attendance_data if a['employee_id'] == employee_id and a['date'] == date), None)
-    
-    if existing_attendance:
-        # Update existing attendance
-        existing_attendance.update({
-            'status': status,
-            'hours_worked': hours_worked,
-            'check_in': check_in,
-            'check_out': check_out,
-            'remarks': remarks,
-            'created_by': 'HR Admin'
-        })
-        return jsonify(existing_attendance)
-    else:
-        # Create new attendance record
-        new_attendance = {
-            "id": len(attendance_data) + 1,
-            "employee_id": employee_id,
-            "date": date,
-            "status": status,
-            "hours_worked": hours_worked,
-            "check_in": check_in,
-            "check_out": check_out,
-            "remarks": remarks,
-            "created_by": "HR Admin",
-            "created_date": datetime.now().strftime("%Y-%m-%d"),
-            "overtime_hours": 0
-        }
-        attendance_data.append(new_attendance)
-        return jsonify(new_attendance), 201
+    # Check if attendance already exists for this employee and date; locked so
+    # concurrent requests for the same day cannot both create a record
+    with store.attendance.locked():
+        existing_attendance = store.attendance.find_one('employee_date', (employee_id, date))
+        
+        if existing_attendance:
+            # Update existing attendance
+            existing_attendance = store.attendance.update(existing_attendance['id'], {
+                'status': status,
+                'hours_worked': hours_worked,
+                'check_in': check_in,
+                'check_out': check_out,
+                'remarks': remarks,
+                'created_by': 'HR Admin'
+            })
+            return jsonify(existing_attendance)
+        else:
+            # Create new attendance record
+            new_attendance = AttendanceRecord(
+                employee_id=employee_id,
+                date=date,
+                status=status,
+                hours_worked=hours_worked,
+                check_in=check_in,
+                check_out=check_out,
+                remarks=remarks,
+                created_date=datetime.now().strftime("%Y-%m-%d")
+            ).to_json()
+            store.attendance.add(new_attendance)
+    return jsonify(new_attendance), 201
 
 @app.route('/api/attendance/<int:attendance_id>', methods=['PUT'])
 def update_attendance(attendance_id):
     if 'user_type' not in session or session['user_type'] != 'admin':
         return jsonify({"error": "Unauthorized"}), 401
         
-    attendance_record = next((a for a in attendance_data if a['id'] == attendance_id), None)
+    attendance_record = store.attendance.get(attendance_id)
     if not attendance_record:
         return jsonify({"error": "Attendance record not found"}), 404
     
     data = request.get_json()
-    attendance_record.update({
+    attendance_record = store.attendance.update(attendance_id, {
         'status': data.get('status', attendance_record['status']),
         'hours_worked': data.get('hours_worked', attendance_record['hours_worked']),
         'check_in': data.get('check_in', attendance_record['check_in']),
@@ -1364,8 +1403,7 @@ def delete_attendance(attendance_id):
     if 'user_type' not in session or session['user_type'] != 'admin':
         return jsonify({"error": "Unauthorized"}), 401
         
-    global attendance_data
-    attendance_data = [a for a in attendance_data if a['id'] != attendance_id]
+    store.attendance.delete(attendance_id)
     
     return jsonify({"message": "Attendance record deleted successfully"})
 
@@ -1380,54 +1418,106 @@ def bulk_add_attendance():
     if not attendance_records:
         return jsonify({"error": "No attendance records provided"}), 400
     
-    created_count = 0
-    updated_count = 0
+    job = job_queue.submit('attendance_import', {'attendance_records': attendance_records}, session.get('username'))
+    return jsonify({
+        "message": "Bulk attendance import queued",
+        "job_id": job['id'],
+        "status_url": url_for('get_job', job_id=job['id'])
+    }), 202
+
+def import_attendance_records(context, attendance_records):
+    """Background job: create or update attendance for each (employee, date)"""
+    result = AttendanceImporter(store).run(enumerate(attendance_records, 1), context)
+    result['message'] = "Bulk attendance processed successfully"
+    return result
+
+job_queue.register('attendance_import', import_attendance_records)
+
+# Time-clock punches from door and biometric readers
+@app.route('/api/punches', methods=['POST'])
+def submit_punches():
+    token = app.config['PUNCH_DEVICE_TOKEN']
+    is_device = bool(token) and hmac.compare_digest(request.headers.get('X-Device-Token', ''), token)
+    if not is_device and session.get('user_type') != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
     
-    for record in attendance_records:
-        employee_id = record.get('employee_id')
-        date = record.get('date')
-        
-        if not employee_id or not date:
-            continue
-            
-        # Check if attendance already exists
-        existing_attendance = next((a for a in attendance_data if a['employee_id'] == employee_id and a['date'] == date), None)
-        
-        if existing_attendance:
-            # Update existing
-            existing_attendance.update({
-                'status': record.get('status', existing_attendance['status']),
-                'hours_worked': record.get('hours_worked', existing_attendance['hours_worked']),
-                'check_in': record.get('check_in', existing_attendance['check_in']),
-                'check_out': record.get('check_out', existing_attendance['check_out']),
-                'remarks': record.get('remarks', existing_attendance['remarks']),
-                'created_by': 'HR Admin'
-            })
-            updated_count += 1
-        else:
-            # Create new
-            new_attendance = {
-                "id": len(attendance_data) + 1,
-                "employee_id": employee_id,
-                "date": date,
-                "status": record.get('status', 'Present'),
-                "hours_worked": record.get('hours_worked', 8),
-                "check_in": record.get('check_in'),
-                "check_out": record.get('check_out'),
-                "remarks": record.get('remarks', 'Bulk attendance entry'),
-                "created_by": "HR Admin",
-                "created_date": datetime.now().strftime("%Y-%m-%d"),
-                "overtime_hours": 0
-            }
-            attendance_data.append(new_attendance)
-            created_count += 1
+    data = request.get_json(silent=True)
+    if data is None:
+        return jsonify({"error": "Expected a punch or {\"punches\": [...]}"}), 400
+    def resolve(value):
+        employee = find_employee(store, value)
+        return employee['id'] if employee else None
+    
+    records, errors = parse_punches(data, resolve)
+    
+    pending = punch_pipeline.pending
+    if records:
+        try:
+            pending = punch_pipeline.submit(records)
+        except Backpressure as e:
+            response = jsonify({"error": str(e)})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+    return jsonify({"accepted": len(records), "errors": errors, "pending": pending}), 202
+
+@app.route('/api/admin/punches/status', methods=['GET'])
+def get_punch_status():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
     
+    return jsonify({"pending": punch_pipeline.pending, **punch_pipeline.stats})
+
+# Consolidate pending punches immediately instead of waiting for the next batch
+@app.route('/api/admin/punches/flush', methods=['POST'])
+def flush_punches():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    return jsonify({"batch": punch_pipeline.flush()})
+
+# Streaming bulk import: the upload is spooled to disk as it arrives and
+# imported by a background job, so uploads of any size use constant memory
+@app.route('/api/attendance/import', methods=['POST'])
+def upload_attendance_import():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    upload = request.files.get('file')
+    import_format = request.args.get('format')
+    if not import_format:
+        name = upload.filename if upload else ''
+        content_type = upload.mimetype if upload else request.mimetype
+        is_ndjson = name.endswith(('.ndjson', '.jsonl')) or content_type in ('application/x-ndjson', 'application/jsonl')
+        import_format = 'ndjson' if is_ndjson else 'csv'
+    if import_format not in READERS:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    
+    folder = os.path.join(app.config['GENERATED_FOLDER'], 'imports')
+    os.makedirs(folder, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=folder, suffix='.' + import_format)
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(upload.stream if upload else request.stream, f, 1024 * 1024)
+    if os.path.getsize(path) == 0:
+        os.unlink(path)
+        return jsonify({"error": "No attendance records provided"}), 400
+    
+    job = job_queue.submit('attendance_file_import', {'path': path, 'file_format': import_format},
+                           session.get('username'))
     return jsonify({
-        "message": f"Bulk attendance processed successfully",
-        "created": created_count,
-        "updated": updated_count,
-        "total": created_count + updated_count
-    })
+        "message": "Attendance import queued",
+        "job_id": job['id'],
+        "status_url": url_for('get_job', job_id=job['id'])
+    }), 202
+
+def import_attendance_file(context, path, file_format):
+    """Background job: stream rows from a spooled upload into attendance"""
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            return AttendanceImporter(store).run(READERS[file_format](f), context)
+    finally:
+        os.unlink(path)
+
+job_queue.register('attendance_file_import', import_attendance_file)
 
 @app.route('/api/attendance/statistics', methods=['GET'])
 def get_attendance_statistics():
@@ -1436,15 +1526,13 @@ def get_attendance_statistics():
     
     date = request.args.get('date', datetime.now().strftime("%Y-%m-%d"))
     
-    # Get attendance for specific date
-    date_attendance = [a for a in attendance_data if a['date'] == date]
-    
-    # Calculate statistics
-    total_employees = len(users)
-    present_count = len([a for a in date_attendance if a['status'] in ['Present', 'Work From Home']])
-    absent_count = len([a for a in date_attendance if a['status'] == 'Absent'])
-    late_count = len([a for a in date_attendance if a['status'] == 'Late'])
-    half_day_count = len([a for a in date_attendance if a['status'] == 'Half Day'])
+    # Counts for the date come from the company-wide daily rollup
+    stats = attendance_rollups.stats('company', None, 'day', date)
+    total_employees = len(store.users)
+    present_count = stats['present'] + stats['work_from_home']
+    absent_count = stats['absent']
+    late_count = stats['late']
+    half_day_count = stats['half_day']
     
     attendance_rate = (present_count / total_employees * 100) if total_employees > 0 else 0
     
@@ -1456,12 +1544,12 @@ def get_attendance_statistics():
         "late_count": late_count,
         "half_day_count": half_day_count,
         "attendance_rate": round(attendance_rate, 2),
-        "marked_attendance": len(date_attendance),
-        "pending_attendance": total_employees - len(date_attendance)
+        "marked_attendance": stats['records'],
+        "pending_attendance": total_employees - stats['records']
     })
 
 @app.route('/api/attendance/report', methods=['GET'])
-def get_attendance_report():
+def get_attendance_records_report():
     if 'user_type' not in session or session['user_type'] != 'admin':
         return jsonify({"error": "Unauthorized"}), 401
     
@@ -1469,26 +1557,278 @@ def get_attendance_report():
     end_date = request.args.get('end_date')
     employee_id = request.args.get('employee_id')
     
-    filtered_attendance = attendance_data
+    fragments = record_fragments['attendance']
+    version = fragments.version
+    # Date ranges are looked up in the sorted date indexes, and the records
+    # returned in id order as before
+    if employee_id:
+        filtered_attendance = store.attendance.find_range('employee_date', start_date or None, end_date or None,
+                                                          prefix=(int(employee_id),))
+        filtered_attendance.sort(key=lambda a: a['id'])
+    elif start_date or end_date:
+        filtered_attendance = store.attendance.find_range('date', start_date or None, end_date or None)
+        filtered_attendance.sort(key=lambda a: a['id'])
+    else:
+        filtered_attendance = store.attendance.all()
     
-    if start_date:
-        filtered_attendance = [a for a in filtered_attendance if a['date'] >= start_date]
+    # Add employee information to each record: the cached JSON of the record
+    # is extended with the employee's fields, encoded once per employee,
+    # instead of copying and re-encoding every record
+    employee_parts = {}
+    report_data = []
+    for record, fragment in zip(filtered_attendance, fragments.encode_each(filtered_attendance, version)):
+        if record['employee_id'] not in employee_parts:
+            employee = store.users.get(record['employee_id'])
+            employee_parts[record['employee_id']] = employee and dumps_bytes({
+                'employee_name': employee['name'],
+                'employee_id_code': employee['employee_id'],
+                'department': employee['department']
+            })[1:]
+        employee_part = employee_parts[record['employee_id']]
+        if employee_part:
+            report_data.append(fragment[:-1] + b',' + employee_part)
+    
+    return app.response_class(b'[' + b','.join(report_data) + b']\n', mimetype='application/json')
+
+
+# Streaming exports
+def export_response(rows, columns, filename):
+    """Stream (record, employee) rows as CSV or NDJSON (?format=), gzipped with ?gzip=1"""
+    export_format = request.args.get('format', 'csv')
+    if export_format == 'csv':
+        chunks = exports.stream_csv(rows, columns)
+        mimetype = 'text/csv'
+    elif export_format == 'ndjson':
+        chunks = exports.stream_ndjson(rows)
+        mimetype = 'application/x-ndjson'
+    else:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
     
-    if end_date:
-        filtered_attendance = [a for a in filtered_attendance if a['date'] <= end_date]
+    headers = {'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'}
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks = exports.gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+@app.route('/api/export/attendance', methods=['GET'])
+def export_attendance():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
     
-    if employee_id:
-        filtered_attendance = [a for a in filtered_attendance if a['employee_id'] == int(employee_id)]
+    # Same filters as /api/attendance/report, plus exact date and status
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    employee_id = request.args.get('employee_id', type=int)
+    date = request.args.get('date')
+    status = request.args.get('status')
+    
+    def records():
+        if employee_id:
+            candidates = store.attendance.find_range('employee_date', start_date or None, end_date or None,
+                                                     prefix=(employee_id,))
+            candidates.sort(key=lambda a: a['id'])
+        elif date:
+            candidates = store.attendance.find('date', date)
+        elif start_date or end_date:
+            candidates = store.attendance.find_range('date', start_date or None, end_date or None)
+            candidates.sort(key=lambda a: a['id'])
+        else:
+            candidates = store.attendance
+        for record in candidates:
+            if start_date and record['date'] < start_date:
+                continue
+            if end_date and record['date'] > end_date:
+                continue
+            if date and record['date'] != date:
+                continue
+            if status and record['status'] != status:
+                continue
+            yield record
+    
+    rows = exports.with_employees(store, records())
+    filename = f"attendance_report_{datetime.now().strftime('%Y-%m-%d')}"
+    return export_response(rows, exports.ATTENDANCE_COLUMNS, filename)
+
+@app.route('/api/export/payroll', methods=['GET'])
+def export_payroll():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
     
-    # Add employee information to each record
-    report_data = []
-    for record in filtered_attendance:
-        employee = next((u for u in users if u['id'] == record['employee_id']), None)
-        if employee:
-            report_record = record.copy()
-            report_record['employee_name'] = employee['name']
-            report_record['employee_id_code'] = employee['employee_id']
-            report_record['department'] = employee['department']
-            report_data.append(report_record)
+    month = request.args.get('month')
+    start_month = request.args.get('start_month')
+    end_month = request.args.get('end_month')
+    employee_id = request.args.get('employee_id', type=int)
+    status = request.args.get('status')
+    detailed = request.args.get('layout') == 'detailed'
+    
+    def records():
+        if employee_id:
+            candidates = store.payroll.find('employee_id', employee_id)
+        elif month:
+            candidates = store.payroll.find('month', month)
+        elif start_month or end_month:
+            candidates = store.payroll.find_range('month', start_month or None, end_month or None)
+            candidates.sort(key=lambda p: p['id'])
+        else:
+            candidates = store.payroll
+        for record in candidates:
+            if month and record['month'] != month:
+                continue
+            if start_month and record['month'] < start_month:
+                continue
+            if end_month and record['month'] > end_month:
+                continue
+            if status and record['status'] != status:
+                continue
+            yield record
+    
+    rows = exports.with_employees(store, records())
+    columns = exports.PAYROLL_DETAILED_COLUMNS if detailed else exports.PAYROLL_COLUMNS
+    filename = f"{'detailed_' if detailed else ''}payroll_report_{datetime.now().strftime('%Y-%m-%d')}"
+    return export_response(rows, columns, filename)
+
+
+# Batch payslip rendering
+@app.route('/api/admin/payslips/generate', methods=['POST'])
+def generate_payslip_batch():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    data = request.get_json()
+    month = data.get('month')
+    if not month:
+        return jsonify({"error": "Month is required"}), 400
+    
+    job = job_queue.submit('payslip_batch', {'month': month}, session.get('username'))
+    return jsonify({
+        "message": f"Payslip generation queued for {month}",
+        "job_id": job['id'],
+        "status_url": url_for('get_job', job_id=job['id'])
+    }), 202
+
+def render_payslip_batch(context, month):
+    """Background job: render every payslip of a month into the PDF cache"""
+    result = payslips.render_month(store, pdf_cache, month, context, app.config['PAYROLL_WORKERS'])
+    result['download_url'] = f"/api/admin/payslips/{month}/download"
+    return result
+
+job_queue.register('payslip_batch', render_payslip_batch)
+
+# Download all payslips of a month as a streamed ZIP archive
+@app.route('/api/admin/payslips/<month>/download')
+def download_payslip_batch(month):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    if not store.payroll.count('month', month):
+        return jsonify({"error": f"No payroll found for {month}"}), 404
     
-    return jsonify(report_data)
\ No newline at end of file
+    return Response(
+        payslips.stream_month_zip(store, pdf_cache, month),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename=payslips_{month}.zip'}
+    )
+
+# Background job endpoints
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    status = request.args.get('status')
+    jobs = store.jobs.find('status', status) if status else store.jobs.all()
+    return jsonify(jobs[-50:])
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    job = store.jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<int:job_id>/progress', methods=['GET'])
+def get_job_progress(job_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    job = store.jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({
+        "id": job['id'],
+        "status": job['status'],
+        "progress": job['progress'],
+        "message": job['message']
+    })
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    job = job_queue.cancel(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+# Start background workers once every job type is registered
+def start_background_services():
+    payroll_runner.recover_interrupted()
+    job_queue.start()
+    punch_pipeline.start()
+
+def start_services():
+    """Start following the other workers or the record log, and the background workers"""
+    if app.config['SHARED_STATE']:
+        ChangeFollower(store, app.config['SYNC_INTERVAL']).start()
+        leader.when_elected(start_background_services)
+    elif not app.config['RECORD_LOG_REPLICA']:
+        start_background_services()
+    if record_log:
+        record_log.start(app.config['SYNC_INTERVAL'] if record_log.replica else 5.0)
+
+startup_lock = threading.Lock()
+started = False
+
+def start_up():
+    """Load the data and start the services, once.
+
+    Called by the first request with LAZY_STARTUP; later calls return at once.
+    The dashboard counters, rollups and leave ledger were created unbuilt and
+    are computed from the loaded data when they are first read.
+    """
+    global started
+    if started:
+        return
+    with startup_lock:
+        if started:
+            return
+        load_data()
+        start_services()
+        started = True
+
+if app.config['LAZY_STARTUP']:
+    app.before_request(start_up)
+
+if app.config['SHARED_STATE']:
+    # Writes of the other workers reach this worker's counters, rollups and
+    # caches before each request, and within SYNC_INTERVAL in the background
+    @app.before_request
+    def sync_shared_state():
+        store.sync()
+
+    for rebuild in [dashboard_counters.rebuild, attendance_rollups.rebuild, leave_ledger.rebuild,
+                    response_cache.versions.reset, event_hub.reset] + [
+                    fragments.clear for fragments in record_fragments.values()]:
+        store.on_resync(rebuild)
+
+if not app.config['LAZY_STARTUP']:
+    # load_data() ran before the derived state was built from it
+    start_services()
+    started = True
+
+if __name__ == '__main__':
+    app.run(debug=True)
@@ -0,0 +1,183 @@
+"""
+Bulk attendance import.
+
+Uploads are read as a stream of CSV or NDJSON rows, validated in batches and
+upserted through the (employee_id, date) index: new rows of a batch are
+inserted together with ``add_many``, existing records are updated in place.
+Invalid rows are skipped and reported with their line number, and the result
+includes the import throughput.
+"""
+
+import csv
+import json
+import time
+from datetime import datetime
+
+ATTENDANCE_STATUSES = ('Present', 'Absent', 'Late', 'Half Day', 'Work From Home')
+FIELDS = ('status', 'hours_worked', 'check_in', 'check_out', 'remarks', 'overtime_hours')
+MAX_REPORTED_ERRORS = 1000
+
+
+def read_csv(lines):
+    """Yield (line number, row dict) from CSV text lines with a header row."""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, {k.strip(): v for k, v in row.items() if k and v not in (None, '')}
+
+
+def read_ndjson(lines):
+    """Yield (line number, row dict) from NDJSON text lines; blank lines are skipped."""
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        yield line_number, row if isinstance(row, dict) else ValueError("Row is not a JSON object")
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+def _number(value, name, low, high):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if not low <= number <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return int(number) if number.is_integer() else number
+
+
+def _time(value, name):
+    try:
+        datetime.strptime(value, '%H:%M')
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be HH:MM")
+    return value
+
+
+def find_employee(store, value):
+    """Resolve an employee id or employee code (e.g. EMP001) to an employee record."""
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        return store.users.get(int(value))
+    if isinstance(value, str):
+        return store.users.find_one('employee_code', value)
+    return None
+
+
+class AttendanceImporter:
+    """Validates and upserts attendance rows for one import."""
+
+    def __init__(self, store, created_by='HR Admin', batch_size=1000):
+        self.store = store
+        self.created_by = created_by
+        self.batch_size = batch_size
+        self._employees = {}  # employee id or code -> employee id, or None if unknown
+
+    def _employee_id(self, value):
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError("employee_id must be an employee id or code")
+        if value not in self._employees:
+            employee = find_employee(self.store, value)
+            self._employees[value] = employee['id'] if employee else None
+        return self._employees[value]
+
+    def validate(self, row):
+        """Return the cleaned row, or raise ValueError."""
+        if isinstance(row, Exception):
+            raise row
+        if row.get('employee_id') in (None, '') or not row.get('date'):
+            raise ValueError("employee_id and date are required")
+        employee_id = self._employee_id(row['employee_id'])
+        if employee_id is None:
+            raise ValueError(f"Unknown employee {row['employee_id']}")
+        try:
+            datetime.strptime(row['date'], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError("date must be YYYY-MM-DD")
+
+        cleaned = {'employee_id': employee_id, 'date': row['date']}
+        if row.get('status') is not None:
+            if row['status'] not in ATTENDANCE_STATUSES:
+                raise ValueError(f"Unknown status {row['status']}")
+            cleaned['status'] = row['status']
+        if row.get('hours_worked') is not None:
+            cleaned['hours_worked'] = _number(row['hours_worked'], 'hours_worked', 0, 24)
+        if row.get('overtime_hours') is not None:
+            cleaned['overtime_hours'] = _number(row['overtime_hours'], 'overtime_hours', 0, 24)
+        for name in ('check_in', 'check_out'):
+            if row.get(name) is not None:
+                cleaned[name] = _time(row[name], name)
+        if row.get('remarks') is not None:
+            cleaned['remarks'] = str(row['remarks'])
+        return cleaned
+
+    def _write_batch(self, batch):
+        """Upsert a batch of cleaned rows. Returns (created, updated)."""
+        new_records = {}
+        updated = 0
+        with self.store.attendance.locked():
+            for row in batch:
+                key = (row['employee_id'], row['date'])
+                changes = {k: row[k] for k in FIELDS if k in row}
+                if key in new_records:
+                    new_records[key].update(changes)
+                    continue
+                existing = self.store.attendance.find_one('employee_date', key)
+                if existing:
+                    changes['created_by'] = self.created_by
+                    self.store.attendance.update(existing['id'], changes)
+                    updated += 1
+                else:
+                    new_records[key] = dict({
+                        "employee_id": row['employee_id'],
+                        "date": row['date'],
+                        "status": 'Present',
+                        "hours_worked": 8,
+                        "check_in": None,
+                        "check_out": None,
+                        "remarks": 'Bulk attendance entry',
+                        "created_by": self.created_by,
+                        "created_date": datetime.now().strftime("%Y-%m-%d"),
+                        "overtime_hours": 0
+                    }, **changes)
+            if new_records:
+                self.store.attendance.add_many(list(new_records.values()))
+        return len(new_records), updated
+
+    def run(self, rows, context=None):
+        """Import (line number, row) pairs and return a summary of the import."""
+        started = time.perf_counter()
+        result = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+        batch = []
+
+        def flush():
+            created, updated = self._write_batch(batch)
+            result['created'] += created
+            result['updated'] += updated
+            batch.clear()
+            if context:
+                context.progress(result['rows'], None, f"{result['rows']} rows read")
+                context.check_cancelled()
+
+        for line_number, row in rows:
+            result['rows'] += 1
+            try:
+                batch.append(self.validate(row))
+            except ValueError as e:
+                result['failed'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append({'line': line_number, 'error': str(e)})
+            if len(batch) >= self.batch_size:
+                flush()
+        flush()
+
+        elapsed = time.perf_counter() - started
+        result['seconds'] = round(elapsed, 3)
+        result['rows_per_second'] = round(result['rows'] / elapsed, 1) if elapsed > 0 else None
+        result['total'] = result['created'] + result['updated']
+        return result
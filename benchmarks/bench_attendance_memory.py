@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Compare the heap cost and read speed of attendance as dicts and as columns.
+
+Builds the same attendance history (every weekday for each employee) in the
+dict-based Collection from store.py and in the ColumnarCollection from
+columnar.py, each in a fresh process, and reports the heap held after loading
+(traced with tracemalloc), the load time (slowed down by the tracing) and
+typical lookups: one (employee, date) day, one month for payroll, a page of
+100 and a full scan.
+
+    python benchmarks/bench_attendance_memory.py                    # 1,000 employees, 2 years
+    python benchmarks/bench_attendance_memory.py --employees 5000 --years 2
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+STATUSES = ['Present'] * 7 + ['Late', 'Absent', 'Half Day', 'Work From Home']
+REMARKS = {
+    'Present': ['On time', 'Good performance', ''],
+    'Late': ['Traffic delay', 'Personal emergency', 'Overslept'],
+    'Absent': ['Sick leave', 'Personal work', 'Family emergency'],
+    'Half Day': ['Medical appointment', 'Personal work', 'Early leave'],
+    'Work From Home': ['Remote work', 'Client meeting', 'Project work'],
+}
+
+
+def history(employees, years, seed=7):
+    """Yield attendance records like the ones the app and its imports write."""
+    rng = random.Random(seed)
+    start = date(2023, 1, 2)
+    days = [start + timedelta(days=i) for i in range(365 * years) if (start + timedelta(days=i)).weekday() < 5]
+    for day in days:
+        day_string = day.isoformat()
+        for employee_id in range(1, employees + 1):
+            status = rng.choice(STATUSES)
+            if status == 'Absent':
+                hours, check_in, check_out = 0, None, None
+            elif status == 'Half Day':
+                hours, check_in, check_out = 4, '09:00', '13:00'
+            else:
+                minute = rng.randint(0, 59) if status == 'Late' else rng.randint(0, 10)
+                hours = round(rng.uniform(7.5, 9.5), 2)
+                check_in, check_out = f"{9 + (status == 'Late'):02d}:{minute:02d}", '18:00'
+            yield {
+                'employee_id': employee_id,
+                'date': day_string,
+                'status': status,
+                'hours_worked': hours,
+                'check_in': check_in,
+                'check_out': check_out,
+                'remarks': rng.choice(REMARKS[status]),
+                'created_by': 'System' if rng.random() > 0.3 else 'HR Admin',
+                'created_date': day_string,
+                'overtime_hours': rng.randint(0, 2) if status == 'Present' and rng.random() > 0.8 else 0,
+            }
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def measure(kind, employees, years, results):
+    from store import COLLECTIONS, Collection
+    from columnar import attendance_columns
+
+    factory = attendance_columns if kind == 'columnar' else Collection
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    collection = factory('attendance', **COLLECTIONS['attendance'])
+    batch = []
+    for record in history(employees, years):
+        batch.append(record)
+        if len(batch) == 10000:
+            collection.add_many(batch)
+            batch = []
+    collection.add_many(batch)
+    del batch
+    load = time.perf_counter() - started
+    heap = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    rng = random.Random(1)
+    sample = collection.page(after=rng.randint(0, len(collection) - 200), limit=200)
+    keys = [(record['employee_id'], record['date']) for record in sample]
+    months = collection.keys('month')
+    results.put({
+        'kind': kind,
+        'records': len(collection),
+        'heap': heap,
+        'load': load,
+        'day_us': timed(lambda: collection.find_one('employee_date', rng.choice(keys)), 2000) * 1e6,
+        'month_ms': timed(lambda: collection.find('month', rng.choice(months)), 3) * 1e3,
+        'page_us': timed(lambda: collection.page(after=rng.randint(0, len(collection)), limit=100), 200) * 1e6,
+        'scan_s': timed(collection.all, 1),
+        'report': collection.memory_usage() if hasattr(collection, 'memory_usage') else None,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--employees', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=2)
+    args = parser.parse_args()
+
+    results = multiprocessing.Queue()
+    rows = []
+    for kind in ('dicts', 'columnar'):
+        process = multiprocessing.Process(target=measure, args=(kind, args.employees, args.years, results))
+        process.start()
+        rows.append(results.get())
+        process.join()
+
+    print(f"{rows[0]['records']:,} attendance records ({args.employees:,} employees, {args.years} years of weekdays)")
+    print(f"{'':>9} {'heap MB':>9} {'B/record':>9} {'load s':>7} {'day us':>7} {'month ms':>9} "
+          f"{'page us':>8} {'scan s':>7}")
+    for row in rows:
+        print(f"{row['kind']:>9} {row['heap'] / 2 ** 20:>9,.1f} {row['heap'] / row['records']:>9,.0f} "
+              f"{row['load']:>7.2f} {row['day_us']:>7.1f} {row['month_ms']:>9.1f} "
+              f"{row['page_us']:>8.0f} {row['scan_s']:>7.2f}")
+    print(f"columnar uses {rows[1]['heap'] / rows[0]['heap']:.1%} of the dict heap")
+    report = rows[1]['report']
+    parts = dict(report['columns'], indexes=report['indexes'], coded_values=report['coded_values'],
+                 extras=report['extras'])
+    print("columnar footprint by part (memory_usage()): " +
+          ', '.join(f"{name} {size / 2 ** 20:.1f} MB" for name, size in sorted(parts.items(), key=lambda p: -p[1])))
+
+
+if __name__ == '__main__':
+    main()
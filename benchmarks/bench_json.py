@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON list responses.
+
+Compares Flask's default jsonify, the orjson provider and lists assembled
+from cached per-record fragments on synthetic payroll records (the widest
+records the API returns), both as raw encoding and as full GET /api/payroll
+style responses through a Flask test client.
+
+    python benchmarks/bench_json.py                    # 1k and 10k records
+    python benchmarks/bench_json.py --records 50000 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+import json_fast
+import payroll_engine
+from store import Store
+
+
+def build_store(count, month):
+    store = Store()
+    employees = [{"id": i, "salary": random.randint(30000, 150000)} for i in range(1, count + 1)]
+    summary = {e['id']: (random.randint(15, 22), random.randint(0, 3)) for e in employees}
+    records = payroll_engine.build_payroll_records(employees, summary, month, "2030-02-01")
+    for record in records:
+        record['bank_details'] = {
+            "bank_name": "State Bank",
+            "account_number": f"****{random.randint(1000, 9999)}",
+            "deposit_status": "Pending",
+            "deposit_date": None,
+            "transaction_id": None,
+        }
+    store.payroll.add_many(records)
+    return store
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def make_app(provider_class, store, fragments=None):
+    app = Flask(__name__)
+    app.json = provider_class(app)
+
+    @app.route('/api/payroll')
+    def get_payroll():
+        if fragments is None:
+            return jsonify(store.payroll.all())
+        version = fragments.version
+        body = fragments.encode_list(store.payroll.all(), version)
+        return app.response_class(body + b'\n', mimetype='application/json')
+
+    return app.test_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"encoder: {'orjson ' + json_fast.orjson.__version__ if json_fast.orjson else 'stdlib json (orjson not installed)'}")
+    for count in args.records:
+        store = build_store(count, "2030-01")
+        records = store.payroll.all()
+        fragments = json_fast.FragmentCache(store.payroll)
+        fragments.encode_list(records, fragments.version)  # warm the cache
+        default_app = Flask(__name__)
+        default_provider = default_app.json
+        fast_provider = json_fast.OrjsonProvider(default_app)
+        size = len(json_fast.dumps_bytes(records))
+        print(f"\n{count:,} payroll records, {size / 1e6:.1f} MB of JSON")
+
+        encoders = [
+            ('flask default provider', lambda: default_provider.dumps(records, separators=(',', ':'))),
+            ('orjson provider', lambda: fast_provider.dumps(records)),
+            ('cached fragments', lambda: fragments.encode_list(records, fragments.version)),
+        ]
+        baseline = None
+        for name, fn in encoders:
+            elapsed = best_of(args.repeat, fn)
+            baseline = baseline or elapsed
+            print(f"  encode   {name:24}: {elapsed * 1000:8.2f} ms  "
+                  f"{size / elapsed / 1e6:8.1f} MB/s  x{baseline / elapsed:5.1f}")
+
+        clients = [
+            ('flask default provider', make_app(DefaultJSONProvider, store)),
+            ('orjson provider', make_app(json_fast.OrjsonProvider, store)),
+            ('cached fragments', make_app(json_fast.OrjsonProvider, store, fragments)),
+        ]
+        baseline = None
+        for name, client in clients:
+            elapsed = best_of(args.repeat, lambda: client.get('/api/payroll').data)
+            baseline = baseline or elapsed
+            print(f"  response {name:24}: {elapsed * 1000:8.2f} ms  "
+                  f"{1 / elapsed:8.1f} req/s  x{baseline / elapsed:5.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark monthly payroll generation.
+
+Compares the original per-employee loop (one attendance scan per employee)
+with the batch engine in payroll_engine.py on synthetic data.
+
+    python benchmarks/bench_payroll.py                 # 10k and 100k employees
+    python benchmarks/bench_payroll.py --employees 5000 --days 22
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import payroll_engine
+from store import Store
+
+STATUSES = ["Present", "Present", "Present", "Present", "Absent", "Late", "Half Day", "Work From Home"]
+
+
+def build_store(employee_count, days, month):
+    store = Store()
+    for i in range(employee_count):
+        store.users.add({
+            "name": f"Employee {i}",
+            "status": "Active",
+            "salary": random.randint(30000, 150000),
+            "department": "Engineering",
+        })
+    for employee_id in range(1, employee_count + 1):
+        for day in range(1, days + 1):
+            store.attendance.add({
+                "employee_id": employee_id,
+                "date": f"{month}-{day:02d}",
+                "status": random.choice(STATUSES),
+                "hours_worked": 8,
+            })
+    return store
+
+
+def legacy_generate(employees, attendance, month):
+    """The original algorithm: a full attendance scan per employee."""
+    records = []
+    for employee in employees:
+        if employee.get('status') == 'Active' and employee.get('salary'):
+            monthly = [a for a in attendance
+                       if a['employee_id'] == employee['id'] and a['date'].startswith(month)]
+            present_days = len([a for a in monthly if a['status'] in ['Present', 'Late']])
+            late_days = len([a for a in monthly if a['status'] == 'Late'])
+            records.append(payroll_engine._compute_python(
+                [employee['salary']], [present_days], [late_days], None))
+    return records
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--employees', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--days', type=int, default=5, help='attendance rows per employee')
+    parser.add_argument('--legacy-limit', type=int, default=10000,
+                        help='skip the quadratic legacy loop above this many employees')
+    args = parser.parse_args()
+
+    month = "2030-01"
+    np = payroll_engine.load_numpy()
+    print(f"engine backend: {'numpy ' + np.__version__ if np else 'pure python'}")
+    for count in args.employees:
+        store = build_store(count, args.days, month)
+        print(f"\n{count:,} employees, {len(store.attendance):,} attendance rows")
+
+        if count <= args.legacy_limit:
+            _, elapsed = timed(lambda: legacy_generate(store.users.all(), store.attendance.all(), month))
+            print(f"  legacy per-employee loop : {elapsed:8.3f}s")
+        else:
+            print("  legacy per-employee loop :  skipped")
+
+        employees = payroll_engine.payable_employees(store.users)
+        summary, elapsed_group = timed(
+            lambda: payroll_engine.summarize_attendance(store.attendance.find('month', month)))
+        records, elapsed_build = timed(
+            lambda: payroll_engine.build_payroll_records(employees, summary, month, "2030-02-01"))
+        _, elapsed_insert = timed(lambda: store.payroll.add_many(records))
+        total = elapsed_group + elapsed_build + elapsed_insert
+        print(f"  batch engine             : {total:8.3f}s "
+              f"(group {elapsed_group:.3f}s, compute {elapsed_build:.3f}s, insert {elapsed_insert:.3f}s)")
+
+
+if __name__ == '__main__':
+    main()
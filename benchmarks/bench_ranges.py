@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Measure date-range attendance lookups as the history grows.
+
+Loads growing attendance histories into each backend and times the lookups
+behind the attendance report and the weekly views: one employee's month, one
+employee's week, and every employee's attendance for one week.  Each is done
+with ``find_range`` on the sorted date indexes and, for comparison, the way
+the report used to do it: fetch the employee's (or every) record and compare
+dates.  ``find_range`` should stay flat while the scans grow with the history.
+
+    python benchmarks/bench_ranges.py                          # 200 employees, 1, 2 and 4 years
+    python benchmarks/bench_ranges.py --employees 500 --years 1 3 --backend columnar
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from bench_attendance_memory import history  # noqa: E402
+from store import create_store  # noqa: E402
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - started) / repeat, len(result)
+
+
+def build(backend, workdir, employees, years):
+    if backend == 'sqlite':
+        store = create_store('sqlite', os.path.join(workdir, f"ranges-{employees}-{years}.db"))
+    else:
+        store = create_store('memory', columnar=backend == 'columnar')
+    batch = []
+    for record in history(employees, years):
+        batch.append(record)
+        if len(batch) == 10000:
+            store.attendance.add_many(batch)
+            batch = []
+    store.attendance.add_many(batch)
+    return store.attendance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=['memory', 'columnar', 'sqlite', 'all'], default='all',
+                        help="'columnar' is the memory backend with columnar attendance")
+    parser.add_argument('--employees', type=int, default=200)
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    backends = ['memory', 'columnar', 'sqlite'] if args.backend == 'all' else [args.backend]
+    workdir = tempfile.mkdtemp(prefix='hr-ranges-')
+    try:
+        print(f"{'backend':>8} {'records':>10} {'lookup':>16} {'rows':>6} {'find_range ms':>14} {'scan ms':>10}")
+        for backend in backends:
+            for years in args.years:
+                attendance = build(backend, workdir, args.employees, years)
+                week = attendance.last()['date']
+                month_start, month_end = f"{week[:7]}-01", f"{week[:7]}-31"
+                week_start = sorted(attendance.keys('date'))[-5]
+                lookups = [
+                    ("employee month",
+                     lambda: attendance.find_range('employee_date', month_start, month_end, prefix=(1,)),
+                     lambda: [a for a in attendance.find('employee_id', 1) if month_start <= a['date'] <= month_end]),
+                    ("employee week",
+                     lambda: attendance.find_range('employee_date', week_start, week, prefix=(1,)),
+                     lambda: [a for a in attendance.find('employee_id', 1) if week_start <= a['date'] <= week]),
+                    ("everyone, week",
+                     lambda: attendance.find_range('date', week_start, week),
+                     lambda: [a for a in attendance.all() if week_start <= a['date'] <= week]),
+                ]
+                for name, ranged, scan in lookups:
+                    ranged_time, rows = timed(ranged, args.repeat)
+                    scan_time, scanned_rows = timed(scan, max(1, args.repeat // 10))
+                    assert rows == scanned_rows, (name, rows, scanned_rows)
+                    print(f"{backend:>8} {len(attendance):>10,} {name:>16} {rows:>6} "
+                          f"{ranged_time * 1000:>14.3f} {scan_time * 1000:>10.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Measure how long the memory backend takes to come back after a restart.
+
+Writes an attendance history through a RecordLog (see record_log.py), then
+starts fresh processes that restore it: once from a snapshot, once by
+replaying the whole log without one, and, for comparison, once by building
+the same records and inserting them into a dict Collection the way a loader
+without snapshots would.  Reported times cover the restore only, not the
+interpreter start.
+
+    python benchmarks/bench_restart.py                      # 2,000 employees, 2 years (~1M records)
+    python benchmarks/bench_restart.py --employees 5000 --skip-replay
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from bench_attendance_memory import history  # noqa: E402
+
+
+def write_log(directory, employees, years, snapshot):
+    from record_log import RecordLog
+    from store import create_store
+    store = create_store('memory', columnar=True)
+    log = RecordLog(store, directory, names=('attendance',), fsync='never')
+    log.restore()
+    log.open()
+    batch = []
+    for record in history(employees, years):
+        batch.append(record)
+        if len(batch) == 10000:
+            store.attendance.add_many(batch)
+            batch = []
+    store.attendance.add_many(batch)
+    if snapshot:
+        log.snapshot()
+    return len(store.attendance)
+
+
+def restore(kind, directory, results):
+    started = time.perf_counter()
+    if kind == 'dicts':
+        from store import COLLECTIONS, Collection
+        collection = Collection('attendance', **COLLECTIONS['attendance'])
+        collection.add_many(list(history(*directory)))
+    else:
+        from record_log import RecordLog
+        from store import create_store
+        store = create_store('memory', columnar=True)
+        RecordLog(store, directory, names=('attendance',)).restore()
+        collection = store.attendance
+    elapsed = time.perf_counter() - started
+    sample = collection.find_one('employee_date', (1, collection.last()['date']))
+    results.put((kind, len(collection), elapsed, sample is not None))
+
+
+def measure(kind, directory):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=restore, args=(kind, directory, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--employees', type=int, default=2000)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--skip-replay', action='store_true', help='skip the (slow) full log replay')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hr-restart-')
+    try:
+        snapshot_dir = os.path.join(workdir, 'snapshot')
+        log_dir = os.path.join(workdir, 'log')
+        started = time.perf_counter()
+        records = write_log(snapshot_dir, args.employees, args.years, snapshot=True)
+        print(f"{records:,} attendance records written and snapshotted in {time.perf_counter() - started:.1f}s, "
+              f"{size(snapshot_dir) / 2 ** 20:.0f} MB of log and snapshot on disk")
+        runs = [('snapshot', snapshot_dir), ('dicts', (args.employees, args.years))]
+        if not args.skip_replay:
+            write_log(log_dir, args.employees, args.years, snapshot=False)
+            runs.insert(1, ('log replay', log_dir))
+
+        print(f"{'restore from':>12} {'records':>10} {'seconds':>8} {'records/s':>12}")
+        for kind, directory in runs:
+            kind, count, elapsed, found = measure(kind, directory)
+            assert found and count == records, (kind, count)
+            print(f"{kind:>12} {count:>10,} {elapsed:>8.2f} {count / elapsed:>12,.0f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
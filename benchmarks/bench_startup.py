@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Measure application startup: import time and time to the first request.
+
+Each run starts a fresh interpreter that imports app.py and then serves one
+admin login and one dashboard request through the test client, once with
+the default eager startup and once with HR_LAZY_STARTUP=1.  Reported are
+the medians of the runs: the whole process up to the end of the import
+(interpreter start included), the import alone, the first request, and the
+sum of the two, which is what a freshly started worker costs before it has
+answered anyone.
+
+By default the app seeds its demo data.  With ``--employees`` the runs start
+from an existing dataset instead: a SQLite database, or on ``--backend
+memory`` a record log with snapshots (see record_log.py), holding that many
+employees and their attendance history.
+
+    python benchmarks/bench_startup.py                       # demo data, SQLite
+    python benchmarks/bench_startup.py --employees 500 --years 1 --backend memory
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from bench_attendance_memory import history  # noqa: E402
+
+# Run in the child; prints [import seconds, first request seconds]
+CHILD = """
+import sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.post('/api/login', json={{'username': 'admin', 'password': 'admin123', 'user_type': 'admin'}})
+response = client.get('/api/reports/dashboard')
+assert response.status_code == 200, response.status_code
+print([imported - started, time.perf_counter() - imported])
+"""
+
+
+def write_dataset(backend, workdir, employees, years):
+    from record_log import RecordLog
+    from store import create_store
+    if backend == 'sqlite':
+        store = create_store('sqlite', os.path.join(workdir, 'hr_data.db'))
+    else:
+        store = create_store('memory', columnar=True)
+        log = RecordLog(store, os.path.join(workdir, 'log'), fsync='never')
+        log.restore()
+        log.open()
+    store.users.add_many([
+        {'name': f"Employee {i}", 'email': f"employee{i}@example.com", 'role': 'Developer',
+         'department': f"Dept {i % 8}", 'status': 'Active', 'salary': 50000, 'employee_id': f"EMP{i:05d}"}
+        for i in range(1, employees + 1)
+    ])
+    batch = []
+    for record in history(employees, years):
+        batch.append(record)
+        if len(batch) == 10000:
+            store.attendance.add_many(batch)
+            batch = []
+    store.attendance.add_many(batch)
+    if backend == 'memory':
+        log.snapshot()
+    return len(store.attendance)
+
+
+def run(workdir, env):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD.format(root=os.path.abspath(ROOT))],
+                            cwd=workdir, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if output.returncode != 0:
+        raise RuntimeError(output.stderr)
+    imported, first_request = json.loads(output.stdout.strip().splitlines()[-1])
+    # The process time up to the end of the import, whatever exit costs
+    return elapsed - first_request, imported, first_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=['sqlite', 'memory'], default='sqlite')
+    parser.add_argument('--employees', type=int, default=0, help='start from this many employees instead of the demo data')
+    parser.add_argument('--years', type=int, default=1, help='years of attendance per employee with --employees')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hr-startup-')
+    try:
+        env = dict(os.environ, HR_STORAGE_BACKEND=args.backend,
+                   HR_DATABASE_PATH=os.path.join(workdir, 'hr_data.db'),
+                   HR_GENERATED_FOLDER=os.path.join(workdir, 'generated'))
+        env.pop('HR_SHARED_STATE', None)
+        if args.employees:
+            records = write_dataset(args.backend, workdir, args.employees, args.years)
+            print(f"{args.employees:,} employees and {records:,} attendance records on {args.backend}")
+            if args.backend == 'memory':
+                env['HR_RECORD_LOG'] = os.path.join(workdir, 'log')
+        elif args.backend == 'sqlite':
+            # Seed the database once, so every run starts from the same data
+            run(workdir, env)
+
+        print(f"{'startup':>8} {'process':>9} {'import':>8} {'1st req':>8} {'ready':>8}   (median seconds of {args.runs})")
+        for mode, lazy in (('eager', '0'), ('lazy', '1')):
+            runs = [run(workdir, dict(env, HR_LAZY_STARTUP=lazy)) for _ in range(args.runs)]
+            process, imported, first_request = (statistics.median(column) for column in zip(*runs))
+            print(f"{mode:>8} {process:>9.3f} {imported:>8.3f} {first_request:>8.3f} {imported + first_request:>8.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
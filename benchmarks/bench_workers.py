@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Benchmark request throughput from 1 to N worker processes.
+
+For each worker count, starts gunicorn (or, with --dev-server or when
+gunicorn is not installed, the development pre-fork server in ``wsgi.py``)
+on a fresh SQLite database and drives it from
+several client processes over keep-alive connections with a read-heavy mix:
+dashboard, paginated employee and attendance lists, leave balances, and a
+share of writes.  After every write the client reads the dashboard again on a
+new connection, which may land on another worker, and counts the reads
+that do not include its own write yet.
+
+    python benchmarks/bench_workers.py                      # 1, 2 and 4 workers
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --clients 8 --seconds 20
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+READS = [
+    '/api/reports/dashboard',
+    '/api/users?limit=50',
+    '/api/attendance?limit=100',
+    '/api/attendance/statistics',
+    '/api/admin/leave-balance/{employee}',
+]
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0
+
+
+def login(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('POST', '/api/login', json.dumps({
+        'username': 'admin', 'password': 'admin123', 'user_type': 'admin'}),
+        {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    response.read()
+    return connection, response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def pending_leaves(port, cookie):
+    """Read the dashboard on a fresh connection, i.e. possibly from another worker."""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('GET', '/api/reports/dashboard', headers={'Cookie': cookie})
+    value = json.loads(connection.getresponse().read())['pending_leaves']
+    connection.close()
+    return value
+
+
+def client(port, seconds, write_ratio, employees, results):
+    """One client process: requests as fast as possible for ``seconds``."""
+    connection, cookie = login(port)
+    headers = {'Cookie': cookie, 'Content-Type': 'application/json'}
+    latencies = []
+    stale = writes = 0
+    seen = pending_leaves(port, cookie)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if random.random() < write_ratio:
+            # Pending leave requests only grow during the run, so after our
+            # write every worker must report at least one more than we saw
+            connection.request('POST', '/api/leave-requests', json.dumps({
+                'employee_id': random.choice(employees), 'start_date': '2031-06-01',
+                'end_date': '2031-06-02', 'type': 'Vacation', 'reason': 'benchmark'}), headers)
+            connection.getresponse().read()
+            latencies.append(time.perf_counter() - started)
+            writes += 1
+            after = pending_leaves(port, cookie)
+            if after < seen + 1:
+                stale += 1
+            seen = max(seen + 1, after)
+        else:
+            path = random.choice(READS).format(employee=random.choice(employees))
+            connection.request('GET', path, headers=headers)
+            connection.getresponse().read()
+            latencies.append(time.perf_counter() - started)
+    results.put((latencies, writes, stale))
+
+
+def run(args, workers):
+    workdir = tempfile.mkdtemp(prefix='hr-workers-')
+    database = os.path.join(workdir, 'hr_data.db')
+    from store import create_store
+    store = create_store('sqlite', database, shared=True)
+    store.users.add_many([
+        {'name': f"Employee {i}", 'email': f"employee{i}@example.com", 'department': f"Dept {i % 12}",
+         'status': 'Active', 'salary': 50000, 'employee_id': f"EMP{i:05d}"}
+        for i in range(args.employees)
+    ])
+    employees = [user['id'] for user in store.users]
+
+    port = random.randint(20000, 40000)
+    env = dict(os.environ, HR_STORAGE_BACKEND='sqlite', HR_DATABASE_PATH=database,
+               HR_GENERATED_FOLDER=os.path.join(workdir, 'generated'))
+    if not args.dev_server:
+        command = ['gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(workers),
+                   '--bind', f"127.0.0.1:{port}", '--log-level', 'warning']
+    else:
+        command = [sys.executable, 'wsgi.py', '--workers', str(workers), '--port', str(port)]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        time.sleep(1)  # let every worker finish importing the app
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client, args=(port, args.seconds, args.write_ratio,
+                                                                 employees, results))
+                   for _ in range(args.clients)]
+        started = time.perf_counter()
+        for process in clients:
+            process.start()
+        latencies, writes, stale = [], 0, 0
+        for _ in clients:
+            client_latencies, client_writes, client_stale = results.get()
+            latencies += client_latencies
+            writes += client_writes
+            stale += client_stale
+        elapsed = time.perf_counter() - started
+        for process in clients:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return len(latencies) / elapsed, latencies, writes, stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=max(4, (os.cpu_count() or 1) * 2),
+                        help='client processes, each with one keep-alive connection')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--employees', type=int, default=2000)
+    parser.add_argument('--write-ratio', type=float, default=0.05)
+    parser.add_argument('--dev-server', action='store_true',
+                        help="serve with wsgi.py's development server instead of gunicorn")
+    args = parser.parse_args()
+    if not args.dev_server and shutil.which('gunicorn') is None:
+        print("gunicorn is not installed; using the development server in wsgi.py")
+        args.dev_server = True
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.seconds:.0f}s per run, "
+          f"{args.write_ratio:.0%} writes, {args.employees:,} employees")
+    print(f"{'workers':>8} {'req/s':>9} {'scaling':>8} {'p50 ms':>8} {'p99 ms':>8} {'writes':>7} {'stale reads':>12}")
+    baseline = None
+    for workers in args.workers:
+        throughput, latencies, writes, stale = run(args, workers)
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:>9,.0f} {throughput / baseline:>7.2f}x "
+              f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} "
+              f"{writes:>7} {stale:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Load-test the asyncio gateway.
+
+Starts ``gateway.py`` (under uvicorn, or on its development server when
+uvicorn is not installed) against a fresh SQLite database (or targets an already running gateway with --port), opens a crowd of live
+dashboard subscriptions and then has many devices post punches for today
+over keep-alive connections.  Reports the peak number of open connections,
+punch request latency percentiles, throughput, back-off responses and how
+long the dashboard streams took to show the final head count.
+
+    python benchmarks/load_gateway.py                       # 1,000 subscribers, 200 devices
+    python benchmarks/load_gateway.py --subscribers 5000 --devices 1000 --batch 20
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+TOKEN = 'load-test'
+
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client."""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port, limit=1024 * 1024)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+    async def send(self, method, path, body=None, headers=None):
+        lines = [f"{method} {path} HTTP/1.1", "Host: localhost"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if body is not None:
+            lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b''))
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        return status, response_headers
+
+    async def request(self, method, path, payload=None, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        status, response_headers = await self.send(method, path, body, headers)
+        if 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = b''
+            while True:
+                chunk = await self.read_chunk()
+                if not chunk:
+                    break
+                data += chunk
+        return status, response_headers, data
+
+    async def read_chunk(self):
+        size = int((await self.reader.readline()).strip() or b'0', 16)
+        data = await self.reader.readexactly(size) if size else b''
+        await self.reader.readline()
+        return data
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0
+
+
+async def subscriber(port, cookie, results, ready):
+    """Follow the dashboard stream, recording (time, present_today) of every event."""
+    connection = Connection(port)
+    try:
+        await connection.open()
+        status, _ = await connection.send('GET', '/gateway/dashboard/stream', headers={'Cookie': cookie})
+        assert status == 200, status
+        ready.release()
+        events = []
+        results.append(events)
+        buffer = b''
+        while True:
+            buffer += await connection.read_chunk()
+            while b'\n\n' in buffer:
+                event, buffer = buffer.split(b'\n\n', 1)
+                for line in event.split(b'\n'):
+                    if line.startswith(b'data: '):
+                        events.append((time.perf_counter(), json.loads(line[6:])['present_today']))
+    finally:
+        connection.close()
+
+
+async def device(port, batches, latencies, counters):
+    connection = Connection(port)
+    await connection.open()
+    try:
+        for batch in batches:
+            while True:
+                started = time.perf_counter()
+                status, headers, _ = await connection.request('POST', '/gateway/punches', {'punches': batch},
+                                                              headers={'X-Device-Token': TOKEN})
+                latencies.append(time.perf_counter() - started)
+                if status != 429:
+                    assert status == 202, status
+                    counters['accepted'] += len(batch)
+                    break
+                counters['backoff'] += 1
+                await asyncio.sleep(float(headers.get('retry-after', 1)) / 10)
+    finally:
+        connection.close()
+
+
+async def run(args, port, employee_ids):
+    control = Connection(port)
+    await control.open()
+    status, headers, _ = await control.request('POST', '/api/login', {
+        'username': 'admin', 'password': 'admin123', 'user_type': 'admin'})
+    assert status == 200, status
+    cookie = headers['set-cookie'].split(';', 1)[0]
+
+    # Subscribers first, so every one of them sees the whole morning
+    results = []
+    ready = asyncio.Semaphore(0)
+    started = time.perf_counter()
+    subscribers = [asyncio.ensure_future(subscriber(port, cookie, results, ready))
+                   for _ in range(args.subscribers)]
+    for _ in range(args.subscribers):
+        await ready.acquire()
+    print(f"  {args.subscribers:,} dashboard streams open in {time.perf_counter() - started:.2f}s")
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    punches = []
+    for employee_id in employee_ids:
+        at = datetime.strptime(today, '%Y-%m-%d') + timedelta(hours=8, minutes=random.randint(30, 70))
+        punches.append({'employee_id': employee_id, 'timestamp': at.isoformat(timespec='seconds'),
+                        'direction': 'in', 'device_id': 'gate'})
+    batches = [punches[i:i + args.batch] for i in range(0, len(punches), args.batch)]
+    per_device = [batches[i::args.devices] for i in range(args.devices)]
+
+    latencies = []
+    counters = {'accepted': 0, 'backoff': 0}
+    peak = {'connections': 0, 'subscribers': 0}
+    done = asyncio.Event()
+
+    async def sample_stats():
+        while not done.is_set():
+            _, _, body = await control.request('GET', '/gateway/stats')
+            stats = json.loads(body)
+            for name in peak:
+                peak[name] = max(peak[name], stats[name])
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.ensure_future(sample_stats())
+    started = time.perf_counter()
+    await asyncio.gather(*(device(port, batches, latencies, counters) for batches in per_device))
+    elapsed = time.perf_counter() - started
+    last_punch = time.perf_counter()
+    done.set()
+    await sampler
+
+    # Every punch is before 9:15, so consolidation ends with everyone present
+    final = len(employee_ids)
+    deadline = time.perf_counter() + 60
+    while time.perf_counter() < deadline:
+        _, _, body = await control.request('GET', '/api/reports/dashboard')
+        if json.loads(body)['present_today'] == final:
+            break
+        await asyncio.sleep(0.05)
+    consolidated = time.perf_counter() - last_punch
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline and not all(events and events[-1][1] == final for events in results):
+        await asyncio.sleep(0.05)
+    delivered = [next((t for t, value in events if value == final), None) for events in results]
+    missing = delivered.count(None)
+    delays = [t - last_punch for t in delivered if t is not None]
+
+    print(f"  peak {peak['connections']:,} open connections ({peak['subscribers']:,} dashboard streams)")
+    print(f"  {counters['accepted']:,} punches from {args.devices} devices in {elapsed:.2f}s "
+          f"({counters['accepted'] / elapsed:,.0f} punches/s, {len(latencies) / elapsed:,.0f} requests/s), "
+          f"{counters['backoff']} requests told to back off")
+    print(f"  punch request latency p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p95 {percentile(latencies, 95) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms, "
+          f"max {max(latencies) * 1000:.1f} ms")
+    events = [len(e) for e in results]
+    print(f"  consolidated {consolidated:.2f}s after the last punch; dashboard events per stream: "
+          f"min {min(events)}, avg {sum(events) / len(events):.1f}")
+    print(f"  head count {final:,} reached {len(delays):,} streams p50 {percentile(delays, 50):.2f}s / "
+          f"p99 {percentile(delays, 99):.2f}s after the last punch"
+          + (f", {missing} streams never saw it" if missing else ""))
+
+    for task in subscribers:
+        task.cancel()
+    await asyncio.gather(*subscribers, return_exceptions=True)
+    control.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--employees', type=int, default=5000)
+    parser.add_argument('--subscribers', type=int, default=1000)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=5, help='punches per request')
+    parser.add_argument('--port', type=int, help='use a gateway already running on this port')
+    parser.add_argument('--device-token', default=TOKEN)
+    args = parser.parse_args()
+    globals()['TOKEN'] = args.device_token
+
+    server = None
+    if args.port:
+        port = args.port
+        employee_ids = list(range(1, args.employees + 1))
+    else:
+        from store import create_store
+        workdir = tempfile.mkdtemp(prefix='hr-gateway-')
+        database = os.path.join(workdir, 'hr_data.db')
+        store = create_store('sqlite', database)
+        store.users.add_many([
+            {'name': f"Employee {i}", 'email': f"employee{i}@example.com", 'department': 'Operations',
+             'status': 'Active', 'salary': 50000}
+            for i in range(args.employees)
+        ])
+        employee_ids = [user['id'] for user in store.users]
+        port = random.randint(20000, 40000)
+        env = dict(os.environ, HR_STORAGE_BACKEND='sqlite', HR_DATABASE_PATH=database,
+                   HR_GENERATED_FOLDER=os.path.join(workdir, 'generated'), HR_PUNCH_DEVICE_TOKEN=TOKEN)
+        command = [sys.executable, 'gateway.py', '--port', str(port)]
+        if importlib.util.find_spec('uvicorn') is None:
+            command.append('--dev-server')
+        server = subprocess.Popen(command, cwd=ROOT, env=env)
+        wait_for_port(port)
+
+    print(f"gateway on port {port}: {len(employee_ids):,} employees, {args.subscribers:,} subscribers, "
+          f"{args.devices} devices, {args.batch} punches per request")
+    try:
+        asyncio.run(run(args, port, employee_ids))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Simulate door readers punching a workforce in and out.
+
+Several device threads post batches of punches to POST /api/punches through
+the Flask test client, starting with a 9:00 AM burst where every employee
+badges in within a few minutes.  Devices back off and retry when the
+pipeline answers 429.  Reports ingestion throughput, back-pressure
+rejections and how long consolidation takes to catch up, then checks that
+every employee-day ended up in attendance.
+
+    python benchmarks/simulate_punches.py                  # 2,000 employees, 1 day
+    python benchmarks/simulate_punches.py --employees 10000 --devices 16 --max-pending 5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def day_punches(employee_ids, date):
+    """Punch in around 9:00 (some late) and out after 4-10 hours."""
+    ins, outs = [], []
+    for employee_id in employee_ids:
+        start = datetime.strptime(date, '%Y-%m-%d') + timedelta(hours=8, minutes=random.randint(40, 80))
+        end = start + timedelta(minutes=random.randint(240, 600))
+        ins.append({'employee_id': employee_id, 'timestamp': start.isoformat(), 'direction': 'in'})
+        outs.append({'employee_id': employee_id, 'timestamp': end.isoformat(), 'direction': 'out'})
+    return ins, outs
+
+
+def run_devices(client, token, punches, devices, batch_size):
+    """Post punches from ``devices`` threads. Returns (elapsed, latencies, rejections)."""
+    batches = [punches[i:i + batch_size] for i in range(0, len(punches), batch_size)]
+    latencies = []
+    rejections = [0]
+    lock = threading.Lock()
+
+    def device(device_id):
+        while True:
+            with lock:
+                if not batches:
+                    return
+                batch = batches.pop()
+            for punch in batch:
+                punch['device_id'] = f"door-{device_id}"
+            while True:
+                start = time.perf_counter()
+                response = client.post('/api/punches', json={'punches': batch},
+                                       headers={'X-Device-Token': token})
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+                if response.status_code != 429:
+                    assert response.status_code == 202, response.get_json()
+                    break
+                with lock:
+                    rejections[0] += 1
+                time.sleep(float(response.headers.get('Retry-After', 1)) / 10)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=device, args=(i,)) for i in range(devices)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, rejections[0]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--employees', type=int, default=2000)
+    parser.add_argument('--devices', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=50, help='punches per request')
+    parser.add_argument('--max-pending', type=int, default=20000)
+    parser.add_argument('--backend', default='sqlite', choices=['sqlite', 'memory'])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hr-punches-')
+    os.environ.update({
+        'HR_STORAGE_BACKEND': args.backend,
+        'HR_DATABASE_PATH': os.path.join(workdir, 'hr_data.db'),
+        'HR_GENERATED_FOLDER': os.path.join(workdir, 'generated'),
+        'HR_PUNCH_DEVICE_TOKEN': 'simulator',
+        'HR_PUNCH_MAX_PENDING': str(args.max_pending),
+    })
+    os.chdir(ROOT)
+    import app as hr
+
+    hr.store.users.add_many([
+        {'name': f"Employee {i}", 'email': f"employee{i}@example.com", 'department': 'Operations',
+         'status': 'Active', 'salary': 50000}
+        for i in range(args.employees)
+    ])
+    employee_ids = [user['id'] for user in hr.store.users]
+    date = '2031-03-03'
+    ins, outs = day_punches(employee_ids, date)
+    client = hr.app.test_client()
+
+    print(f"{args.backend} backend, {len(employee_ids):,} employees, {args.devices} devices, "
+          f"{args.batch} punches per request, max {args.max_pending:,} pending")
+    for label, punches in (('9:00 burst (in)', ins), ('evening (out)', outs)):
+        elapsed, latencies, rejections = run_devices(client, 'simulator', punches, args.devices, args.batch)
+        lag_start = time.perf_counter()
+        while hr.punch_pipeline.pending:
+            time.sleep(0.01)
+        lag = time.perf_counter() - lag_start
+        print(f"  {label:16}: {len(punches):,} punches in {elapsed:.2f}s "
+              f"({len(punches) / elapsed:,.0f} punches/s), {rejections} requests told to back off, "
+              f"request p50 {percentile(latencies, 50) * 1000:.1f} ms / p99 {percentile(latencies, 99) * 1000:.1f} ms, "
+              f"consolidated {lag:.2f}s after the last punch")
+
+    hr.punch_pipeline.flush()
+    records = hr.store.attendance.find('date', date)
+    statuses = {}
+    for record in records:
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+    print(f"  attendance for {date}: {len(records):,} records {statuses}")
+    assert len(records) == len(employee_ids)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Hammer a store with concurrent creates, updates, deletes and reads.
+
+Writer threads add and delete attendance and users, upsert threads race to
+record the same (employee, date) days through ``locked()``, and reader
+threads page through and search the collections while all of that is
+going on.  Afterwards the invariants of the data layer are checked:
+
+- every id was handed out once, and ids grow monotonically per thread
+- deleted ids never come back, and the surviving ids are exactly the
+  added ones minus the deleted ones
+- indexes agree with the records, and pages are in id order without repeats
+- at most one attendance record exists per employee and day
+- the dashboard counters maintained by listeners match a full recount
+
+    python benchmarks/stress_store.py                       # every backend
+    python benchmarks/stress_store.py --backend memory --threads 16 --seconds 10
+
+Exits with status 1 if any invariant is violated.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from dashboard import DashboardCounters  # noqa: E402
+from store import create_store  # noqa: E402
+
+CONTESTED_DAYS = ['2031-05-%02d' % day for day in range(1, 11)]
+STATUSES = ['Present', 'Absent', 'Late', 'Half Day']
+
+
+class Run:
+    """Shared bookkeeping of one stress run."""
+
+    def __init__(self, store, employees, seconds):
+        self.store = store
+        self.employees = employees
+        self.deadline = time.perf_counter() + seconds
+        self.lock = threading.Lock()
+        self.preexisting = {'users': set(employees), 'attendance': set()}
+        self.added = {'users': [], 'attendance': []}
+        self.deleted = {'users': set(), 'attendance': set()}
+        self.violations = []
+        self.operations = {'writes': 0, 'reads': 0}
+
+    def running(self):
+        return time.perf_counter() < self.deadline
+
+    def violation(self, message):
+        with self.lock:
+            if len(self.violations) < 50:
+                self.violations.append(message)
+
+    def count(self, kind, n=1):
+        with self.lock:
+            self.operations[kind] += n
+
+
+def guarded(run, target):
+    def wrapper(*args):
+        try:
+            target(run, *args)
+        except Exception:
+            run.violation(f"{threading.current_thread().name} raised:\n{traceback.format_exc()}")
+    return wrapper
+
+
+def writer(run, seed):
+    """Add attendance and users, then delete some of what this thread added."""
+    rng = random.Random(seed)
+    mine = {'users': [], 'attendance': []}
+    previous = {'users': 0, 'attendance': 0}
+    while run.running():
+        name = 'attendance' if rng.random() < 0.8 else 'users'
+        collection = getattr(run.store, name)
+        if mine[name] and rng.random() < 0.4:
+            record_id = mine[name].pop(rng.randrange(len(mine[name])))
+            if collection.delete(record_id) is None:
+                run.violation(f"{name} {record_id} vanished before its owner deleted it")
+            with run.lock:
+                run.deleted[name].add(record_id)
+        else:
+            if name == 'attendance':
+                # Dates after the contested ones, so only upserters compete for a day
+                record = {'employee_id': rng.choice(run.employees),
+                          'date': '2032-%02d-%02d' % (rng.randint(1, 12), rng.randint(1, 28)),
+                          'status': rng.choice(STATUSES), 'hours_worked': 8, 'created_by': f"writer-{seed}"}
+            else:
+                record = {'name': f"Stress {seed}", 'email': f"stress{seed}@example.com",
+                          'department': f"Dept {seed % 5}", 'status': 'Active',
+                          'salary': rng.randint(30000, 90000)}
+            record_id = collection.add(record)['id']
+            if record_id <= previous[name]:
+                run.violation(f"{name} id {record_id} is not above this thread's previous id {previous[name]}")
+            previous[name] = record_id
+            mine[name].append(record_id)
+            with run.lock:
+                run.added[name].append(record_id)
+        run.count('writes')
+
+
+def upserter(run, seed):
+    """Record the contested days, creating each at most once."""
+    rng = random.Random(seed)
+    attendance = run.store.attendance
+    while run.running():
+        key = (rng.choice(run.employees[:5]), rng.choice(CONTESTED_DAYS))
+        status = rng.choice(STATUSES)
+        with attendance.locked():
+            existing = attendance.find_one('employee_date', key)
+            if existing:
+                attendance.update(existing['id'], {'status': status, 'created_by': f"upsert-{seed}"})
+            else:
+                record = attendance.add({'employee_id': key[0], 'date': key[1], 'status': status,
+                                         'hours_worked': 8, 'created_by': f"upsert-{seed}"})
+                with run.lock:
+                    run.added['attendance'].append(record['id'])
+        run.count('writes')
+
+
+def reader(run, seed):
+    """Page through and search both collections, checking what comes back."""
+    rng = random.Random(seed)
+    while run.running():
+        name = rng.choice(['users', 'attendance'])
+        collection = getattr(run.store, name)
+        if rng.random() < 0.5:
+            page = collection.page(after=rng.randint(0, 1000), limit=50)
+            ids = [record['id'] for record in page]
+            if ids != sorted(set(ids)):
+                run.violation(f"{name} page out of order or repeated: {ids[:10]}")
+        elif name == 'attendance':
+            employee_id = rng.choice(run.employees)
+            for record in collection.find('employee_id', employee_id):
+                if record['employee_id'] != employee_id:
+                    run.violation(f"attendance {record['id']} found under employee {employee_id}")
+        else:
+            department = f"Dept {rng.randrange(5)}"
+            for record in collection.find('department', department):
+                if record['department'] != department:
+                    run.violation(f"user {record['id']} found under {department}")
+        run.count('reads')
+
+
+def check(run, counters):
+    store = run.store
+    for name in ('users', 'attendance'):
+        collection = getattr(store, name)
+        ids = [record['id'] for record in collection]
+        added = run.added[name]
+        if len(added) != len(set(added)):
+            seen = set()
+            duplicates = sorted({i for i in added if i in seen or seen.add(i)})
+            run.violation(f"{name} ids handed out more than once: {duplicates[:10]}")
+        returned = set(ids) & run.deleted[name]
+        if returned:
+            run.violation(f"deleted {name} ids are back: {sorted(returned)[:10]}")
+        expected = (set(added) | run.preexisting[name]) - run.deleted[name]
+        if set(ids) != expected:
+            run.violation(f"{name}: {len(ids)} records, expected {len(expected)}")
+        if len(collection) != len(ids):
+            run.violation(f"{name}: len() says {len(collection)}, iteration {len(ids)}")
+        if ids and collection.next_id() <= max(ids):
+            run.violation(f"{name}: next id is not above the highest id {max(ids)}")
+    indexed = sum(store.attendance.count('employee_id', key) for key in store.attendance.keys('employee_id'))
+    if indexed != len(store.attendance):
+        run.violation(f"attendance employee index holds {indexed} records, collection {len(store.attendance)}")
+    for employee_id in run.employees[:5]:
+        for date in CONTESTED_DAYS:
+            if store.attendance.count('employee_date', (employee_id, date)) > 1:
+                run.violation(f"more than one attendance record for employee {employee_id} on {date}")
+    for name, values in counters.check().items():
+        current, expected = values['current'], values['expected']
+        if isinstance(expected, dict):
+            current, expected = ({k: v for k, v in current.items() if expected.get(k) != v},
+                                 {k: v for k, v in expected.items() if current.get(k) != v})
+        run.violation(f"dashboard counter {name} drifted: {current} instead of {expected}")
+
+
+def stress(backend, threads, seconds):
+    workdir = tempfile.mkdtemp(prefix='hr-stress-')
+    try:
+        if backend == 'columnar':
+            store = create_store('memory', columnar=True)
+        else:
+            store = create_store(backend, os.path.join(workdir, 'hr_data.db'))
+        store.users.add_many([
+            {'name': f"Employee {i}", 'email': f"employee{i}@example.com", 'department': f"Dept {i % 5}",
+             'status': 'Active', 'salary': 50000}
+            for i in range(50)
+        ])
+        counters = DashboardCounters(store)
+        employees = [user['id'] for user in store.users]
+        run = Run(store, employees, seconds)
+
+        roles = [writer] * max(1, threads // 2) + [upserter] * max(1, threads // 4) + [reader] * max(1, threads // 4)
+        workers = [threading.Thread(target=guarded(run, role), args=(i,), name=f"{role.__name__}-{i}")
+                   for i, role in enumerate(roles)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        check(run, counters)
+        print(f"{backend:>8}: {len(roles)} threads, {run.operations['writes'] / elapsed:,.0f} writes/s, "
+              f"{run.operations['reads'] / elapsed:,.0f} reads/s, {len(store.attendance):,} attendance, "
+              f"{len(store.users):,} users, {len(run.violations)} violations")
+        for message in run.violations:
+            print(f"  - {message}")
+        return not run.violations
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=['memory', 'columnar', 'sqlite', 'all'], default='all',
+                        help="'columnar' is the memory backend with columnar attendance")
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    # Switch threads often so races surface in a short run
+    sys.setswitchinterval(1e-6)
+    backends = ['memory', 'columnar', 'sqlite'] if args.backend == 'all' else [args.backend]
+    ok = all([stress(backend, args.threads, args.seconds) for backend in backends])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
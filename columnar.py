@@ -0,0 +1,760 @@
+"""
+Columnar in-memory storage for attendance history.
+
+As a dict, an attendance record costs about a kilobyte of heap: the dict
+itself, a fresh date string, time strings and floats per record, plus index
+entries.  Here every field is a typed array instead, with one slot per
+record: integer columns for ids and employee ids, date ordinals, minutes
+since midnight, fixed-point hours, and small integer codes for repeated
+strings such as status, creator and remarks (each distinct value is stored
+once; free-text remarks past the first few thousand distinct values are
+kept per record instead, so the table stays bounded).  Index buckets are arrays of ids, and the per-record
+(employee, date) index is answered from the (month, employee) buckets
+instead of being kept separately.  Date ranges of one employee bisect the
+employee's months with attendance and only read the buckets of those in
+the range.
+
+``ColumnarCollection`` implements the Collection API from store.py.  Like
+the SQLite backend it returns a fresh dict per read, so callers write
+changes back through ``update``.  Values a column cannot represent exactly
+(an unusual date format, a float with more than two decimals, a field
+outside the schema) are kept per record as they are, so every record reads
+back exactly as it was written.
+
+``dump`` and ``load`` move the arrays in and out as raw bytes, so a
+snapshot (see record_log.py) is restored without touching single records.
+"""
+
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from store import Observable, ReadWriteLock, timeline_add, timeline_discard, timeline_slice
+
+_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_TIME = re.compile(r'([01]\d|2[0-3]):[0-5]\d')
+
+# Raw array bytes are only portable between machines that agree on these
+ARRAY_LAYOUT = {'byteorder': sys.byteorder, 'itemsizes': {code: array(code).itemsize for code in 'BHhIiq'}}
+
+
+class Unfit(Exception):
+    """The value cannot be stored in the column without changing it."""
+
+
+class IntColumn:
+    """Integers (not bools) in a fixed-size signed array."""
+
+    def __init__(self, typecode='i'):
+        self.typecode = typecode
+        bits = array(typecode).itemsize * 8
+        self.missing = -2 ** (bits - 1)  # None
+        self._max = 2 ** (bits - 1) - 1
+
+    def encode(self, value):
+        if value is None:
+            return self.missing
+        if type(value) is not int or not self.missing < value <= self._max:
+            raise Unfit
+        return value
+
+    def decode(self, raw):
+        return None if raw == self.missing else raw
+
+
+class DateColumn:
+    """'YYYY-MM-DD' strings as day ordinals."""
+
+    typecode = 'i'
+    missing = 0
+
+    def __init__(self):
+        # Both directions for every date stored so far, so reads are a lookup
+        self._strings = {self.missing: None}
+        self._ordinals = {}
+        self.decode = self._strings.__getitem__
+
+    def encode(self, value):
+        ordinal = self._ordinals.get(value)
+        if ordinal is not None:
+            return ordinal
+        if value is None:
+            return self.missing
+        if type(value) is not str or not _DATE.fullmatch(value):
+            raise Unfit
+        try:
+            ordinal = date.fromisoformat(value).toordinal()
+        except ValueError:
+            raise Unfit
+        self._strings[ordinal] = value
+        self._ordinals[value] = ordinal
+        return ordinal
+
+    def snapshot(self):
+        return [ordinal for ordinal in self._strings if ordinal != self.missing]
+
+    def restore(self, data, saved):
+        """Make the ordinals of a loaded array decodable; ``saved`` is snapshot() output."""
+        for ordinal in saved:
+            if ordinal not in self._strings:
+                value = date.fromordinal(ordinal).isoformat()
+                self._strings[ordinal] = value
+                self._ordinals[value] = ordinal
+
+
+class TimeColumn:
+    """'HH:MM' strings as minutes since midnight."""
+
+    typecode = 'h'
+    missing = -1
+    # Index -1 (missing) is the trailing None
+    _strings = [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60)] + [None]
+    decode = _strings.__getitem__
+
+    def encode(self, value):
+        if value is None:
+            return self.missing
+        if type(value) is not str or not _TIME.fullmatch(value):
+            raise Unfit
+        return int(value[:2]) * 60 + int(value[3:])
+
+
+class NumberColumn:
+    """Ints and floats with up to two decimals, such as hours.
+
+    Stored as hundredths, doubled, with the low bit telling floats from ints
+    so 8 and 8.0 stay distinct.
+    """
+
+    typecode = 'i'
+    missing = -2 ** 31
+
+    def encode(self, value):
+        if value is None:
+            return self.missing
+        kind = type(value)
+        if kind is not int and kind is not float:
+            raise Unfit
+        try:
+            hundredths = round(value * 100)
+        except (OverflowError, ValueError):  # inf, nan
+            raise Unfit
+        if not -2 ** 29 < hundredths < 2 ** 29:
+            raise Unfit
+        raw = hundredths * 2 + (kind is float)
+        if self.decode(raw) != value:
+            raise Unfit
+        return raw
+
+    def decode(self, raw):
+        if raw == self.missing:
+            return None
+        hundredths = raw >> 1
+        return hundredths / 100 if raw & 1 else hundredths // 100
+
+
+class CodedColumn:
+    """Repeated values (strings, None) as codes into a table of distinct values.
+
+    The table only grows.  Past ``limit`` distinct values new ones do not fit
+    the column, so a field with open-ended values (free text) costs a bounded
+    table plus the odd value kept with its record.
+    """
+
+    def __init__(self, typecode='B', limit=None):
+        self.typecode = typecode
+        self._limit = 2 ** (array(typecode).itemsize * 8)
+        if limit is not None:
+            self._limit = min(self._limit, limit)
+        self.values = []
+        self._codes = {}
+        self.decode = self.values.__getitem__
+
+    def encode(self, value):
+        if type(value) is not str and value is not None:
+            raise Unfit
+        code = self._codes.get(value)
+        if code is None:
+            if len(self.values) >= self._limit:
+                raise Unfit
+            code = self._add(value)
+        return code
+
+    def _add(self, value):
+        code = self._codes[value] = len(self.values)
+        self.values.append(value)
+        return code
+
+    def snapshot(self):
+        return list(self.values)
+
+    def restore(self, data, saved):
+        """Map the codes of a loaded array, taken from the ``saved`` table, onto this table."""
+        # Every saved value is kept, even past the limit: records already use them
+        codes = [self._codes[value] if value in self._codes else self._add(value) for value in saved]
+        if codes != list(range(len(codes))):
+            data[:] = array(self.typecode, [codes[code] for code in data])
+
+
+# Distinct remarks given a code; rarer ones are stored with their record
+REMARKS_LIMIT = 4096
+
+def new_attendance_columns():
+    """Attendance fields in the order records are read back.
+
+    Date and coded columns keep their value tables, so every collection
+    gets columns of its own.
+    """
+    return (
+        ('employee_id', IntColumn('i')),
+        ('date', DateColumn()),
+        ('status', CodedColumn('B')),
+        ('hours_worked', NumberColumn()),
+        ('check_in', TimeColumn()),
+        ('check_out', TimeColumn()),
+        ('remarks', CodedColumn('I', limit=REMARKS_LIMIT)),
+        ('created_by', CodedColumn('B')),
+        ('created_date', DateColumn()),
+        ('overtime_hours', NumberColumn()),
+        ('punch_count', IntColumn('i')),
+    )
+
+# Indexes kept as a coarser index plus one field that tells the records of a
+# coarse bucket apart, instead of one bucket per record
+ATTENDANCE_NARROWED = {'employee_date': ('month_employee', 'date')}
+
+
+class ColumnarCollection(Observable):
+    """Collection API over typed column arrays.
+
+    ``columns`` is a sequence of (field, column) pairs, at most 16, used by
+    this collection only; by default the attendance columns.  Rows are
+    kept in id order, so a record is found by bisecting the id array.
+    ``narrowed`` maps an index name to (coarser index, field), see
+    ATTENDANCE_NARROWED: the field's encoded values are kept in an array
+    parallel to each bucket of the coarser index, which must be keyed on the
+    index's other fields.  The field must be a column with a ``missing``
+    value.  A narrowed index in ``ranges`` must be narrowed by its last
+    field, and the coarser index's remaining field must sort like it (the
+    month of a date): its timeline holds the coarser keys.
+    """
+
+    def __init__(self, name, indexes=None, derived=None, log_changes=True, ranges=(),
+                 columns=None, narrowed=None):
+        if columns is None:
+            columns = new_attendance_columns()
+        if len(columns) > 16:
+            raise ValueError("At most 16 columns are supported")
+        self.name = name
+        self._listeners = []
+        self._lock = ReadWriteLock()
+        self._write_lock = threading.RLock()
+        self._columns = tuple(columns)
+        self._column_index = {field: i for i, (field, _) in enumerate(self._columns)}
+        self._ids = array('q')
+        self._data = [array(column.typecode) for _, column in self._columns]
+        self._present = array('H')  # bit i set: the record has column i's field
+        self._readers = [(1 << i, field, column.decode, data)
+                         for i, ((field, column), data) in enumerate(zip(self._columns, self._data))]
+        self._extras = {}  # id -> fields kept as they are
+        self._next_id = 1
+        self._derived = derived or {}
+        self._index_fields = {}
+        self._indexes = {}
+        self._narrowed = {}  # index name -> (coarse index, field, column)
+        self._residuals = {}  # coarse index -> (field, column, {key: array parallel to the bucket})
+        for index_name, fields in (indexes or {}).items():
+            if isinstance(fields, str):
+                fields = (fields,)
+            self._index_fields[index_name] = tuple(fields)
+            self._indexes[index_name] = {}
+        for index_name, (coarse, field) in (narrowed or {}).items():
+            column = dict(self._columns).get(field)
+            fields = self._index_fields.get(index_name, ())
+            if (coarse not in self._index_fields or coarse in self._residuals or not hasattr(column, 'missing')
+                    or not set(fields) - {field} <= set(self._index_fields[coarse])):
+                raise ValueError(f"Index {index_name} cannot be narrowed from {coarse} by {field}")
+            del self._indexes[index_name]
+            self._narrowed[index_name] = (coarse, field, column)
+            self._residuals[coarse] = (field, column, {})
+        # index name -> {other fields' values: sorted last field values, or
+        # coarser keys for a narrowed index}
+        self._timelines = {}
+        self._timeline_sources = {}  # index whose bucket keys are on the timeline -> ranged indexes
+        for index_name in ranges:
+            source = index_name
+            if index_name in self._narrowed:
+                source, field, _ = self._narrowed[index_name]
+                if self._index_fields[index_name][-1] != field:
+                    raise ValueError(f"Index {index_name} is narrowed by {field}, not by its last field")
+            self._timelines[index_name] = {}
+            self._timeline_sources.setdefault(source, []).append(index_name)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __bool__(self):
+        return bool(self._ids)
+
+    # Encoding
+
+    def _encode(self, record):
+        """Return (raw column values, presence bits, extras) for a record."""
+        raws = []
+        present = 0
+        extras = {}
+        for i, (field, column) in enumerate(self._columns):
+            if field in record:
+                try:
+                    raws.append(column.encode(record[field]))
+                    present |= 1 << i
+                    continue
+                except Unfit:
+                    extras[field] = record[field]
+            raws.append(0)  # not read: the presence bit is clear
+        for field, value in record.items():
+            if field != 'id' and field not in self._column_index:
+                extras[field] = value
+        return raws, present, extras
+
+    def _decode(self, row):
+        record_id = self._ids[row]
+        record = {'id': record_id}
+        present = self._present[row]
+        for bit, field, decode, data in self._readers:
+            if present & bit:
+                record[field] = decode(data[row])
+        if record_id in self._extras:
+            record.update(self._extras[record_id])
+        return record
+
+    def _row(self, record_id):
+        row = bisect_left(self._ids, record_id)
+        if row < len(self._ids) and self._ids[row] == record_id:
+            return row
+        return None
+
+    # Indexes
+
+    def _field(self, record, field):
+        if field in self._derived:
+            return self._derived[field](record)
+        return record.get(field)
+
+    def _index_key(self, index_name, record):
+        fields = self._index_fields[index_name]
+        if len(fields) == 1:
+            return self._field(record, fields[0])
+        return tuple(self._field(record, field) for field in fields)
+
+    def _residual(self, column, value):
+        """The encoded value kept for narrowing, ``missing`` if it has none."""
+        if value is None:
+            return column.missing
+        try:
+            return column.encode(value)
+        except Unfit:
+            return column.missing
+
+    def _timeline_entry(self, ranged, source, key):
+        """(timeline prefix, value) under which ``source``'s bucket key goes on ``ranged``'s timelines."""
+        fields = self._index_fields[ranged]
+        if source == ranged:
+            return (key[:-1], key[-1]) if len(fields) > 1 else ((), key)
+        values = dict(zip(self._index_fields[source], key if isinstance(key, tuple) else (key,)))
+        return tuple(values[field] for field in fields[:-1]), key
+
+    def _index_add(self, record):
+        record_id = record['id']
+        for index_name, buckets in self._indexes.items():
+            key = self._index_key(index_name, record)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = array('q')
+                for ranged in self._timeline_sources.get(index_name, ()):
+                    timeline_add(self._timelines[ranged], *self._timeline_entry(ranged, index_name, key))
+            pos = len(bucket) if not bucket or record_id > bucket[-1] else bisect_left(bucket, record_id)
+            bucket.insert(pos, record_id)
+            if index_name in self._residuals:
+                field, column, residuals = self._residuals[index_name]
+                if key not in residuals:
+                    residuals[key] = array(column.typecode)
+                residuals[key].insert(pos, self._residual(column, record.get(field)))
+
+    def _index_remove(self, record):
+        for index_name, buckets in self._indexes.items():
+            key = self._index_key(index_name, record)
+            bucket = buckets.get(key)
+            if not bucket:
+                continue
+            pos = bisect_left(bucket, record['id'])
+            if pos < len(bucket) and bucket[pos] == record['id']:
+                del bucket[pos]
+                if index_name in self._residuals:
+                    del self._residuals[index_name][2][key][pos]
+            if not bucket:
+                del buckets[key]
+                if index_name in self._residuals:
+                    del self._residuals[index_name][2][key]
+                for ranged in self._timeline_sources.get(index_name, ()):
+                    timeline_discard(self._timelines[ranged], *self._timeline_entry(ranged, index_name, key))
+
+    def _ids_for(self, index_name, key):
+        """Ids of the records whose index key equals ``key``, in id order."""
+        narrowed = self._narrowed.get(index_name)
+        if narrowed is None:
+            return self._indexes[index_name].get(key, ())
+        coarse, field, column = narrowed
+        fields = self._index_fields[index_name]
+        probe = dict(zip(fields, (key,) if len(fields) == 1 else key))
+        coarse_key = self._index_key(coarse, probe)
+        bucket = self._indexes[coarse].get(coarse_key)
+        if not bucket:
+            return ()
+        raw = self._residual(column, probe.get(field))
+        if raw == column.missing:
+            # None and unencodable values all share ``missing``: compare whole records
+            return [record_id for record_id in bucket
+                    if self._index_key(index_name, self._decode(self._row(record_id))) == key]
+        residuals = self._residuals[coarse][2][coarse_key]
+        ids = []
+        start = 0
+        try:
+            while True:
+                # Buckets are small; slicing keeps this working before Python 3.10's index(x, start)
+                pos = start + residuals[start:].index(raw)
+                ids.append(bucket[pos])
+                start = pos + 1
+        except ValueError:
+            return ids
+
+    # Reads
+
+    def get(self, record_id):
+        """Return the record with the given id, or None."""
+        with self._lock.read:
+            row = self._row(record_id)
+            return self._decode(row) if row is not None else None
+
+    def all(self):
+        """Return every record in id order."""
+        with self._lock.read:
+            return [self._decode(row) for row in range(len(self._ids))]
+
+    def last(self):
+        """Return the record with the highest id, or None."""
+        with self._lock.read:
+            return self._decode(len(self._ids) - 1) if self._ids else None
+
+    def find(self, index_name, key):
+        """Return all records whose index key equals ``key``, in id order."""
+        with self._lock.read:
+            return [self._decode(self._row(record_id)) for record_id in self._ids_for(index_name, key)]
+
+    def find_one(self, index_name, key):
+        """Return the first record whose index key equals ``key``, or None."""
+        with self._lock.read:
+            ids = self._ids_for(index_name, key)
+            return self._decode(self._row(ids[0])) if ids else None
+
+    def find_range(self, index_name, start=None, end=None, prefix=()):
+        """Return the records whose index key ends in a value from ``start`` to ``end``.
+
+        ``prefix`` holds the values of the index's other fields; both bounds
+        are inclusive and None leaves that side open.  Records come in key
+        order, and in id order within a key.
+        """
+        prefix = tuple(prefix)
+        with self._lock.read:
+            timeline = self._timelines[index_name].get(prefix, ())
+            if index_name in self._narrowed:
+                ids = self._narrowed_range(index_name, timeline, start, end, prefix)
+            else:
+                buckets = self._indexes[index_name]
+                ids = []
+                for value in timeline_slice(timeline, start, end):
+                    ids.extend(buckets[prefix + (value,) if prefix else value])
+            return [self._decode(self._row(record_id)) for record_id in ids]
+
+    def _narrowed_range(self, index_name, timeline, start, end, prefix):
+        """Ids for find_range() on a narrowed index, from the coarser buckets in the range."""
+        coarse, field, column = self._narrowed[index_name]
+        probe = dict(zip(self._index_fields[index_name][:-1], prefix))
+        low, high = (None if bound is None else self._index_key(coarse, dict(probe, **{field: bound}))
+                     for bound in (start, end))
+        residuals = self._residuals[coarse][2]
+        matches = []
+        for coarse_key in timeline_slice(timeline, low, high):
+            for record_id, raw in zip(self._indexes[coarse][coarse_key], residuals[coarse_key]):
+                if raw == column.missing:
+                    # None or a value the column could not encode: compare what was stored
+                    value = self._decode(self._row(record_id)).get(field)
+                else:
+                    value = column.decode(raw)
+                try:
+                    if value is not None and (start is None or value >= start) and (end is None or value <= end):
+                        matches.append((value, record_id))
+                except TypeError:
+                    pass
+        matches.sort()
+        return [record_id for _, record_id in matches]
+
+    def page(self, index_name=None, key=None, after=None, limit=100):
+        """Return up to ``limit`` records with id greater than ``after``, in id order."""
+        with self._lock.read:
+            if index_name is None:
+                start = bisect_right(self._ids, after) if after else 0
+                return [self._decode(row) for row in range(start, min(start + limit, len(self._ids)))]
+            ids = self._ids_for(index_name, key)
+            start = bisect_right(ids, after) if after else 0
+            return [self._decode(self._row(record_id)) for record_id in ids[start:start + limit]]
+
+    def count(self, index_name, key):
+        """Return the number of records whose index key equals ``key``."""
+        with self._lock.read:
+            return len(self._ids_for(index_name, key))
+
+    def keys(self, index_name):
+        """Return the distinct keys currently present in an index."""
+        with self._lock.read:
+            if index_name not in self._narrowed:
+                return list(self._indexes[index_name].keys())
+            keys = {self._index_key(index_name, self._decode(row)) for row in range(len(self._ids))}
+        return list(keys)
+
+    # Writes
+
+    def locked(self):
+        """Hold off other writers of this collection for the ``with`` block.
+
+        Makes a read followed by a write atomic; readers are not blocked.
+        Only write to this collection inside the block.
+        """
+        return self._write_lock
+
+    def next_id(self):
+        """Reserve and return a new id. Ids are never reused after a delete."""
+        with self._write_lock:
+            record_id = self._next_id
+            self._next_id += 1
+        return record_id
+
+    def _insert(self, record):
+        raws, present, extras = self._encode(record)
+        if record.get('id') is None:
+            record['id'] = self._next_id
+        record_id = record['id']
+        if not self._ids or record_id > self._ids[-1]:
+            self._ids.append(record_id)
+            for data, raw in zip(self._data, raws):
+                data.append(raw)
+            self._present.append(present)
+        else:
+            row = bisect_left(self._ids, record_id)
+            if row < len(self._ids) and self._ids[row] == record_id:
+                raise KeyError(f"{self.name} record {record_id} already exists")
+            self._ids.insert(row, record_id)
+            for data, raw in zip(self._data, raws):
+                data.insert(row, raw)
+            self._present.insert(row, present)
+        self._next_id = max(self._next_id, record_id + 1)
+        if extras:
+            self._extras[record_id] = extras
+        self._index_add(record)
+
+    def add(self, record):
+        """Insert a record, assigning it the next id if it has none."""
+        with self._write_lock:
+            with self._lock.write:
+                self._insert(record)
+            self._notify('add', None, record)
+        return record
+
+    def add_many(self, records):
+        """Insert several records. Returns them with ids assigned."""
+        inserted = []
+        with self._write_lock:
+            try:
+                with self._lock.write:
+                    for record in records:
+                        self._insert(record)
+                        inserted.append(record)
+            finally:
+                for record in inserted:
+                    self._notify('add', None, record)
+        return records
+
+    def update(self, record_id, changes):
+        """Apply ``changes`` to a record and re-index it. Returns the record."""
+        with self._write_lock:
+            with self._lock.write:
+                row = self._row(record_id)
+                if row is None:
+                    return None
+                old = self._decode(row)
+                record = dict(old)
+                record.update({k: v for k, v in changes.items() if k != 'id'})
+                raws, present, extras = self._encode(record)
+                for data, raw in zip(self._data, raws):
+                    data[row] = raw
+                self._present[row] = present
+                if extras:
+                    self._extras[record_id] = extras
+                else:
+                    self._extras.pop(record_id, None)
+                self._index_remove(old)
+                self._index_add(record)
+            self._notify('update', old, record)
+        return record
+
+    def delete(self, record_id):
+        """Remove a record. Returns the removed record, or None."""
+        with self._write_lock:
+            with self._lock.write:
+                row = self._row(record_id)
+                if row is None:
+                    return None
+                record = self._decode(row)
+                del self._ids[row]
+                for data in self._data:
+                    del data[row]
+                del self._present[row]
+                self._extras.pop(record_id, None)
+                self._index_remove(record)
+            self._notify('delete', record, None)
+        return record
+
+    # Snapshots (see record_log.py)
+
+    def dump(self):
+        """Return (state, blocks) holding every record: JSON-serializable state and a list of bytes.
+
+        The blocks are the id, presence and column arrays followed by the
+        buckets (and narrowing values) of every index, each index as one
+        block.  Call it inside ``locked()`` so no write lands halfway through.
+        """
+        with self._lock.read:
+            blocks = [self._ids.tobytes(), self._present.tobytes()] + [data.tobytes() for data in self._data]
+            indexes = {}
+            for index_name, buckets in self._indexes.items():
+                keys = list(buckets)
+                blocks.append(b''.join([buckets[key].tobytes() for key in keys]))
+                if index_name in self._residuals:
+                    residuals = self._residuals[index_name][2]
+                    blocks.append(b''.join([residuals[key].tobytes() for key in keys]))
+                indexes[index_name] = {
+                    'keys': keys,
+                    'lengths': [len(buckets[key]) for key in keys],
+                    'residuals': index_name in self._residuals,
+                }
+            state = {
+                'layout': ARRAY_LAYOUT,
+                'next_id': self._next_id,
+                'columns': [field for field, _ in self._columns],
+                'values': {field: column.snapshot() for field, column in self._columns
+                           if hasattr(column, 'snapshot')},
+                'extras': list(self._extras.items()),
+                'indexes': indexes,
+            }
+        return state, blocks
+
+    def load(self, state, blocks):
+        """Fill an empty collection from dump() output without notifying listeners.
+
+        ``blocks`` may be memoryviews into a mapped file.  Indexes are taken
+        over as saved when the collection has the same ones, and rebuilt
+        from the records otherwise.
+        """
+        if state['layout'] != ARRAY_LAYOUT:
+            raise ValueError("Snapshot was written on a machine with a different array layout")
+        if state['columns'] != [field for field, _ in self._columns]:
+            raise ValueError(f"Snapshot columns {state['columns']} do not match {self.name}")
+        blocks = iter(blocks)
+        with self._write_lock:
+            with self._lock.write:
+                if self._ids:
+                    raise ValueError(f"{self.name} must be empty to load a snapshot")
+                self._ids.frombytes(next(blocks))
+                self._present.frombytes(next(blocks))
+                for (field, column), data in zip(self._columns, self._data):
+                    data.frombytes(next(blocks))
+                    if field in state['values']:
+                        column.restore(data, state['values'][field])
+                self._extras = {record_id: fields for record_id, fields in state['extras']}
+                self._next_id = max(self._next_id, state['next_id'])
+
+                same_indexes = (state['indexes'].keys() == self._indexes.keys() and
+                                all(saved['residuals'] == (name in self._residuals)
+                                    for name, saved in state['indexes'].items()))
+                for index_name, saved in state['indexes'].items():
+                    ids = next(blocks)
+                    residual_data = next(blocks) if saved['residuals'] else None
+                    if not same_indexes:
+                        continue
+                    self._load_index(index_name, saved, ids, residual_data)
+                if not same_indexes:
+                    for row in range(len(self._ids)):
+                        self._index_add(self._decode(row))
+                else:
+                    for source, ranged_indexes in self._timeline_sources.items():
+                        for key in self._indexes[source]:
+                            for ranged in ranged_indexes:
+                                timeline_add(self._timelines[ranged], *self._timeline_entry(ranged, source, key))
+
+    def _load_index(self, index_name, saved, ids, residual_data):
+        buckets = self._indexes[index_name]
+        multiple = len(self._index_fields[index_name]) > 1
+        all_ids = array('q')
+        all_ids.frombytes(ids)
+        if residual_data is not None:
+            _, column, residuals = self._residuals[index_name]
+            all_residuals = array(column.typecode)
+            all_residuals.frombytes(residual_data)
+        start = 0
+        for key, length in zip(saved['keys'], saved['lengths']):
+            # JSON turned tuple keys into lists
+            key = tuple(key) if multiple else key
+            buckets[key] = all_ids[start:start + length]
+            if residual_data is not None:
+                residuals[key] = all_residuals[start:start + length]
+            start += length
+
+    # Footprint
+
+    def memory_usage(self):
+        """Approximate heap bytes held, by part."""
+        with self._lock.read:
+            columns = {field: sys.getsizeof(data) for (field, _), data in zip(self._columns, self._data)}
+            columns['id'] = sys.getsizeof(self._ids)
+            columns['present'] = sys.getsizeof(self._present)
+            values = sum(sys.getsizeof(column.values) + sum(sys.getsizeof(v) for v in column.values)
+                         for _, column in self._columns if isinstance(column, CodedColumn))
+            indexes = 0
+            for buckets in self._indexes.values():
+                indexes += sys.getsizeof(buckets)
+                for key, bucket in buckets.items():
+                    indexes += sys.getsizeof(bucket) + (sys.getsizeof(key) if isinstance(key, tuple) else 0)
+            extras = sys.getsizeof(self._extras) + sum(
+                sys.getsizeof(fields) + sum(sys.getsizeof(v) for v in fields.values())
+                for fields in self._extras.values())
+            usage = {
+                'records': len(self._ids),
+                'columns': columns,
+                'coded_values': values,
+                'indexes': indexes,
+                'extras': extras,
+            }
+        usage['total'] = sum(columns.values()) + values + indexes + extras
+        usage['bytes_per_record'] = round(usage['total'] / usage['records'], 1) if usage['records'] else 0
+        return usage
+
+
+def attendance_columns(name, **options):
+    """Collection factory for attendance in columnar form."""
+    return ColumnarCollection(name, columns=new_attendance_columns(), narrowed=ATTENDANCE_NARROWED, **options)
@@ -0,0 +1,139 @@
+"""
+Materialized dashboard counters.
+
+The numbers shown on the admin dashboard are kept up to date by store
+listeners on every user, attendance and leave request write, so reading the
+dashboard is O(1) instead of a scan over all records.  ``check`` recomputes
+everything from the raw data to verify the counters, and ``rebuild``
+replaces them with the recomputed values.  Created with ``build=False``, the
+counters are computed by the first read instead of up front.
+"""
+
+import threading
+from collections import Counter
+
+
+class DashboardCounters:
+    """Running totals behind /api/reports/dashboard."""
+
+    def __init__(self, store, build=True):
+        self.store = store
+        self._lock = threading.Lock()
+        self._counters = None  # until built, writes are left to the first build
+        if build:
+            self.rebuild()
+        store.users.subscribe(self._on_user)
+        store.attendance.subscribe(self._on_attendance)
+        store.leave_requests.subscribe(self._on_leave_request)
+
+    def _compute(self):
+        counters = {
+            'total_employees': 0,
+            'active_employees': 0,
+            'salary_total': 0,
+            'departments': Counter(),
+            'present_by_date': Counter(),
+            'pending_leaves': 0
+        }
+        for user in self.store.users:
+            self._apply_user(counters, user, 1)
+        for attendance in self.store.attendance:
+            self._apply_attendance(counters, attendance, 1)
+        counters['pending_leaves'] = self.store.leave_requests.count('status', 'Pending')
+        return counters
+
+    def rebuild(self):
+        """Recompute every counter from the raw data.
+
+        Writes to the counted collections, including those replayed from
+        other processes, wait until the new counters are in place, so none
+        is lost or counted twice.
+        """
+        store = self.store
+        with store.rebuilding(), store.users.writes_paused(), store.attendance.writes_paused(), \
+                store.leave_requests.writes_paused():
+            counters = self._compute()
+            with self._lock:
+                self._counters = counters
+
+    def check(self):
+        """Compare the counters with freshly computed values.
+
+        Returns a dict of counter name -> {'current', 'expected'} for every
+        counter that has drifted; empty when everything is consistent.
+        """
+        self._build_once()
+        store = self.store
+        with store.rebuilding(), store.users.writes_paused(), store.attendance.writes_paused(), \
+                store.leave_requests.writes_paused(), self._lock:
+            expected = self._compute()
+            current = self._counters
+            differences = {}
+            for name, value in expected.items():
+                current_value = current[name]
+                if isinstance(value, Counter):
+                    # Zero entries are left behind by deletes and do not count as drift
+                    current_value = {k: v for k, v in current_value.items() if v}
+                    value = {k: v for k, v in value.items() if v}
+                if current_value != value:
+                    differences[name] = {'current': current_value, 'expected': value}
+        return differences
+
+    def _build_once(self):
+        if self._counters is None:
+            self.rebuild()
+
+    @staticmethod
+    def _apply_user(counters, user, sign):
+        counters['total_employees'] += sign
+        if user.get('status') == 'Active':
+            counters['active_employees'] += sign
+        counters['salary_total'] += sign * (user.get('salary') or 0)
+        counters['departments'][user.get('department')] += sign
+
+    @staticmethod
+    def _apply_attendance(counters, attendance, sign):
+        if attendance.get('status') == 'Present':
+            counters['present_by_date'][attendance.get('date')] += sign
+
+    def _on_user(self, action, old, new):
+        with self._lock:
+            if self._counters is None:
+                return
+            if old:
+                self._apply_user(self._counters, old, -1)
+            if new:
+                self._apply_user(self._counters, new, 1)
+
+    def _on_attendance(self, action, old, new):
+        with self._lock:
+            if self._counters is None:
+                return
+            if old:
+                self._apply_attendance(self._counters, old, -1)
+            if new:
+                self._apply_attendance(self._counters, new, 1)
+
+    def _on_leave_request(self, action, old, new):
+        with self._lock:
+            if self._counters is None:
+                return
+            if old and old.get('status') == 'Pending':
+                self._counters['pending_leaves'] -= 1
+            if new and new.get('status') == 'Pending':
+                self._counters['pending_leaves'] += 1
+
+    def snapshot(self, today):
+        """The dashboard payload for ``today`` (YYYY-MM-DD)."""
+        self._build_once()
+        with self._lock:
+            counters = self._counters
+            total = counters['total_employees']
+            return {
+                "total_employees": total,
+                "active_employees": counters['active_employees'],
+                "departments": len([d for d, n in counters['departments'].items() if n > 0]),
+                "avg_salary": round(counters['salary_total'] / total, 2) if total else 0,
+                "present_today": counters['present_by_date'][today],
+                "pending_leaves": counters['pending_leaves']
+            }
@@ -0,0 +1,193 @@
+"""
+Live change events for admin dashboards.
+
+Store listeners turn every write to the watched collections into a small
+delta (the whole record when it is added, only the changed fields when it is
+updated, the id when it is deleted), encode it once as a server-sent event
+frame and fan it out to every subscriber.  Each subscriber has a bounded
+queue: one that falls ``queue_size`` events behind is dropped and told to
+reload instead of holding memory for it.  Recent frames are kept so a client
+reconnecting with ``Last-Event-ID`` only receives what it missed.
+"""
+
+import os
+import threading
+from collections import deque
+
+from json_fast import dumps_bytes
+
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+
+
+def frame(event, data, event_id=None):
+    """Encode one server-sent event."""
+    lines = [b'id: ' + event_id.encode()] if event_id is not None else []
+    lines.append(b'event: ' + event.encode())
+    lines.append(b'data: ' + dumps_bytes(data))
+    return b'\n'.join(lines) + b'\n\n'
+
+
+class Subscription:
+    """Bounded queue of encoded frames for one client.
+
+    ``wake`` is called (from the writing thread) when the queue goes from
+    empty to non-empty, for consumers that do not block in ``wait``.
+    """
+
+    def __init__(self, maxsize, wake=None):
+        self.maxsize = maxsize
+        self.dropped = False
+        self._frames = deque()
+        self._collections = set()  # collections with events since the last drain
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._wake = wake
+
+    def put(self, collection, payload):
+        """Queue a frame. Returns False once the subscriber has been dropped."""
+        with self._lock:
+            if self.dropped:
+                return False
+            if len(self._frames) >= self.maxsize:
+                self.dropped = True
+                self._frames.clear()
+            else:
+                self._frames.append(payload)
+                self._collections.add(collection)
+            wake = not self._ready.is_set()
+            self._ready.set()
+        if wake and self._wake:
+            self._wake()
+        return not self.dropped
+
+    def wait(self, timeout):
+        """Block until frames are queued. Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    def drain(self):
+        """Return (frames, collections) queued since the last drain."""
+        with self._lock:
+            frames, self._frames = list(self._frames), deque()
+            collections, self._collections = self._collections, set()
+            self._ready.clear()
+        return frames, collections
+
+
+class EventHub:
+    """Publishes deltas of store writes to live subscribers.
+
+    ``collections`` maps a collection name to the record fields never sent,
+    e.g. ``{'users': ('password',)}``.  ``summary`` is an optional callable
+    whose result is sent as a ``dashboard`` event after any batch of events
+    from the ``summary_on`` collections.
+    """
+
+    def __init__(self, store, collections, summary=None, summary_on=(), queue_size=1000, history=1000):
+        self.summary = summary
+        self.summary_on = set(summary_on)
+        self.queue_size = queue_size
+        # Event ids of an earlier process must not be mistaken for this one's
+        self._instance = os.urandom(4).hex()
+        self._next_id = 1
+        self._history = deque(maxlen=history)  # (sequence, collection, frame)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.stats = {'published': 0, 'dropped': 0}
+        for name, hidden in collections.items():
+            getattr(store, name).subscribe(self._listener(name, set(hidden)))
+
+    def _listener(self, name, hidden):
+        def publish(action, old, new):
+            if action == 'add':
+                data = {'action': action, 'id': new['id'],
+                        'record': {k: v for k, v in new.items() if k not in hidden}}
+            elif action == 'update':
+                changes = {k: v for k, v in new.items() if k not in hidden and old.get(k) != v}
+                if not changes:
+                    return
+                data = {'action': action, 'id': new['id'], 'changes': changes}
+            else:
+                data = {'action': action, 'id': old['id']}
+            self.publish(name, data)
+        return publish
+
+    def publish(self, collection, data):
+        """Send ``data`` as a ``collection`` event to every subscriber."""
+        with self._lock:
+            sequence = self._next_id
+            self._next_id += 1
+            payload = frame(collection, data, f"{self._instance}-{sequence}")
+            self._history.append((sequence, collection, payload))
+            self.stats['published'] += 1
+            # Queued under the lock so every subscriber sees events in id order
+            for subscription in list(self._subscribers):
+                if not subscription.put(collection, payload):
+                    self._subscribers.discard(subscription)
+                    self.stats['dropped'] += 1
+
+    def reset(self):
+        """Tell every subscriber to reload, e.g. after changes were missed."""
+        self.publish('reset', {'reason': 'Data was reloaded'})
+
+    def _sequence(self, last_event_id):
+        instance, _, sequence = (last_event_id or '').partition('-')
+        if instance != self._instance or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def subscribe(self, last_event_id=None, wake=None):
+        """Register a subscriber, replaying the events after ``last_event_id`` if still known."""
+        subscription = Subscription(self.queue_size, wake)
+        with self._lock:
+            if last_event_id:
+                sequence = self._sequence(last_event_id)
+                oldest = self._history[0][0] if self._history else self._next_id
+                if sequence is None or not oldest - 1 <= sequence < self._next_id:
+                    subscription.put('reset', frame('reset', {'reason': 'Missed events are no longer available'}))
+                else:
+                    for event_sequence, collection, payload in self._history:
+                        if event_sequence > sequence:
+                            subscription.put(collection, payload)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def collect(self, subscription):
+        """Frames to send after ``subscription`` woke up. Returns (bytes, finished)."""
+        frames, collections = subscription.drain()
+        if subscription.dropped:
+            return frame('reset', {'reason': 'Client fell behind'}), True
+        if self.summary and collections & self.summary_on:
+            frames.append(frame('dashboard', self.summary()))
+        return b''.join(frames), False
+
+    def opening(self):
+        """The first bytes of a stream: reconnect delay and the current summary."""
+        data = b'retry: %d\n\n' % RETRY_MILLISECONDS
+        if self.summary:
+            data += frame('dashboard', self.summary())
+        return data
+
+    def stream(self, subscription, heartbeat=HEARTBEAT_SECONDS):
+        """Yield the event stream of ``subscription`` until the client goes away."""
+        try:
+            yield self.opening()
+            while True:
+                if not subscription.wait(heartbeat):
+                    yield b': keep-alive\n\n'
+                    continue
+                data, finished = self.collect(subscription)
+                if data:
+                    yield data
+                if finished:
+                    return
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,147 @@
+"""
+Streaming CSV and NDJSON exports.
+
+Rows are written to a small buffer that is flushed every ``FLUSH_ROWS`` rows,
+so an export of any size is sent to the client in chunks while only one
+buffer's worth of output is held in memory.  Output can optionally be
+gzip-compressed on the fly.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+FLUSH_ROWS = 500
+
+
+def _day_name(record):
+    try:
+        return datetime.strptime(record['date'], '%Y-%m-%d').strftime('%A')
+    except (KeyError, TypeError, ValueError):
+        return ''
+
+
+def _bank(field, default='N/A'):
+    return lambda p, e: (p.get('bank_details') or {}).get(field) or default
+
+
+# (header, value(record, employee)) per CSV column.  Employee is None when the
+# record's employee no longer exists.
+ATTENDANCE_COLUMNS = [
+    ('Employee Name', lambda a, e: e['name'] if e else 'Unknown'),
+    ('Employee ID', lambda a, e: e['employee_id'] if e else 'N/A'),
+    ('Department', lambda a, e: e['department'] if e else 'N/A'),
+    ('Date', lambda a, e: a.get('date')),
+    ('Day', lambda a, e: _day_name(a)),
+    ('Status', lambda a, e: a.get('status')),
+    ('Check-in Time', lambda a, e: a.get('check_in') or 'N/A'),
+    ('Check-out Time', lambda a, e: a.get('check_out') or 'N/A'),
+    ('Hours Worked', lambda a, e: a.get('hours_worked') or 0),
+    ('Overtime Hours', lambda a, e: a.get('overtime_hours') or 0),
+    ('Remarks', lambda a, e: a.get('remarks') or 'No remarks'),
+]
+
+PAYROLL_COLUMNS = [
+    ('Employee Name', lambda p, e: e['name'] if e else 'Unknown'),
+    ('Month', lambda p, e: p.get('month')),
+    ('Basic Salary', lambda p, e: p.get('basic_salary')),
+    ('HRA', lambda p, e: p.get('hra')),
+    ('Allowances', lambda p, e: p.get('allowances')),
+    ('Overtime', lambda p, e: p.get('overtime')),
+    ('Bonus', lambda p, e: p.get('bonus')),
+    ('Deductions', lambda p, e: p.get('deductions', p.get('total_deductions'))),
+    ('Tax', lambda p, e: p.get('tax', p.get('income_tax'))),
+    ('Net Salary', lambda p, e: p.get('net_salary')),
+    ('Status', lambda p, e: p.get('status')),
+]
+
+PAYROLL_DETAILED_COLUMNS = [
+    ('Employee Name', lambda p, e: e['name'] if e else 'Unknown'),
+    ('Employee ID', lambda p, e: e['employee_id'] if e else 'N/A'),
+    ('Month', lambda p, e: p.get('month')),
+    ('Pay Period', lambda p, e: p.get('pay_period') or p.get('month')),
+    ('Basic Salary', lambda p, e: p.get('basic_salary') or 0),
+    ('HRA', lambda p, e: p.get('hra') or 0),
+    ('Allowances', lambda p, e: p.get('allowances') or 0),
+    ('Transport Allowance', lambda p, e: p.get('transport_allowance') or 0),
+    ('Medical Allowance', lambda p, e: p.get('medical_allowance') or 0),
+    ('Food Allowance', lambda p, e: p.get('food_allowance') or 0),
+    ('Overtime', lambda p, e: p.get('overtime') or 0),
+    ('Bonus', lambda p, e: p.get('bonus') or 0),
+    ('Gross Salary', lambda p, e: p.get('gross_salary') or sum(
+        p.get(f) or 0 for f in ('basic_salary', 'hra', 'allowances', 'overtime', 'bonus'))),
+    ('PF Deduction', lambda p, e: p.get('pf_deduction') or 0),
+    ('ESI Deduction', lambda p, e: p.get('esi_deduction') or 0),
+    ('Professional Tax', lambda p, e: p.get('professional_tax') or 0),
+    ('Insurance Premium', lambda p, e: p.get('insurance_premium') or 0),
+    ('Loan Deduction', lambda p, e: p.get('loan_deduction') or 0),
+    ('Other Deductions', lambda p, e: p.get('other_deductions') or p.get('deductions') or 0),
+    ('Income Tax', lambda p, e: p.get('income_tax') or p.get('tax') or 0),
+    ('Total Deductions', lambda p, e: p.get('total_deductions') or (p.get('deductions') or 0) + (p.get('tax') or 0)),
+    ('Net Salary', lambda p, e: p.get('net_salary') or 0),
+    ('Bank Name', _bank('bank_name')),
+    ('Account Number', _bank('account_number')),
+    ('Deposit Status', lambda p, e: (p.get('bank_details') or {}).get('deposit_status') or p.get('status') or 'Pending'),
+    ('Deposit Date', _bank('deposit_date')),
+    ('Transaction ID', _bank('transaction_id')),
+]
+
+
+def with_employees(store, records):
+    """Pair each record with its employee, looking every employee up only once."""
+    employees = {}
+    for record in records:
+        employee_id = record.get('employee_id')
+        if employee_id not in employees:
+            employees[employee_id] = store.users.get(employee_id)
+        yield record, employees[employee_id]
+
+
+def stream_csv(rows, columns):
+    """Yield CSV text for (record, employee) rows, FLUSH_ROWS rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in columns])
+    pending = 0
+    for record, employee in rows:
+        writer.writerow([value(record, employee) for _, value in columns])
+        pending += 1
+        if pending >= FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    """Yield one JSON object per line for (record, employee) rows.
+
+    Each record is extended with the employee's name, code and department,
+    like the /api/attendance/report rows.
+    """
+    lines = []
+    for record, employee in rows:
+        record = dict(record)
+        if employee:
+            record['employee_name'] = employee['name']
+            record['employee_id_code'] = employee['employee_id']
+            record['department'] = employee['department']
+        lines.append(json.dumps(record, default=str))
+        if len(lines) >= FLUSH_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compress a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
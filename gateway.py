@@ -0,0 +1,628 @@
+"""
+Asyncio gateway for time-clock devices and live dashboards.
+
+An ASGI application that serves the high-concurrency paths natively and
+hands every other request to the Flask app, so one process serves the whole
+API on the same store, punch pipeline and dashboard counters:
+
+``POST /gateway/punches``
+    Same payload, device token and responses as ``POST /api/punches``.
+    Punches from concurrent requests are gathered for a few milliseconds and
+    appended to the punch log in one write, so thousands of devices share a
+    handful of store transactions instead of tying up a thread each.
+
+``GET /gateway/dashboard/stream``
+    Server-sent events with the dashboard payload of
+    ``/api/reports/dashboard``, pushed whenever it changes (at most every
+    ``interval`` seconds).  Requires an admin session.  Each subscriber only
+    holds the newest snapshot, so a slow client skips intermediate updates
+    instead of buffering them.
+
+``GET /api/events/stream``
+    The live change events of the Flask route of the same name, served
+    from the event loop so open streams do not hold worker threads.
+
+``GET /gateway/stats``
+    Open connections, subscribers and punch batching counters.
+
+Run it under uvicorn (``python gateway.py --port 8001`` or ``uvicorn
+gateway:app``).  ``--dev-server`` uses a minimal built-in HTTP/1.1 server
+instead, for development and load tests where uvicorn is not installed.
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+import app as hr
+from attendance_import import find_employee
+from json_fast import dumps_bytes
+from punches import Backpressure, parse_punches
+
+KEEPALIVE_SECONDS = 15
+MAX_BODY_IN_MEMORY = 1024 * 1024
+
+
+class PunchBatcher:
+    """Gathers punches from concurrent requests into one ``PunchPipeline.submit``."""
+
+    def __init__(self, pipeline, executor, max_batch=5000, max_delay=0.005):
+        self.pipeline = pipeline
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = asyncio.Queue()
+        self.stats = {'requests': 0, 'writes': 0}
+
+    async def submit(self, records):
+        """Append ``records`` to the punch log. Returns pending punches or raises Backpressure."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((records, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            size = len(items[0][0])
+            deadline = loop.time() + self.max_delay
+            while size < self.max_batch:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                size += len(item[0])
+            results = await loop.run_in_executor(self.executor, self._write, items)
+            for (_, future), result in zip(items, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _write(self, items):
+        """Submit every request's punches together, or one by one when that would overflow."""
+        self.stats['requests'] += len(items)
+        self.stats['writes'] += 1
+        try:
+            pending = self.pipeline.submit([r for records, _ in items for r in records])
+            return [pending] * len(items)
+        except Backpressure:
+            pass
+        except Exception as e:
+            return [e] * len(items)
+        results = []
+        for records, _ in items:
+            try:
+                results.append(self.pipeline.submit(records))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class DashboardBroadcaster:
+    """Pushes dashboard snapshots to subscribers when the underlying data changes."""
+
+    def __init__(self, store, counters, interval=0.25):
+        self.store = store
+        self.counters = counters
+        self.interval = interval
+        self._subscribers = set()
+        self._changed = None
+        self._dirty = False
+        self._loop = None
+        self._latest = None
+
+    def attach(self, loop):
+        """Start listening to the store; changes wake ``run`` on ``loop``."""
+        self._loop = loop
+        self._changed = asyncio.Event()
+        for collection in (self.store.users, self.store.attendance, self.store.leave_requests):
+            collection.subscribe(self._on_change)
+
+    def _on_change(self, action, old, new):
+        # Called from writer threads: wake the loop once per burst of writes
+        if not self._dirty:
+            self._dirty = True
+            self._loop.call_soon_threadsafe(self._changed.set)
+
+    def snapshot(self):
+        return self.counters.snapshot(datetime.now().strftime("%Y-%m-%d"))
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    async def run(self):
+        self._latest = self.snapshot()
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            self._dirty = False
+            snapshot = self.snapshot()
+            if snapshot != self._latest:
+                self._latest = snapshot
+                for queue in self._subscribers:
+                    if queue.full():
+                        queue.get_nowait()  # the subscriber only needs the newest snapshot
+                    queue.put_nowait(snapshot)
+            await asyncio.sleep(self.interval)
+
+
+class Gateway:
+    """ASGI application serving punches and dashboard streams next to the Flask app.
+
+    ``prepare`` is an optional callable run in a worker thread before
+    anything is served, e.g. the application's lazy startup.
+    """
+
+    def __init__(self, flask_app, store, pipeline, counters, events, workers=8, interval=0.25,
+                 prepare=None):
+        self.flask_app = flask_app
+        self.prepare = prepare
+        self.store = store
+        self.pipeline = pipeline
+        self.counters = counters
+        self.events = events
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gateway')
+        self.interval = interval
+        self.batcher = None
+        self.broadcaster = None
+        self.connections = 0  # maintained by the built-in server
+        self._tasks = []
+        self.routes = {
+            ('POST', '/gateway/punches'): self.post_punches,
+            ('GET', '/gateway/dashboard/stream'): self.dashboard_stream,
+            ('GET', '/gateway/stats'): self.get_stats,
+            ('GET', '/api/events/stream'): self.event_stream,
+        }
+
+    async def startup(self):
+        if self.batcher is not None:
+            return
+        loop = asyncio.get_running_loop()
+        if self.prepare is not None:
+            await loop.run_in_executor(self.executor, self.prepare)
+            if self.batcher is not None:
+                return
+        self.batcher = PunchBatcher(self.pipeline, self.executor)
+        self.broadcaster = DashboardBroadcaster(self.store, self.counters, self.interval)
+        self.broadcaster.attach(loop)
+        self._tasks = [loop.create_task(self.batcher.run()), loop.create_task(self.broadcaster.run())]
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await self.startup()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await self.shutdown()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+        # Servers without lifespan support start the background tasks on first use
+        await self.startup()
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            await self.call_flask(scope, receive, send)
+        else:
+            await handler(scope, receive, send)
+
+    # Helpers
+
+    @staticmethod
+    def header(scope, name):
+        for key, value in scope['headers']:
+            if key == name:
+                return value.decode('latin-1')
+        return None
+
+    def session(self, scope):
+        """The Flask session of the request's cookie, or an empty dict."""
+        cookies = SimpleCookie(self.header(scope, b'cookie') or '')
+        name = self.flask_app.config['SESSION_COOKIE_NAME']
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        if name not in cookies or serializer is None:
+            return {}
+        max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+        try:
+            return serializer.loads(cookies[name].value, max_age=max_age)
+        except Exception:
+            return {}
+
+    @staticmethod
+    async def read_body(receive):
+        body = b''
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return body
+
+    @staticmethod
+    async def respond(send, status, payload, headers=()):
+        body = dumps_bytes(payload)
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ] + list(headers)})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # Routes
+
+    async def post_punches(self, scope, receive, send):
+        token = self.flask_app.config['PUNCH_DEVICE_TOKEN']
+        device_token = self.header(scope, b'x-device-token') or ''
+        is_device = bool(token) and hmac.compare_digest(device_token, token)
+        if not is_device and self.session(scope).get('user_type') != 'admin':
+            return await self.respond(send, 401, {"error": "Unauthorized"})
+
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if data is None:
+            return await self.respond(send, 400, {"error": "Expected a punch or {\"punches\": [...]}"})
+
+        def parse():
+            def resolve(value):
+                employee = find_employee(self.store, value)
+                return employee['id'] if employee else None
+            return parse_punches(data, resolve)
+
+        loop = asyncio.get_running_loop()
+        records, errors = await loop.run_in_executor(self.executor, parse)
+        pending = self.pipeline.pending
+        if records:
+            try:
+                pending = await self.batcher.submit(records)
+            except Backpressure as e:
+                return await self.respond(send, 429, {"error": str(e)},
+                                          [(b'retry-after', str(e.retry_after).encode())])
+        await self.respond(send, 202, {"accepted": len(records), "errors": errors, "pending": pending})
+
+    async def dashboard_stream(self, scope, receive, send):
+        if self.session(scope).get('user_type') != 'admin':
+            return await self.respond(send, 401, {"error": "Unauthorized"})
+
+        queue = self.broadcaster.subscribe()
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            snapshot = self.broadcaster.snapshot()
+            while not disconnected.done():
+                if snapshot is None:
+                    event = b': keep-alive\n\n'
+                else:
+                    event = b'event: dashboard\ndata: ' + dumps_bytes(snapshot) + b'\n\n'
+                await send({'type': 'http.response.body', 'body': event, 'more_body': True})
+                next_snapshot = asyncio.ensure_future(queue.get())
+                await asyncio.wait([next_snapshot, disconnected], timeout=KEEPALIVE_SECONDS,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if next_snapshot.done():
+                    snapshot = next_snapshot.result()
+                else:
+                    next_snapshot.cancel()
+                    snapshot = None
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.broadcaster.unsubscribe(queue)
+            disconnected.cancel()
+
+    async def event_stream(self, scope, receive, send):
+        """``/api/events/stream`` without holding a thread per client."""
+        if self.session(scope).get('user_type') != 'admin':
+            return await self.respond(send, 401, {"error": "Unauthorized"})
+
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        last_event_id = self.header(scope, b'last-event-id') or query.get('last_event_id', [None])[0]
+        subscription = self.events.subscribe(last_event_id, wake=lambda: loop.call_soon_threadsafe(ready.set))
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            data, finished = self.events.opening(), False
+            while not finished and not disconnected.done():
+                await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+                woken = asyncio.ensure_future(ready.wait())
+                await asyncio.wait([woken, disconnected], timeout=KEEPALIVE_SECONDS,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if woken.done():
+                    ready.clear()
+                    data, finished = self.events.collect(subscription)
+                else:
+                    woken.cancel()
+                    data = b': keep-alive\n\n'
+            if finished and not disconnected.done():
+                await send({'type': 'http.response.body', 'body': data})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.events.unsubscribe(subscription)
+            disconnected.cancel()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def get_stats(self, scope, receive, send):
+        await self.respond(send, 200, {
+            "connections": self.connections,
+            "subscribers": self.broadcaster.subscribers,
+            "event_subscribers": self.events.subscribers,
+            "pending_punches": self.pipeline.pending,
+            "punch_requests": self.batcher.stats['requests'],
+            "punch_writes": self.batcher.stats['writes'],
+        })
+
+    # Everything else is served by the Flask app on the thread pool
+
+    def wsgi_environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            environ[name] = environ[name] + ',' + value if name in environ else value
+        return environ
+
+    async def call_flask(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        # Uploads are spooled to disk past MAX_BODY_IN_MEMORY, as Werkzeug would
+        body = tempfile.SpooledTemporaryFile(max_size=MAX_BODY_IN_MEMORY)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return lambda data: None
+
+        def call():
+            iterable = self.flask_app(self.wsgi_environ(scope, body), start_response)
+            return iterable, iter(iterable)
+
+        iterable, chunks = await loop.run_in_executor(self.executor, call)
+        try:
+            # Streamed responses (exports, ZIPs) are pulled one chunk at a time
+            chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.start', 'status': started['status'],
+                        'headers': started['headers']})
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                await loop.run_in_executor(self.executor, iterable.close)
+            body.close()
+
+
+app = Gateway(hr.app, hr.store, hr.punch_pipeline, hr.dashboard_counters, hr.event_hub,
+              prepare=hr.start_up)
+
+
+# Minimal HTTP/1.1 server for development and tests; production runs under uvicorn
+
+class _PushbackReader:
+    """A StreamReader with bytes that were read early kept in front of it."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.pending = b''
+
+    async def readline(self):
+        if self.pending:
+            index = self.pending.find(b'\n')
+            if index >= 0:
+                line, self.pending = self.pending[:index + 1], self.pending[index + 1:]
+                return line
+            line, self.pending = self.pending, b''
+            return line + await self.reader.readline()
+        return await self.reader.readline()
+
+    async def read(self, size):
+        if self.pending:
+            data, self.pending = self.pending[:size], self.pending[size:]
+            return data
+        return await self.reader.read(size)
+
+    async def wait_closed(self):
+        """Wait for the client to go away, keeping anything it pipelines meanwhile."""
+        while True:
+            data = await self.reader.read(65536)
+            if not data:
+                return
+            self.pending += data
+
+
+async def handle_connection(application, reader, writer):
+    """Serve keep-alive HTTP/1.1 requests on one connection through ``application``."""
+    application.connections += 1
+    reader = _PushbackReader(reader)
+    peer = writer.get_extra_info('peername') or ('', 0)
+    sock = writer.get_extra_info('sockname') or ('', 0)
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, version = request_line.decode('latin-1').split()
+            headers = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+            header_map = dict(headers)
+            if b'chunked' in header_map.get(b'transfer-encoding', b''):
+                writer.write(b'HTTP/1.1 411 Length Required\r\ncontent-length: 0\r\nconnection: close\r\n\r\n')
+                break
+            length = int(header_map.get(b'content-length', 0))
+            keep_alive = version == 'HTTP/1.1' and header_map.get(b'connection', b'').lower() != b'close'
+            path, _, query = target.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': version.split('/')[1],
+                'method': method.upper(), 'scheme': 'http', 'path': path, 'raw_path': path.encode('latin-1'),
+                'query_string': query.encode('latin-1'), 'root_path': '', 'headers': headers,
+                'client': peer[:2], 'server': sock[:2],
+            }
+            state = {'remaining': length, 'complete': False, 'chunked': False}
+
+            async def receive():
+                if not state['complete']:
+                    data = b''
+                    if state['remaining']:
+                        data = await reader.read(min(state['remaining'], 65536))
+                        if not data:
+                            return {'type': 'http.disconnect'}
+                        state['remaining'] -= len(data)
+                    state['complete'] = state['remaining'] == 0
+                    return {'type': 'http.request', 'body': data, 'more_body': not state['complete']}
+                # The request is complete; the next event is the client going away.
+                # A pipelined request read meanwhile is served after this one.
+                await reader.wait_closed()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+                    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}".encode()]
+                    names = {name.lower() for name, _ in message['headers']}
+                    if b'content-length' not in names:
+                        state['chunked'] = True
+                        lines.append(b'transfer-encoding: chunked')
+                    if not keep_alive:
+                        lines.append(b'connection: close')
+                    lines.extend(name + b': ' + value for name, value in message['headers'])
+                    writer.write(b'\r\n'.join(lines) + b'\r\n\r\n')
+                else:
+                    data = message.get('body', b'')
+                    if state['chunked']:
+                        if data:
+                            writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+                        if not message.get('more_body'):
+                            writer.write(b'0\r\n\r\n')
+                    else:
+                        writer.write(data)
+                    await writer.drain()
+
+            await application(scope, receive, send)
+            if not keep_alive:
+                break
+            # Discard whatever body the application did not read
+            while state['remaining']:
+                data = await reader.read(min(state['remaining'], 65536))
+                if not data:
+                    return
+                state['remaining'] -= len(data)
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        application.connections -= 1
+        writer.close()
+
+
+async def serve(application, host='127.0.0.1', port=8001, ready=None):
+    """Run ``application`` on the built-in server until cancelled."""
+    await application.startup()
+    server = await asyncio.start_server(lambda r, w: handle_connection(application, r, w),
+                                        host, port, backlog=4096, limit=1024 * 1024)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the HR gateway.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--dev-server', action='store_true',
+                        help='use the minimal built-in HTTP/1.1 server instead of uvicorn (development only)')
+    args = parser.parse_args()
+    if args.dev_server:
+        print(f"Serving on http://{args.host}:{args.port} (development server)", flush=True)
+        asyncio.run(serve(app, args.host, args.port))
+        return
+    try:
+        import uvicorn
+    except ImportError:
+        parser.error("uvicorn is not installed (pip install -r requirements.txt); "
+                     "--dev-server runs the development server instead")
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""
+gunicorn settings for the HR app: ``gunicorn -c gunicorn.conf.py``.
+
+Overridable through HR_BIND, HR_WORKERS and HR_THREADS.
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:create_app()'
+bind = os.environ.get('HR_BIND', '0.0.0.0:8000')
+
+# One process per core for request handling; threads keep long-lived event
+# streams and slow clients from occupying a whole worker
+workers = int(os.environ.get('HR_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('HR_THREADS', 8))
+
+# Each worker must import the app itself: background threads and SQLite
+# connections do not survive a fork
+preload_app = False
+
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
@@ -0,0 +1,161 @@
+"""
+In-process background job queue.
+
+Long-running admin operations (payroll runs, bulk attendance imports, batch
+payslip rendering) are submitted as jobs instead of running inside the
+request handler.  Jobs are persisted in the ``jobs`` collection so their
+status, progress and result can be polled, and a pool of worker threads
+executes them in submission order.  With ``poll_interval`` the queue also
+picks up jobs that other processes submitted to the same store.
+"""
+
+import queue
+import threading
+import time
+import traceback
+from datetime import datetime
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when the job has been cancelled."""
+
+
+def now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class JobContext:
+    """Handle passed to job handlers for reporting progress and checking cancellation."""
+
+    def __init__(self, jobs, job_id):
+        self.jobs = jobs
+        self.job_id = job_id
+
+    def progress(self, done, total=None, message=None):
+        """Record how far the job has got."""
+        changes = {'progress': {'done': done, 'total': total}}
+        if message is not None:
+            changes['message'] = message
+        self.jobs.store.jobs.update(self.job_id, changes)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested for this job."""
+        job = self.jobs.store.jobs.get(self.job_id)
+        if job and job.get('cancel_requested'):
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Runs registered job handlers on a pool of worker threads."""
+
+    def __init__(self, store, workers=2, poll_interval=None):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._queue = queue.Queue()
+        self._queued = set()  # ids ever put on the queue
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def register(self, job_type, handler):
+        """Register ``handler(context, **params)`` for ``job_type``.
+
+        The handler's return value becomes the job's ``result``.
+        """
+        self._handlers[job_type] = handler
+
+    def start(self):
+        """Start the worker threads and pick up jobs left over by a previous process."""
+        for job in self.store.jobs.find('status', 'Running'):
+            self.store.jobs.update(job['id'], {
+                'status': 'Failed',
+                'error': 'Interrupted before completion',
+                'finished_at': now()
+            })
+        self._enqueue_stored()
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.poll_interval:
+            thread = threading.Thread(target=self._poll, name='job-poller', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _enqueue(self, job_id):
+        with self._lock:
+            if job_id in self._queued:
+                return
+            self._queued.add(job_id)
+        self._queue.put(job_id)
+
+    def _enqueue_stored(self):
+        for job in self.store.jobs.find('status', 'Queued'):
+            self._enqueue(job['id'])
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._enqueue_stored()
+            except Exception:
+                traceback.print_exc()
+
+    def submit(self, job_type, params=None, created_by=None):
+        """Persist a new job and queue it. Returns the job record."""
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = self.store.jobs.add({
+            'type': job_type,
+            'status': 'Queued',
+            'params': params or {},
+            'progress': {'done': 0, 'total': None},
+            'message': None,
+            'result': None,
+            'error': None,
+            'cancel_requested': False,
+            'created_by': created_by,
+            'created_at': now(),
+            'started_at': None,
+            'finished_at': None
+        })
+        # Without workers here, the process running them picks the job up from the store
+        if self._threads:
+            self._enqueue(job['id'])
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or ask a running one to stop. Returns the job, or None."""
+        job = self.store.jobs.get(job_id)
+        if job is None or job['status'] not in ('Queued', 'Running'):
+            return job
+        changes = {'cancel_requested': True}
+        if job['status'] == 'Queued':
+            changes.update({'status': 'Cancelled', 'finished_at': now()})
+        return self.store.jobs.update(job_id, changes)
+
+    def run(self, job_id):
+        """Execute one job in the calling thread."""
+        job = self.store.jobs.get(job_id)
+        if job is None or job['status'] != 'Queued':
+            return job
+        self.store.jobs.update(job_id, {'status': 'Running', 'started_at': now()})
+        context = JobContext(self, job_id)
+        try:
+            result = self._handlers[job['type']](context, **job['params'])
+        except JobCancelled:
+            return self.store.jobs.update(job_id, {'status': 'Cancelled', 'finished_at': now()})
+        except Exception as e:
+            traceback.print_exc()
+            return self.store.jobs.update(job_id, {'status': 'Failed', 'error': str(e), 'finished_at': now()})
+        return self.store.jobs.update(job_id, {'status': 'Completed', 'result': result, 'finished_at': now()})
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self.run(job_id)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,113 @@
+"""
+Fast JSON encoding for API responses.
+
+``OrjsonProvider`` plugs orjson into Flask when it is installed and falls
+back to Flask's standard encoder otherwise.  ``FragmentCache`` keeps the
+encoded bytes of individual records, dropped by a store listener whenever
+the record changes, so list responses are assembled by joining cached
+fragments instead of re-encoding every record on every request.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+if orjson is not None:
+    # Datetimes go through Flask's default handler so they keep Flask's format
+    ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps_bytes(obj):
+    """Encode ``obj`` as compact JSON bytes with sorted keys, like jsonify."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=DefaultJSONProvider.default, sort_keys=True,
+                      separators=(',', ':')).encode()
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson where available.
+
+    Pretty-printed debug output and any ``dumps`` options are left to the
+    default provider.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(obj)
+        return self._app.response_class(dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+class FragmentCache:
+    """Encoded JSON bytes of a collection's records, keyed by record id.
+
+    Entries are dropped as soon as the record is updated or deleted.  At most
+    ``max_entries`` fragments are kept, least recently used evicted first.
+    """
+
+    def __init__(self, collection, max_entries=100000):
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()
+        self._epoch = 0  # bumped on every invalidation
+        self._lock = threading.Lock()
+        collection.subscribe(self._on_change)
+
+    def _on_change(self, action, old, new):
+        if old:
+            with self._lock:
+                self._fragments.pop(old['id'], None)
+                self._epoch += 1
+
+    def clear(self):
+        """Drop every fragment."""
+        with self._lock:
+            self._fragments.clear()
+            self._epoch += 1
+
+    @property
+    def version(self):
+        """Invalidation counter; note it before reading the records to encode."""
+        return self._epoch
+
+    def encode_list(self, records, version):
+        """Return the JSON array bytes of ``records``.
+
+        ``version`` is the value of ``self.version`` from before the records
+        were read, so fragments of records that changed in the meantime are
+        not kept.
+        """
+        return b'[' + b','.join(self.encode_each(records, version)) + b']'
+
+    def encode_each(self, records, version):
+        """Return the JSON object bytes of each of ``records``, as a list."""
+        with self._lock:
+            parts = [self._fragments.get(record['id']) for record in records]
+            for fragment, record in zip(parts, records):
+                if fragment is not None:
+                    self._fragments.move_to_end(record['id'])
+
+        missing = {}
+        for i, record in enumerate(records):
+            if parts[i] is None:
+                parts[i] = missing[record['id']] = dumps_bytes(record)
+
+        if missing:
+            with self._lock:
+                if version == self._epoch:
+                    self._fragments.update(missing)
+                    while len(self._fragments) > self.max_entries:
+                        self._fragments.popitem(last=False)
+        return parts
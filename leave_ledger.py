@@ -0,0 +1,113 @@
+"""
+Per-employee leave ledger.
+
+Approved leave days are totalled per (employee, year, leave type) by a store
+listener as leave requests are approved, rejected, edited or deleted, so a
+leave balance is a dictionary lookup instead of a scan over the employee's
+requests.  Leave limits come from ``DEFAULT_LEAVE_LIMITS`` and can be
+overridden per department.
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime
+
+DEFAULT_LEAVE_LIMITS = {
+    "Sick": 5,
+    "Emergency": 3,
+    "Vacation": 15
+}
+
+
+def leave_days(leave):
+    """Return (year, days) of a leave request, counted in the year it starts."""
+    start_date = datetime.strptime(leave['start_date'], '%Y-%m-%d')
+    end_date = datetime.strptime(leave['end_date'], '%Y-%m-%d')
+    return start_date.year, (end_date - start_date).days + 1
+
+
+class LeaveLedger:
+    """Approved leave days per employee and year.
+
+    ``limits`` is a dict of leave type -> days per year, optionally with a
+    ``departments`` entry mapping a department to its own overrides, e.g.
+    ``{"Vacation": 15, "departments": {"Engineering": {"Vacation": 20}}}``.
+    With ``build=False`` the ledger is computed by the first read instead of
+    up front.
+    """
+
+    def __init__(self, store, limits=None, build=True):
+        self.store = store
+        limits = dict(limits or {})
+        self._department_limits = limits.pop('departments', {})
+        self._limits = dict(DEFAULT_LEAVE_LIMITS, **limits)
+        self._lock = threading.Lock()
+        self._used = None  # until built, writes are left to the first build
+        if build:
+            self.rebuild()
+        store.leave_requests.subscribe(self._on_leave_request)
+
+    def limits(self, department=None):
+        """Leave limits for an employee of ``department``."""
+        return dict(self._limits, **self._department_limits.get(department, {}))
+
+    def _compute(self):
+        used = {}
+        for leave in self.store.leave_requests:
+            self._apply(used, leave, 1)
+        return used
+
+    def rebuild(self):
+        """Recompute the ledger from every leave request.
+
+        Leave request writes, including those replayed from other processes,
+        wait until the new ledger is in place, so none is lost or counted
+        twice.
+        """
+        with self.store.rebuilding(), self.store.leave_requests.writes_paused():
+            used = self._compute()
+            with self._lock:
+                self._used = used
+
+    @staticmethod
+    def _apply(used, leave, sign):
+        if leave.get('status') != 'Approved':
+            return
+        try:
+            year, days = leave_days(leave)
+        except (KeyError, TypeError, ValueError):
+            return
+        used.setdefault((leave.get('employee_id'), year), Counter())[leave.get('type')] += sign * days
+
+    def _on_leave_request(self, action, old, new):
+        with self._lock:
+            if self._used is None:
+                return
+            if old:
+                self._apply(self._used, old, -1)
+            if new:
+                self._apply(self._used, new, 1)
+
+    def used(self, employee_id, year):
+        """Approved days per leave type taken by an employee in ``year``."""
+        if self._used is None:
+            self.rebuild()
+        with self._lock:
+            return dict(self._used.get((employee_id, year), {}))
+
+    def balance(self, employee_id, year=None):
+        """Return {"leave_limits", "used_leaves", "remaining_leaves"} for an employee."""
+        if year is None:
+            year = datetime.now().year
+        employee = self.store.users.get(employee_id)
+        leave_limits = self.limits(employee['department'] if employee else None)
+        used = self.used(employee_id, year)
+        used_leaves = {leave_type: used.get(leave_type, 0) for leave_type in leave_limits}
+        return {
+            "leave_limits": leave_limits,
+            "used_leaves": used_leaves,
+            "remaining_leaves": {
+                leave_type: max(0, limit - used_leaves[leave_type])
+                for leave_type, limit in leave_limits.items()
+            }
+        }
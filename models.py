@@ -0,0 +1,160 @@
+"""
+Typed records for employees, attendance, payroll and leave requests.
+
+The store keeps every record as a plain dict, which is what its listeners,
+the SQLite backend and the JSON fragment cache work with.  Routes go through
+these classes instead: ``from_json`` reads a request body or a stored record
+into a slotted object, filling in defaults and mapping older field names to
+the current ones, and ``to_json`` gives back the dict that is stored and
+returned.  Fields a class does not declare are carried along in ``extra``
+(None when there are none), so a round trip never drops data.
+
+Read paths that only total stored records (the payroll summary and report)
+work on the dicts directly with ``payroll_gross`` and ``payroll_deductions``
+rather than building an object per record.
+"""
+
+
+class Record:
+    """Base of the record classes.
+
+    ``FIELDS`` lists (name, default) for every field after ``id``; a callable
+    default (``dict``, a lambda) is called to get a fresh value per record.
+    """
+
+    __slots__ = ('id', 'extra')
+    FIELDS = ()
+
+    def __init__(self, id=None, **values):
+        self.id = id
+        for name, default in self.FIELDS:
+            if name in values:
+                setattr(self, name, values.pop(name))
+            else:
+                setattr(self, name, default() if callable(default) else default)
+        self.extra = values or None
+
+    @classmethod
+    def from_json(cls, data):
+        """Build a record from a request body or a stored record."""
+        return cls(**data)
+
+    def to_json(self, exclude=()):
+        """The record as a dict, ``id`` first and undeclared fields last."""
+        data = {} if self.id is None else {'id': self.id}
+        for name, _ in self.FIELDS:
+            data[name] = getattr(self, name)
+        if self.extra:
+            data.update(self.extra)
+        for name in exclude:
+            data.pop(name, None)
+        return data
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.id!r})"
+
+
+class User(Record):
+    FIELDS = (
+        ('name', None),
+        ('email', None),
+        ('password', None),
+        ('role', None),
+        ('department', 'General'),
+        ('salary', 50000),
+        ('hire_date', None),
+        ('status', 'Active'),
+        ('phone', ''),
+        ('address', ''),
+        ('employee_id', None),
+        ('profile_photo', None),
+        ('documents', lambda: {'resume': None, 'certificates': [], 'offer_letter': None}),
+        ('salary_structure', dict),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+    def public_json(self):
+        """The record without its password hash."""
+        return self.to_json(exclude=('password',))
+
+
+class AttendanceRecord(Record):
+    FIELDS = (
+        ('employee_id', None),
+        ('date', None),
+        ('status', None),
+        ('hours_worked', 0),
+        ('check_in', None),
+        ('check_out', None),
+        ('remarks', ''),
+        ('created_by', 'HR Admin'),
+        ('created_date', None),
+        ('overtime_hours', 0),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+
+class PayrollRecord(Record):
+    """One employee's payroll for a month.
+
+    ``deductions`` are the deductions other than income tax and ``tax`` the
+    income tax, so ``net_salary`` is gross minus both.  Records written with
+    the detailed breakdown (``income_tax``, ``total_deductions``, ...) keep
+    it in ``extra`` and get ``tax`` and ``deductions`` derived from it.
+    """
+
+    FIELDS = (
+        ('employee_id', None),
+        ('month', None),
+        ('basic_salary', 0),
+        ('hra', 0),
+        ('allowances', 0),
+        ('overtime', 0),
+        ('bonus', 0),
+        ('deductions', 0),
+        ('tax', 0),
+        ('net_salary', 0),
+        ('status', 'Pending'),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+    @classmethod
+    def from_json(cls, data):
+        if 'tax' not in data and 'income_tax' in data:
+            data = dict(data, tax=data['income_tax'])
+        if 'deductions' not in data and 'total_deductions' in data:
+            data = dict(data, deductions=(data['total_deductions'] or 0) - (data.get('income_tax') or 0))
+        return cls(**data)
+
+    @property
+    def gross_salary(self):
+        return payroll_gross(self.to_json())
+
+    @property
+    def total_deductions(self):
+        return payroll_deductions(self.to_json())
+
+
+def payroll_gross(payroll):
+    """Gross pay of a payroll dict: the stored total when there is one, else the sum of the earnings."""
+    gross = payroll.get('gross_salary')
+    if gross is None:
+        gross = sum(payroll.get(name) or 0 for name in ('basic_salary', 'hra', 'allowances', 'overtime', 'bonus'))
+    return gross
+
+
+def payroll_deductions(payroll):
+    """Income tax plus the other deductions of a payroll dict; missing amounts count as 0."""
+    return (payroll.get('deductions') or 0) + (payroll.get('tax') or 0)
+
+
+class LeaveRequest(Record):
+    FIELDS = (
+        ('employee_id', None),
+        ('start_date', None),
+        ('end_date', None),
+        ('type', None),
+        ('status', 'Pending'),
+        ('reason', ''),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
@@ -0,0 +1,153 @@
+"""
+Batch monthly payroll engine.
+
+Computes a whole month's payroll in one pass: the month's attendance is
+grouped once, then basic/HRA/allowance/overtime/PF/tax are computed for every
+employee as column arrays.  NumPy is used when it is installed; otherwise the
+same formulas run as plain Python loops.  It is imported by the first
+payroll computation, not with this module, since it takes longer to import
+than the rest of the application's modules together.
+"""
+
+import random
+
+np = None  # set by load_numpy()
+_numpy_loaded = False
+
+WORKING_DAYS = 22  # Standard working days per month
+INSURANCE = 2000  # Fixed insurance deduction
+
+
+def load_numpy():
+    """Import NumPy if it is installed. Returns the module, or None."""
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy
+        except ImportError:  # NumPy is optional
+            numpy = None
+        np, _numpy_loaded = numpy, True
+    return np
+
+
+def summarize_attendance(attendance_records):
+    """Group a month's attendance into {employee_id: (present_days, late_days)}.
+
+    Late days count as present, matching the payroll rules.
+    """
+    summary = {}
+    for record in attendance_records:
+        status = record['status']
+        if status not in ('Present', 'Late'):
+            continue
+        present, late = summary.get(record['employee_id'], (0, 0))
+        summary[record['employee_id']] = (present + 1, late + (status == 'Late'))
+    return summary
+
+
+def payable_employees(employees):
+    """Employees that get a payroll entry: active and with a salary."""
+    return [e for e in employees if e.get('status') == 'Active' and e.get('salary')]
+
+
+def _compute_numpy(salaries, present, late, seed):
+    rng = np.random.default_rng(seed)
+    base = np.asarray(salaries, dtype=np.float64)
+    present = np.asarray(present, dtype=np.int64)
+    late = np.asarray(late, dtype=np.int64)
+
+    ratio = present / WORKING_DAYS
+    basic = (base * 0.5).astype(np.int64)
+    hra = (base * 0.2).astype(np.int64)
+    allowances = (base * 0.15).astype(np.int64)
+    basic = (basic * ratio).astype(np.int64)
+    hra = (hra * ratio).astype(np.int64)
+    allowances = (allowances * ratio).astype(np.int64)
+
+    overtime = np.maximum(0, (base * 0.05).astype(np.int64) - late * 500)
+    bonus = rng.integers(0, (base * 0.1).astype(np.int64), endpoint=True)
+
+    pf = (basic * 0.12).astype(np.int64)
+    other = rng.integers(0, 1000, size=len(base), endpoint=True)
+    deductions = pf + INSURANCE + other
+
+    gross = basic + hra + allowances + overtime + bonus
+    tax = np.where(gross > 30000, (gross * 0.1).astype(np.int64), (gross * 0.05).astype(np.int64))
+    net = gross - deductions - tax
+
+    return {
+        'basic_salary': basic.tolist(),
+        'hra': hra.tolist(),
+        'allowances': allowances.tolist(),
+        'overtime': overtime.tolist(),
+        'bonus': bonus.tolist(),
+        'deductions': deductions.tolist(),
+        'tax': tax.tolist(),
+        'net_salary': net.tolist(),
+    }
+
+
+def _compute_python(salaries, present, late, seed):
+    rng = random.Random(seed)
+    columns = {name: [] for name in ('basic_salary', 'hra', 'allowances', 'overtime',
+                                      'bonus', 'deductions', 'tax', 'net_salary')}
+    for base_salary, present_days, late_days in zip(salaries, present, late):
+        ratio = present_days / WORKING_DAYS
+        basic = int(int(base_salary * 0.5) * ratio)
+        hra = int(int(base_salary * 0.2) * ratio)
+        allowances = int(int(base_salary * 0.15) * ratio)
+        overtime = max(0, int(base_salary * 0.05) - late_days * 500)
+        bonus = rng.randint(0, int(base_salary * 0.1))
+        deductions = int(basic * 0.12) + INSURANCE + rng.randint(0, 1000)
+        gross = basic + hra + allowances + overtime + bonus
+        tax = int(gross * 0.1) if gross > 30000 else int(gross * 0.05)
+
+        columns['basic_salary'].append(basic)
+        columns['hra'].append(hra)
+        columns['allowances'].append(allowances)
+        columns['overtime'].append(overtime)
+        columns['bonus'].append(bonus)
+        columns['deductions'].append(deductions)
+        columns['tax'].append(tax)
+        columns['net_salary'].append(gross - deductions - tax)
+    return columns
+
+
+def compute_payroll_columns(salaries, present, late, seed=None):
+    """Compute payroll components for parallel lists of inputs.
+
+    Returns a dict of column name -> list of ints, one entry per employee.
+    """
+    if load_numpy() is not None:
+        return _compute_numpy(salaries, present, late, seed)
+    return _compute_python(salaries, present, late, seed)
+
+
+def build_payroll_records(employees, attendance_summary, month, generated_date, seed=None):
+    """Build payroll records for ``employees`` (already filtered to payable ones)."""
+    counts = [attendance_summary.get(e['id'], (0, 0)) for e in employees]
+    present = [c[0] for c in counts]
+    late = [c[1] for c in counts]
+    columns = compute_payroll_columns([e['salary'] for e in employees], present, late, seed)
+
+    records = []
+    for i, employee in enumerate(employees):
+        records.append({
+            'employee_id': employee['id'],
+            'month': month,
+            'basic_salary': columns['basic_salary'][i],
+            'hra': columns['hra'][i],
+            'allowances': columns['allowances'][i],
+            'overtime': columns['overtime'][i],
+            'bonus': columns['bonus'][i],
+            'deductions': columns['deductions'][i],
+            'tax': columns['tax'][i],
+            'net_salary': columns['net_salary'][i],
+            'status': 'Pending',
+            'generated_date': generated_date,
+            'working_days': WORKING_DAYS,
+            'present_days': present[i],
+            'attendance_ratio': round(present[i] / WORKING_DAYS * 100, 2)
+        })
+    return records
+
@@ -0,0 +1,163 @@
+"""
+Chunked, resumable payroll runs.
+
+A payroll run splits the month's payable employees into id-ordered chunks,
+computes each chunk on a process pool from a ``payroll_run`` background job
+and checkpoints every chunk in the ``payroll_runs`` collection as soon as its
+records are stored.  A run that
+fails or is interrupted can be resumed: checkpointed chunks are skipped and
+employees that already have payroll for the month are never paid twice.
+"""
+
+import multiprocessing
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import payroll_engine
+from jobs import JobCancelled
+
+
+def compute_chunk(employees, attendance_summary, month, generated_date):
+    """Process-pool entry point: payroll records for one chunk of employees."""
+    return payroll_engine.build_payroll_records(employees, attendance_summary, month, generated_date)
+
+
+def plan_chunks(employees, chunk_size):
+    """Split id-sorted employees into [first_id, last_id] chunk ranges."""
+    ids = sorted(e['id'] for e in employees)
+    return [[ids[i], ids[min(i + chunk_size, len(ids)) - 1]] for i in range(0, len(ids), chunk_size)]
+
+
+class PayrollRunner:
+    """Starts, tracks and resumes payroll runs as ``payroll_run`` jobs."""
+
+    def __init__(self, store, jobs, max_workers=None, chunk_size=1000):
+        self.store = store
+        self.jobs = jobs
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        jobs.register('payroll_run', self._handle)
+
+    def find_run(self, month):
+        """Return the latest run for a month, or None."""
+        runs = self.store.payroll_runs.find('month', month)
+        return runs[-1] if runs else None
+
+    def _job_active(self, run):
+        job = self.store.jobs.get(run['job_id']) if run.get('job_id') else None
+        return job is not None and job['status'] in ('Queued', 'Running')
+
+    def recover_interrupted(self):
+        """Mark runs whose job died with a previous process as failed so they can be resumed."""
+        for status in ('Queued', 'Running'):
+            for run in self.store.payroll_runs.find('status', status):
+                if not self._job_active(run):
+                    self.store.payroll_runs.update(run['id'], {
+                        'status': 'Failed',
+                        'error': 'Interrupted before completion'
+                    })
+
+    def start(self, month, generated_date, created_by=None):
+        """Create a run for ``month`` and queue it."""
+        employees = payroll_engine.payable_employees(self.store.users)
+        chunks = plan_chunks(employees, self.chunk_size)
+        run = self.store.payroll_runs.add({
+            'month': month,
+            'status': 'Queued',
+            'job_id': None,
+            'generated_date': generated_date,
+            'chunk_size': self.chunk_size,
+            'chunks': chunks,
+            'total_chunks': len(chunks),
+            'completed_chunks': [],
+            'employee_count': len(employees),
+            'generated_count': 0,
+            'error': None,
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'finished_at': None
+        })
+        job = self.jobs.submit('payroll_run', {'run_id': run['id']}, created_by)
+        return self.store.payroll_runs.update(run['id'], {'job_id': job['id']})
+
+    def resume(self, run_id, created_by=None):
+        """Queue a failed or cancelled run again from its last checkpoint. Returns the run, or None."""
+        run = self.store.payroll_runs.get(run_id)
+        if run is None or run['status'] == 'Completed' or self._job_active(run):
+            return run
+        self.store.payroll_runs.update(run_id, {'status': 'Queued', 'error': None})
+        job = self.jobs.submit('payroll_run', {'run_id': run_id}, created_by)
+        return self.store.payroll_runs.update(run_id, {'job_id': job['id']})
+
+    def _handle(self, context, run_id):
+        try:
+            run = self.execute(run_id, context)
+        except JobCancelled:
+            self.store.payroll_runs.update(run_id, {'status': 'Cancelled'})
+            raise
+        except Exception as e:
+            self.store.payroll_runs.update(run_id, {'status': 'Failed', 'error': str(e)})
+            raise
+        return {'run_id': run_id, 'month': run['month'], 'generated_count': run['generated_count']}
+
+    def execute(self, run_id, context=None):
+        """Run every chunk that is not checkpointed yet, in the calling thread."""
+        run = self.store.payroll_runs.update(run_id, {'status': 'Running'})
+        month = run['month']
+        completed = set(run['completed_chunks'])
+        pending = [i for i in range(run['total_chunks']) if i not in completed]
+
+        already_paid = {p['employee_id'] for p in self.store.payroll.find('month', month)}
+        employees = sorted(
+            ({'id': e['id'], 'salary': e['salary'], 'status': e['status']}
+             for e in payroll_engine.payable_employees(self.store.users)
+             if e['id'] not in already_paid),
+            key=lambda e: e['id'])
+        summary = payroll_engine.summarize_attendance(self.store.attendance.find('month', month))
+
+        employee_ids = [e['id'] for e in employees]
+        work = {}
+        for index in pending:
+            first_id, last_id = run['chunks'][index]
+            chunk = employees[bisect_left(employee_ids, first_id):bisect_right(employee_ids, last_id)]
+            work[index] = (chunk, {e['id']: summary[e['id']] for e in chunk if e['id'] in summary})
+
+        if len(work) <= 1 or self.max_workers == 1:
+            for index, (chunk, chunk_summary) in work.items():
+                if context:
+                    context.check_cancelled()
+                records = compute_chunk(chunk, chunk_summary, month, run['generated_date'])
+                self._checkpoint(run_id, index, records, context)
+        else:
+            pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+            futures = {}
+            try:
+                futures = {
+                    pool.submit(compute_chunk, chunk, chunk_summary, month, run['generated_date']): index
+                    for index, (chunk, chunk_summary) in work.items()
+                }
+                for future in as_completed(futures):
+                    self._checkpoint(run_id, futures[future], future.result(), context)
+                    if context:
+                        context.check_cancelled()
+            finally:
+                # Chunks not started yet are dropped; their run stays resumable
+                for future in futures:
+                    future.cancel()
+                pool.shutdown(wait=True)
+
+        return self.store.payroll_runs.update(run_id, {
+            'status': 'Completed',
+            'finished_at': datetime.now().isoformat(timespec='seconds')
+        })
+
+    def _checkpoint(self, run_id, chunk_index, records, context=None):
+        self.store.payroll.add_many(records)
+        run = self.store.payroll_runs.get(run_id)
+        run = self.store.payroll_runs.update(run_id, {
+            'completed_chunks': run['completed_chunks'] + [chunk_index],
+            'generated_count': run['generated_count'] + len(records)
+        })
+        if context:
+            context.progress(len(run['completed_chunks']), run['total_chunks'])
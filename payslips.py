@@ -0,0 +1,135 @@
+"""
+Month-end payslip batches.
+
+Renders every payslip of a month on a process pool into the PDF cache and
+streams a month's payslips out as a ZIP archive, one entry at a time, so the
+archive is never held in memory.
+"""
+
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pdfs
+from pdf_cache import cache_key, cache_path, write_atomic
+
+
+def payslip_key(fields):
+    return cache_key('payslip', pdfs.PAYSLIP_TEMPLATE_VERSION, fields)
+
+
+def render_into_cache(cache_directory, items):
+    """Process-pool entry point: render (key, fields) pairs into the cache directory.
+
+    The parent process registers the files with its PdfCache afterwards.
+    """
+    for key, fields in items:
+        write_atomic(cache_path(cache_directory, key), pdfs.PAYSLIP_TEMPLATE.render(fields))
+    return len(items)
+
+
+def offer_letter_key(fields):
+    return cache_key('offer_letter', pdfs.OFFER_LETTER_TEMPLATE_VERSION, fields)
+
+
+def month_entries(store, month):
+    """Return ([(filename, key, fields, owners), ...], failures) for a month's payroll."""
+    entries = []
+    failures = []
+    filenames = set()
+    for payroll in store.payroll.find('month', month):
+        employee = store.users.get(payroll['employee_id'])
+        if not employee:
+            failures.append({"payroll_id": payroll['id'], "error": "Employee not found"})
+            continue
+        try:
+            fields = pdfs.payslip_fields(employee, payroll)
+        except KeyError as e:
+            failures.append({"payroll_id": payroll['id'], "error": f"Missing payroll field {e}"})
+            continue
+        filename = f"payslip_{employee['employee_id']}_{month}.pdf"
+        if filename in filenames:
+            filename = f"payslip_{employee['employee_id']}_{month}_{payroll['id']}.pdf"
+        filenames.add(filename)
+        owners = [('payroll', payroll['id']), ('user', employee['id'])]
+        entries.append((filename, payslip_key(fields), fields, owners))
+    return entries, failures
+
+
+def render_month(store, cache, month, context=None, max_workers=None, chunk_size=250):
+    """Render every payslip of ``month`` that is not cached yet."""
+    entries, failures = month_entries(store, month)
+    missing = [(key, fields) for _, key, fields, _ in entries if not cache.contains(key)]
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+
+    done = 0
+    if len(chunks) <= 1 or max_workers == 1:
+        for chunk in chunks:
+            if context:
+                context.check_cancelled()
+            done += render_into_cache(cache.directory, chunk)
+            if context:
+                context.progress(done, len(missing))
+    else:
+        pool = ProcessPoolExecutor(max_workers=max_workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+        futures = []
+        try:
+            futures = [pool.submit(render_into_cache, cache.directory, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                done += future.result()
+                if context:
+                    context.progress(done, len(missing))
+                    context.check_cancelled()
+        finally:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+    for _, key, _, owners in entries:
+        cache.track(key, owners)
+
+    return {
+        "month": month,
+        "total": len(entries),
+        "rendered": len(missing),
+        "cached": len(entries) - len(missing),
+        "failed": failures
+    }
+
+
+class _ChunkStream:
+    """Write-only file object that collects bytes until they are drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_month_zip(store, cache, month):
+    """Yield a ZIP archive of the month's payslips chunk by chunk.
+
+    Payslips missing from the cache are rendered on the fly.
+    """
+    entries, _ = month_entries(store, month)
+    stream = _ChunkStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for filename, key, fields, owners in entries:
+            data = cache.get(key)
+            if data is None:
+                data = pdfs.PAYSLIP_TEMPLATE.render(fields)
+                cache.put(key, data, owners)
+            archive.writestr(filename, data)
+            yield stream.drain()
+    yield stream.drain()
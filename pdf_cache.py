@@ -0,0 +1,144 @@
+"""
+Content-addressed disk cache for generated PDFs.
+
+A PDF is stored under the SHA-256 of the exact fields it was rendered from,
+so a cached file is valid for as long as those fields are unchanged and the
+same document is never rendered twice.  The cache is bounded in size with
+least-recently-used eviction, and entries are tagged with the records they
+were rendered from so they can be dropped as soon as one of those records
+changes.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def cache_key(kind, version, fields):
+    """Hash a document kind, its template version and its input fields."""
+    payload = json.dumps([kind, version, fields], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cache_path(directory, key):
+    return os.path.join(directory, key[:2], key + '.pdf')
+
+
+def write_atomic(path, data):
+    """Write a file via rename so readers never see a partial PDF."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class PdfCache:
+    """PDF bytes stored on disk as <directory>/<key[:2]>/<key>.pdf.
+
+    ``max_bytes`` bounds the total size of cached files; the least recently
+    used files are deleted first.  Owner tags (e.g. ``('payroll', 12)``) are
+    kept in memory only: after a restart, stale entries are simply never
+    requested again and age out through eviction.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._owners = {}  # owner -> set of keys
+        self._total = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.pdf'):
+                    stat = os.stat(os.path.join(root, name))
+                    files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total += size
+        self._evict()
+
+    def path(self, key):
+        return cache_path(self.directory, key)
+
+    def contains(self, key):
+        return os.path.exists(self.path(key))
+
+    @property
+    def size(self):
+        """Total bytes currently cached."""
+        return self._total
+
+    def get(self, key):
+        """Return the cached bytes for ``key``, or None. Marks the entry as recently used."""
+        try:
+            with open(self.path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.discard(key)
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return data
+
+    def put(self, key, data, owners=()):
+        """Store ``data`` under ``key``. Safe to call from several processes."""
+        path = self.path(key)
+        write_atomic(path, data)
+        self.track(key, owners, len(data))
+        return path
+
+    def track(self, key, owners=(), size=None):
+        """Register a file written by another process and tag it with its owners."""
+        if size is None:
+            try:
+                size = os.path.getsize(self.path(key))
+            except FileNotFoundError:
+                return
+        with self._lock:
+            self._total += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            for owner in owners:
+                self._owners.setdefault(owner, set()).add(key)
+            self._evict()
+
+    def discard(self, key):
+        """Delete one entry."""
+        with self._lock:
+            self._remove(key)
+
+    def invalidate(self, owner):
+        """Delete every entry rendered from ``owner``. Returns how many were removed."""
+        with self._lock:
+            keys = self._owners.pop(owner, set())
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def _remove(self, key):
+        self._total -= self._entries.pop(key, 0)
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self._total > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._remove(key)
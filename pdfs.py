@@ -0,0 +1,174 @@
+"""
+PDF documents for the HR Management System: payslips and offer letters.
+
+Nothing from reportlab is imported with this module: the canvas is
+imported by the first render, so importing the application does not pay
+for it.
+"""
+
+import io
+
+from models import PayrollRecord
+
+
+# reportlab.lib.pagesizes.letter, in points
+PAGE_WIDTH, PAGE_HEIGHT = LETTER = (612.0, 792.0)
+
+# Bump when a layout changes so cached PDFs are not reused
+PAYSLIP_TEMPLATE_VERSION = 1
+OFFER_LETTER_TEMPLATE_VERSION = 1
+
+# Record fields that end up on a rendered document
+PAYSLIP_PAYROLL_FIELDS = ('month', 'basic_salary', 'hra', 'allowances', 'overtime', 'bonus',
+                          'tax', 'deductions', 'net_salary')
+OFFER_LETTER_FIELDS = ('name', 'employee_id', 'hire_date', 'role', 'department', 'salary')
+
+PAYSLIP_EARNINGS = [
+    ("Basic Salary", 'basic_salary'),
+    ("HRA", 'hra'),
+    ("Allowances", 'allowances'),
+    ("Overtime", 'overtime'),
+    ("Bonus", 'bonus')
+]
+
+PAYSLIP_DEDUCTIONS = [
+    ("Tax", 'tax'),
+    ("Other Deductions", 'deductions')
+]
+
+
+def payslip_fields(employee, payroll):
+    """The exact inputs a payslip is rendered from."""
+    payroll = PayrollRecord.from_json(payroll)
+    fields = {
+        'name': employee['name'],
+        'employee_code': employee['employee_id'],
+        'department': employee['department'],
+        'month': payroll.month,
+        'net_salary': payroll.net_salary
+    }
+    for _, key in PAYSLIP_EARNINGS + PAYSLIP_DEDUCTIONS:
+        fields[key] = getattr(payroll, key)
+    return fields
+
+
+def new_canvas(buffer):
+    """A letter-sized reportlab canvas writing to ``buffer``."""
+    from reportlab.pdfgen import canvas
+    # invariant output: identical fields always produce identical bytes
+    return canvas.Canvas(buffer, pagesize=LETTER, invariant=1)
+
+
+class PayslipTemplate:
+    """Payslip layout computed once and replayed for every payslip.
+
+    The static part of the page (titles, section headings, row labels) is
+    laid out up front as draw operations grouped by font, so rendering a
+    payslip only adds the per-employee values.
+    """
+
+    def __init__(self):
+        height = PAGE_HEIGHT
+        self.static_ops = []  # (font, size, [(x, y, text), ...])
+        self.value_ops = []  # (font, size, [(x, y, format, field), ...])
+
+        self.static_ops.append(("Helvetica-Bold", 16, [(50, height - 50, "PAYSLIP")]))
+        header_values = [
+            (50, height - 80, "Employee: {}", 'name'),
+            (50, height - 100, "Employee ID: {}", 'employee_code'),
+            (50, height - 120, "Month: {}", 'month'),
+            (50, height - 140, "Department: {}", 'department')
+        ]
+
+        headings = []
+        labels = []
+        amounts = []
+
+        # Earnings
+        y_pos = height - 180
+        headings.append((50, y_pos, "EARNINGS"))
+        y_pos -= 30
+        for item, field in PAYSLIP_EARNINGS:
+            labels.append((50, y_pos, item))
+            amounts.append((300, y_pos, "${:,.2f}", field))
+            y_pos -= 20
+
+        # Deductions
+        y_pos -= 20
+        headings.append((50, y_pos, "DEDUCTIONS"))
+        y_pos -= 30
+        for item, field in PAYSLIP_DEDUCTIONS:
+            labels.append((50, y_pos, item))
+            amounts.append((300, y_pos, "${:,.2f}", field))
+            y_pos -= 20
+
+        # Net Salary
+        y_pos -= 30
+        headings.append((50, y_pos, "NET SALARY"))
+
+        self.static_ops.append(("Helvetica-Bold", 14, headings))
+        self.static_ops.append(("Helvetica", 12, labels))
+        self.value_ops.append(("Helvetica", 12, header_values + amounts))
+        self.value_ops.append(("Helvetica-Bold", 14, [(300, y_pos, "${:,.2f}", 'net_salary')]))
+
+    def render(self, fields):
+        """Render a payslip from payslip_fields(). Returns the PDF bytes."""
+        buffer = io.BytesIO()
+        p = new_canvas(buffer)
+        for font, size, ops in self.static_ops:
+            p.setFont(font, size)
+            for x, y, text in ops:
+                p.drawString(x, y, text)
+        for font, size, ops in self.value_ops:
+            p.setFont(font, size)
+            for x, y, fmt, field in ops:
+                p.drawString(x, y, fmt.format(fields[field]))
+        p.showPage()
+        p.save()
+        return buffer.getvalue()
+
+
+PAYSLIP_TEMPLATE = PayslipTemplate()
+
+
+def offer_letter_fields(employee):
+    """The exact inputs an offer letter is rendered from."""
+    return {field: employee[field] for field in OFFER_LETTER_FIELDS}
+
+
+def render_offer_letter(employee):
+    """Render an offer letter PDF for an employee. Returns the PDF bytes."""
+    buffer = io.BytesIO()
+    p = new_canvas(buffer)
+    width, height = LETTER
+    
+    # Header
+    p.setFont("Helvetica-Bold", 18)
+    p.drawString(50, height - 50, "OFFER LETTER")
+    
+    p.setFont("Helvetica", 12)
+    p.drawString(50, height - 100, f"Date: {employee['hire_date']}")
+    p.drawString(50, height - 130, f"Dear {employee['name']},")
+    
+    # Content
+    content = [
+        "",
+        "We are pleased to offer you the position of " + employee['role'],
+        "in the " + employee['department'] + " department.",
+        "",
+        "Your starting salary will be $" + f"{employee['salary']:,}" + " per annum.",
+        "",
+        "We look forward to having you join our team.",
+        "",
+        "Sincerely,",
+        "HR Department"
+    ]
+    
+    y_pos = height - 160
+    for line in content:
+        p.drawString(50, y_pos, line)
+        y_pos -= 20
+    
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
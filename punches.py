@@ -0,0 +1,282 @@
+"""
+Time-clock punch ingestion.
+
+Door and biometric readers post raw punch events, which are appended to the
+``punches`` log as they arrive.  A consolidator thread folds them into daily
+attendance in micro-batches: every (employee, day) touched since the last
+batch is recomputed from all of that day's punches (first in, last out,
+late arrival, hours and overtime), so consolidation is idempotent and can be
+replayed.  Each batch is recorded in ``punch_batches`` and the last punch id
+it covered is the restart point.  When consolidation falls too far behind,
+``submit`` refuses new punches with ``Backpressure`` so devices retry later.
+
+In a ``shared`` pipeline several processes append to the log and only one
+of them runs the consolidator, which finds its work by reading the log
+after the last batch instead of from the days marked dirty in memory.
+"""
+
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from jobs import now
+
+
+class Backpressure(Exception):
+    """Raised when too many punches are waiting to be consolidated."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many pending punches, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def parse_punch(punch, employees):
+    """Validate a raw punch and return the record to append to the log.
+
+    ``employees`` resolves an employee id or code to an employee id, or None.
+    """
+    if not isinstance(punch, dict):
+        raise ValueError("Punch must be an object")
+    employee_id = employees(punch.get('employee_id'))
+    if employee_id is None:
+        raise ValueError(f"Unknown employee {punch.get('employee_id')}")
+    try:
+        timestamp = datetime.fromisoformat(punch['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("timestamp must be YYYY-MM-DDTHH:MM[:SS]")
+    direction = punch.get('direction')
+    if direction not in (None, 'in', 'out'):
+        raise ValueError("direction must be 'in' or 'out'")
+    return {
+        'employee_id': employee_id,
+        'date': timestamp.strftime('%Y-%m-%d'),
+        'timestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%S'),
+        'direction': direction,
+        'device_id': punch.get('device_id'),
+        'received_at': now()
+    }
+
+
+def parse_punches(data, employees):
+    """Parse a punch payload (one punch, a list, or {"punches": [...]}).
+
+    Returns (records, errors) where errors are {"index", "error"} dicts.
+    """
+    raw_punches = data.get('punches', data) if isinstance(data, dict) else data
+    if not isinstance(raw_punches, list):
+        raw_punches = [raw_punches]
+    records = []
+    errors = []
+    for index, punch in enumerate(raw_punches):
+        try:
+            records.append(parse_punch(punch, employees))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+    return records, errors
+
+
+class PunchPipeline:
+    """Appends punches to the log and consolidates them into attendance."""
+
+    def __init__(self, store, shift_start='09:00', grace_minutes=15, standard_hours=8,
+                 batch_size=2000, flush_interval=1.0, max_pending=20000, shared=False):
+        self.store = store
+        self.shared = shared
+        self.shift_start = datetime.strptime(shift_start, '%H:%M').time()
+        self.grace = timedelta(minutes=grace_minutes)
+        self.standard_hours = standard_hours
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # Consolidate early once a batch is full or half the backlog limit is used
+        self._flush_at = max(1, min(batch_size, max_pending // 2))
+        self._dirty = set()  # (employee_id, date) pairs with unconsolidated punches
+        self._pending = 0
+        self._logged_id = 0  # highest punch id appended to the log
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.stats = {'accepted': 0, 'rejected': 0, 'batches': 0, 'consolidated_days': 0,
+                      'skipped_days': 0, 'last_batch': None}
+
+    # Ingestion
+
+    def submit(self, records):
+        """Append validated punch records to the log. Raises Backpressure when full.
+
+        Returns the number of punches waiting to be consolidated.
+        """
+        if self.shared:
+            return self._submit_shared(records)
+        with self._condition:
+            if self._pending + len(records) > self.max_pending:
+                self.stats['rejected'] += len(records)
+                self._condition.notify()
+                raise Backpressure(retry_after=max(1, round(self.flush_interval)))
+            # Logging and marking days dirty happen together, so every punch up
+            # to _logged_id belongs to a day that is pending or consolidated
+            self.store.punches.add_many(records)
+            self._pending += len(records)
+            self._dirty.update((r['employee_id'], r['date']) for r in records)
+            self._logged_id = max([self._logged_id] + [r['id'] for r in records])
+            self.stats['accepted'] += len(records)
+            if self._pending >= self._flush_at:
+                self._condition.notify()
+            return self._pending
+
+    def _submit_shared(self, records):
+        pending = self.pending
+        if pending + len(records) > self.max_pending:
+            self.stats['rejected'] += len(records)
+            raise Backpressure(retry_after=max(1, round(self.flush_interval)))
+        self.store.punches.add_many(records)
+        self.stats['accepted'] += len(records)
+        return pending + len(records)
+
+    @property
+    def pending(self):
+        if self.shared:
+            # Punch ids are allocated in commit order, so the ids after the
+            # last batch's watermark are exactly the unconsolidated punches
+            last_punch = self.store.punches.last()
+            return max(0, (last_punch['id'] if last_punch else 0) - self._watermark())
+        return self._pending
+
+    def _watermark(self):
+        last_batch = self.store.punch_batches.last()
+        return last_batch['last_punch_id'] if last_batch else 0
+
+    # Consolidation
+
+    def consolidate_day(self, punches):
+        """Attendance fields for one employee-day from its punches."""
+        times = sorted(datetime.fromisoformat(p['timestamp']) for p in punches)
+        first, last = times[0], times[-1]
+        hours = round((last - first).total_seconds() / 3600, 2)
+        shift_start = datetime.combine(first.date(), self.shift_start)
+        if len(times) > 1 and hours < self.standard_hours / 2:
+            status = 'Half Day'
+        elif first > shift_start + self.grace:
+            status = 'Late'
+        else:
+            status = 'Present'
+        return {
+            'status': status,
+            'check_in': first.strftime('%H:%M'),
+            'check_out': last.strftime('%H:%M') if len(times) > 1 else None,
+            'hours_worked': hours,
+            'overtime_hours': round(max(0, hours - self.standard_hours), 2),
+            'punch_count': len(times)
+        }
+
+    def flush(self):
+        """Consolidate every pending (employee, day) now. Returns the batch record, or None."""
+        with self._flush_lock:
+            if self.shared:
+                return self._flush_log()
+            with self._condition:
+                dirty, self._dirty = self._dirty, set()
+                pending, self._pending = self._pending, 0
+                last_punch_id = self._logged_id
+            if not dirty:
+                return None
+            try:
+                return self._consolidate(dirty, pending, last_punch_id)
+            except Exception:
+                with self._condition:
+                    self._dirty |= dirty
+                    self._pending += pending
+                raise
+
+    def _flush_log(self):
+        """Consolidate the days of every punch logged after the last batch."""
+        dirty = set()
+        pending = 0
+        last_punch_id = self._watermark()
+        while True:
+            punches = self.store.punches.page(after=last_punch_id, limit=5000)
+            if not punches:
+                break
+            dirty.update((p['employee_id'], p['date']) for p in punches)
+            pending += len(punches)
+            last_punch_id = punches[-1]['id']
+        if not dirty:
+            return None
+        return self._consolidate(dirty, pending, last_punch_id)
+
+    def _consolidate(self, dirty, pending, last_punch_id):
+        started = time.perf_counter()
+        new_records = []
+        consolidated = skipped = 0
+        # Locked so HR entries made meanwhile are seen (and kept) before days are written
+        with self.store.attendance.locked():
+            for employee_id, date in sorted(dirty):
+                punches = self.store.punches.find('employee_date', (employee_id, date))
+                if not punches:
+                    continue
+                fields = self.consolidate_day(punches)
+                existing = self.store.attendance.find_one('employee_date', (employee_id, date))
+                if existing is None:
+                    new_records.append(dict(fields, **{
+                        'employee_id': employee_id,
+                        'date': date,
+                        'remarks': 'Time clock',
+                        'created_by': 'Time Clock',
+                        'created_date': datetime.now().strftime('%Y-%m-%d')
+                    }))
+                elif existing.get('created_by') == 'Time Clock':
+                    self.store.attendance.update(existing['id'], fields)
+                else:
+                    # Attendance entered by HR takes precedence over the punch log
+                    skipped += 1
+                    continue
+                consolidated += 1
+            if new_records:
+                self.store.attendance.add_many(new_records)
+
+        batch = self.store.punch_batches.add({
+            'last_punch_id': last_punch_id,
+            'punches': pending,
+            'days': consolidated,
+            'skipped_days': skipped,
+            'seconds': round(time.perf_counter() - started, 3),
+            'finished_at': now()
+        })
+        self.stats['batches'] += 1
+        self.stats['consolidated_days'] += consolidated
+        self.stats['skipped_days'] += skipped
+        self.stats['last_batch'] = batch
+        return batch
+
+    def recover(self):
+        """Mark days with punches logged after the last recorded batch as pending."""
+        last_batch = self.store.punch_batches.last()
+        after = last_batch['last_punch_id'] if last_batch else 0
+        self._logged_id = after
+        while True:
+            punches = self.store.punches.page(after=after, limit=5000)
+            if not punches:
+                break
+            with self._condition:
+                self._dirty.update((p['employee_id'], p['date']) for p in punches)
+                self._pending += len(punches)
+                self._logged_id = punches[-1]['id']
+            after = punches[-1]['id']
+
+    def start(self):
+        """Recover unconsolidated punches and start the consolidator thread."""
+        if not self.shared:
+            self.recover()
+        self._thread = threading.Thread(target=self._run, name='punch-consolidator', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._pending < self._flush_at:
+                    self._condition.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,358 @@
+"""
+Append-only change log and snapshots for the memory backend.
+
+Every write to a logged collection is appended to that collection's log as
+one binary frame: a fixed header (payload length, CRC-32, action, record
+id) followed by the record as JSON, or nothing for a delete.  The log is
+split into numbered segments, ``<collection>.<n>.log``, and the snapshot
+``<collection>.<n>.snapshot`` holds the whole collection as it was when
+segment ``n`` was started.  A restart maps the newest snapshot with mmap,
+hands it to the collection in one piece (columnar attendance takes its
+arrays straight from the file) and replays only the frames logged since.
+A new snapshot and segment are started in the background once a segment
+holds ``snapshot_every`` frames.
+
+``fsync`` decides when frames reach the disk: 'always' fsyncs every frame
+before the write returns, so an acknowledged write survives a power
+failure; 'batch' fsyncs from the background thread every
+``fsync_interval`` seconds, so a crash loses at most that much; 'never'
+leaves it to the OS.  Snapshots are always fsynced.
+
+A replica opens the same directory with ``replica=True``: it restores the
+same way and then tails the segments the writer appends to, applying every
+frame to its own collections so its listeners see each change.  A replica
+that falls so far behind that a segment it still needs was removed stops
+following that collection and says so; restarting it restores from the
+newest snapshot.  Only one process may write to a log directory.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import traceback
+import zlib
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+# Collections that are logged: those replayed between processes on SQLite too
+LOGGED_COLLECTIONS = ('users', 'attendance', 'payroll', 'leave_requests')
+
+# Payload length, CRC-32 of action, id and payload, action, record id
+FRAME = struct.Struct('<IIBq')
+ACTIONS = ('add', 'update', 'delete')
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+SNAPSHOT_MAGIC = b'HRSNAP1\n'
+SNAPSHOT_HEADER = struct.Struct('<Q')  # manifest length
+
+FSYNC_POLICIES = ('always', 'batch', 'never')
+
+
+class SegmentRemoved(RuntimeError):
+    """A replica needs a log segment the writer has already removed."""
+
+
+def _dumps(record):
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(record).encode()
+
+
+def _loads(payload):
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(bytes(payload))
+
+
+def encode_frame(action, record_id, payload):
+    code = ACTION_CODES[action]
+    checksum = zlib.crc32(payload, zlib.crc32(struct.pack('<Bq', code, record_id)))
+    return FRAME.pack(len(payload), checksum, code, record_id) + payload
+
+
+def read_frames(view, offset):
+    """Yield (end offset, action, record id, payload) for each whole, intact frame from ``offset``.
+
+    Stops at the first frame that is cut short or fails its checksum: the
+    end of a log a crash interrupted, or a frame still being written.
+    """
+    size = len(view)
+    while offset + FRAME.size <= size:
+        length, checksum, code, record_id = FRAME.unpack_from(view, offset)
+        end = offset + FRAME.size + length
+        if end > size or code >= len(ACTIONS):
+            return
+        payload = view[offset + FRAME.size:end]
+        if zlib.crc32(payload, zlib.crc32(struct.pack('<Bq', code, record_id))) != checksum:
+            return
+        yield end, ACTIONS[code], record_id, payload
+        offset = end
+
+
+def write_snapshot(path, state, blocks):
+    """Write dump() output to ``path`` atomically."""
+    manifest = json.dumps({'state': state, 'blocks': [len(block) for block in blocks]}).encode()
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + SNAPSHOT_HEADER.pack(len(manifest)) + manifest)
+        for block in blocks:
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    fsync_directory(os.path.dirname(path))
+
+
+def fsync_directory(directory):
+    """Make files created or renamed in ``directory`` survive a power failure."""
+    if os.name != 'posix':
+        return
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def load_snapshot(path, collection):
+    """Map a snapshot file and load it into an empty collection."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a snapshot")
+        offset = len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size
+        manifest_length, = SNAPSHOT_HEADER.unpack_from(mapped, len(SNAPSHOT_MAGIC))
+        manifest = json.loads(mapped[offset:offset + manifest_length])
+        offset += manifest_length
+        view = memoryview(mapped)
+        blocks = []
+        try:
+            for length in manifest['blocks']:
+                blocks.append(view[offset:offset + length])
+                offset += length
+            collection.load(manifest['state'], blocks)
+        finally:
+            # The map cannot be closed while views into it are alive
+            for block in blocks:
+                block.release()
+            view.release()
+
+
+class CollectionLog:
+    """The log segments and snapshots of one collection."""
+
+    def __init__(self, collection, directory, fsync='always'):
+        if not hasattr(collection, 'dump'):
+            raise ValueError(f"{collection.name} cannot be logged: only the memory backend supports snapshots")
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}, not {fsync!r}")
+        self.collection = collection
+        self.directory = directory
+        self.fsync = fsync
+        self._unsynced = False  # frames written since the last fsync
+        self.segment = 0  # the segment written (or tailed) now
+        self.offset = 0  # bytes of it applied
+        self.frames = 0  # frames in it
+        self._file = None
+
+    def _path(self, number, kind):
+        return os.path.join(self.directory, f"{self.collection.name}.{number:08d}.{kind}")
+
+    def _numbers(self, kind):
+        prefix, suffix = f"{self.collection.name}.", f".{kind}"
+        return sorted(int(name[len(prefix):-len(suffix)]) for name in os.listdir(self.directory)
+                      if name.startswith(prefix) and name.endswith(suffix)
+                      and name[len(prefix):-len(suffix)].isdigit())
+
+    def restore(self):
+        """Load the newest snapshot and replay the segments since. Returns the frames replayed."""
+        snapshots = self._numbers('snapshot')
+        self.segment = snapshots[-1] if snapshots else 0
+        if snapshots:
+            load_snapshot(self._path(self.segment, 'snapshot'), self.collection)
+        replayed = 0
+        for number in self._numbers('log'):
+            if number >= self.segment:
+                self.segment, self.offset, self.frames = number, 0, 0
+                replayed += self._replay()
+        return replayed
+
+    def _replay(self):
+        """Apply the frames after ``offset`` in the current segment. Returns how many."""
+        path = self._path(self.segment, 'log')
+        if not os.path.exists(path) or os.path.getsize(path) <= self.offset:
+            return 0
+        applied = 0
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for end, action, record_id, payload in read_frames(mapped, self.offset):
+                if action == 'delete':
+                    self.collection.delete(record_id)
+                elif action == 'add':
+                    self.collection.add(_loads(payload))
+                else:
+                    self.collection.update(record_id, _loads(payload))
+                self.offset = end
+                applied += 1
+        self.frames += applied
+        return applied
+
+    # Writing
+
+    def open(self):
+        """Start appending every write of the collection to the current segment."""
+        path = self._path(self.segment, 'log')
+        with open(path, 'ab') as f:
+            # Drop a frame a crash left half-written
+            f.truncate(self.offset)
+        self._file = open(path, 'ab')
+        fsync_directory(self.directory)
+        self.collection.subscribe(self._on_change)
+
+    def _on_change(self, action, old, new):
+        # Called under the collection's write lock, so frames go out in write order
+        record = new if new is not None else old
+        self._file.write(encode_frame(action, record['id'], _dumps(new) if new is not None else b''))
+        self._file.flush()
+        if self.fsync == 'always':
+            os.fsync(self._file.fileno())
+        else:
+            self._unsynced = True
+        self.frames += 1
+
+    def sync(self):
+        """fsync the frames written since the last call."""
+        with self.collection.writes_paused():
+            if self._unsynced and self._file is not None:
+                os.fsync(self._file.fileno())
+                self._unsynced = False
+
+    def snapshot(self, keep=1):
+        """Snapshot the collection and start a new segment. Returns the segment number.
+
+        Files older than the ``keep`` segments before the new one are removed;
+        the ones kept let replicas that are behind catch up.
+        """
+        with self.collection.locked():
+            state, blocks = self.collection.dump()
+            self.segment += 1
+            self.offset = self.frames = 0
+            if self._unsynced and self.fsync != 'never':
+                os.fsync(self._file.fileno())
+                self._unsynced = False
+            self._file.close()
+            self._file = open(self._path(self.segment, 'log'), 'ab')
+            fsync_directory(self.directory)
+        # Until the snapshot is complete a restart still replays from the previous one
+        write_snapshot(self._path(self.segment, 'snapshot'), state, blocks)
+        for kind in ('log', 'snapshot'):
+            for number in self._numbers(kind):
+                if number < self.segment - keep:
+                    os.remove(self._path(number, kind))
+        return self.segment
+
+    # Following
+
+    def poll(self):
+        """Apply the frames the writer appended since the last call. Returns how many."""
+        applied = self._replay()
+        while True:
+            if os.path.exists(self._path(self.segment + 1, 'log')):
+                # The writer has moved on, so this segment is complete
+                applied += self._replay()
+                if not os.path.exists(self._path(self.segment, 'log')):
+                    raise self._removed()
+                self.segment, self.offset, self.frames = self.segment + 1, 0, 0
+                applied += self._replay()
+            elif (not os.path.exists(self._path(self.segment, 'log'))
+                  and any(number > self.segment for number in self._numbers('log'))):
+                # Removed along with the next one: the writer is more than a segment ahead
+                raise self._removed()
+            else:
+                return applied
+
+    def _removed(self):
+        return SegmentRemoved(f"{self.collection.name} segment {self.segment} was removed before this "
+                              f"replica read it; restart the replica to restore from the newest snapshot")
+
+
+class RecordLog:
+    """Log and snapshots of the logged collections of a store, kept in ``directory``.
+
+    Call ``restore`` on a fresh store, then ``open`` in the one process that
+    writes (before anything else writes), and finally ``start`` for the
+    background snapshots, or on a replica the tailing of the writer's log.
+    """
+
+    def __init__(self, store, directory, snapshot_every=20000, replica=False, names=LOGGED_COLLECTIONS,
+                 fsync='always', fsync_interval=0.1):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.replica = replica
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.logs = [CollectionLog(getattr(store, name), directory, fsync) for name in names]
+        self.stopped = []  # names of the collections a replica no longer follows
+        self._thread = None
+
+    def restore(self):
+        """Load every collection from disk. Returns the frames replayed after the snapshots."""
+        return sum(log.restore() for log in self.logs)
+
+    def open(self):
+        if self.replica:
+            raise RuntimeError("A replica does not write to the log")
+        for log in self.logs:
+            log.open()
+
+    def snapshot(self):
+        """Snapshot every collection now."""
+        for log in self.logs:
+            log.snapshot()
+
+    def start(self, interval=5.0):
+        """Snapshot full segments in the background, or on a replica follow the writer."""
+        target = self._follow if self.replica else self._snapshot_when_full
+        self._thread = threading.Thread(target=target, args=(interval,), name='record-log', daemon=True)
+        self._thread.start()
+
+    def _snapshot_when_full(self, interval):
+        batched = self.fsync == 'batch'
+        step = min(interval, self.fsync_interval) if batched else interval
+        next_check = 0
+        while True:
+            if batched:
+                for log in self.logs:
+                    try:
+                        log.sync()
+                    except Exception:
+                        traceback.print_exc()
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + interval
+                for log in self.logs:
+                    try:
+                        if log.frames >= self.snapshot_every:
+                            log.snapshot()
+                    except Exception:
+                        traceback.print_exc()
+            time.sleep(step)
+
+    def _follow(self, interval):
+        following = list(self.logs)
+        while following:
+            time.sleep(interval)
+            for log in list(following):
+                try:
+                    log.poll()
+                except SegmentRemoved as e:
+                    # Polling again cannot recover; the collection keeps what it has
+                    print(f"Record log: {e}", flush=True)
+                    following.remove(log)
+                    self.stopped.append(log.collection.name)
+                except Exception:
+                    traceback.print_exc()
@@ -0,0 +1,144 @@
+"""
+HTTP response cache for per-employee read endpoints.
+
+Every (collection, employee) pair has a version stamp that a store listener
+bumps whenever one of the employee's records in that collection changes.
+Cached views answer with an ETag built from the stamps they depend on and a
+Last-Modified time, reply 304 Not Modified to a matching conditional GET,
+and otherwise serve the rendered body from a bounded in-memory cache keyed by
+(route, session user, version), so a view only runs again after its data
+changed.
+"""
+
+import functools
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import current_app, make_response, request, session
+
+
+class ResourceVersions:
+    """Version stamps per (collection name, owner id).
+
+    ``owners`` maps a collection name to the record field naming the
+    employee it belongs to, e.g. ``{'payroll': 'employee_id'}``.
+    """
+
+    def __init__(self, store, owners):
+        self._counter = itertools.count(1)
+        self._versions = {}  # (collection, owner) -> (version, modified timestamp)
+        self._base = 0  # version of everything not changed since the last reset
+        self._started = time.time()
+        self._lock = threading.Lock()
+        for name, field in owners.items():
+            getattr(store, name).subscribe(self._listener(name, field))
+
+    def _listener(self, name, field):
+        def bump(action, old, new):
+            owners = {record.get(field) for record in (old, new) if record}
+            with self._lock:
+                for owner in owners:
+                    self._versions[(name, owner)] = (next(self._counter), time.time())
+        return bump
+
+    def reset(self):
+        """Give every resource a new version, e.g. after changes were missed."""
+        with self._lock:
+            self._versions.clear()
+            self._base = next(self._counter)
+            self._started = time.time()
+
+    def stamp(self, names, owner):
+        """Return (versions tuple, last modified timestamp) for ``owner``'s resources."""
+        with self._lock:
+            stamps = [self._versions.get((name, owner), (self._base, self._started)) for name in names]
+        return tuple(version for version, _ in stamps), max(modified for _, modified in stamps)
+
+
+class ResponseCache:
+    """Bounded LRU cache of rendered response bodies with conditional GET support."""
+
+    def __init__(self, versions, max_bytes=None):
+        self.versions = versions
+        self.max_bytes = max_bytes
+        # ETags from an earlier process must never match this one's versions
+        self._instance = os.urandom(4).hex()
+        self._entries = OrderedDict()  # key -> (body, mimetype)
+        self._latest = {}  # (route, user) -> key of its newest entry
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def cached(self, *names, vary=None):
+        """Decorate an employee view whose response depends only on ``names``.
+
+        ``vary`` is an optional callable returning any other value the
+        response depends on (e.g. the current year); it is part of the ETag.
+        Anything but a GET with an employee session goes straight to the view.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET' or session.get('user_type') != 'employee':
+                    return view(*args, **kwargs)
+                user_id = session.get('user_id')
+                versions, modified = self.versions.stamp(names, user_id)
+                etag = '-'.join([self._instance, '.'.join(map(str, versions))] +
+                                ([str(vary())] if vary else []))
+                last_modified = datetime.fromtimestamp(int(modified), timezone.utc)
+
+                if request.if_none_match:
+                    not_modified = request.if_none_match.contains(etag)
+                else:
+                    not_modified = (request.if_modified_since is not None and
+                                    request.if_modified_since >= last_modified)
+                if not_modified:
+                    response = current_app.response_class(status=304)
+                else:
+                    key = (request.full_path, user_id, etag)
+                    response = self._get(key)
+                    if response is None:
+                        response = make_response(view(*args, **kwargs))
+                        if response.status_code != 200:
+                            return response
+                        self._put(key, response.get_data(), response.mimetype)
+                    else:
+                        response = current_app.response_class(response[0], mimetype=response[1])
+
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.vary.add('Cookie')
+                return response
+            return wrapper
+        return decorator
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, body, mimetype):
+        with self._lock:
+            if key in self._entries:
+                return
+            # An older version of the same route and user can never be served again
+            previous = self._latest.get(key[:2])
+            if previous in self._entries:
+                self._remove(previous)
+            self._latest[key[:2]] = key
+            self._entries[key] = (body, mimetype)
+            self._total += len(body)
+            while self.max_bytes is not None and self._total > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        body, _ = self._entries.pop(key)
+        self._total -= len(body)
+        if self._latest.get(key[:2]) == key:
+            del self._latest[key[:2]]
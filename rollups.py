@@ -0,0 +1,182 @@
+"""
+Pre-aggregated attendance rollups.
+
+Attendance counts and hours are kept in buckets per scope (employee,
+department, company) and period (day, ISO week, month, all time), updated
+by store listeners on every attendance write and on department changes, so
+attendance reports read a handful of buckets instead of scanning history.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+STATUS_FIELDS = {
+    'Present': 'present',
+    'Absent': 'absent',
+    'Late': 'late',
+    'Half Day': 'half_day',
+    'Work From Home': 'work_from_home'
+}
+
+SCOPES = ('employee', 'department', 'company')
+PERIODS = ('day', 'week', 'month', 'all')
+
+
+def empty_stats():
+    return {
+        'present': 0,
+        'absent': 0,
+        'late': 0,
+        'half_day': 0,
+        'work_from_home': 0,
+        'other': 0,
+        'records': 0,
+        'hours': 0
+    }
+
+
+def period_keys(date):
+    """Bucket keys for a YYYY-MM-DD date: {'day': ..., 'week': 'YYYY-Www', ...}."""
+    year, week, _ = datetime.strptime(date, '%Y-%m-%d').isocalendar()
+    return {
+        'day': date,
+        'week': f"{year}-W{week:02d}",
+        'month': date[:7],
+        'all': None
+    }
+
+
+class AttendanceRollups:
+    """Attendance buckets keyed by (scope, period) -> period key -> scope id.
+
+    With ``build=False`` the buckets are computed by the first read instead
+    of up front.
+    """
+
+    def __init__(self, store, build=True):
+        self.store = store
+        self._lock = threading.RLock()
+        # None until built: writes before that are left to the first build
+        self._buckets = None
+        if build:
+            self.rebuild()
+        store.attendance.subscribe(self._on_attendance)
+        store.users.subscribe(self._on_user)
+
+    def _department_of(self, employee_id):
+        employee = self.store.users.get(employee_id)
+        return employee['department'] if employee else None
+
+    def _apply(self, buckets, attendance, department, sign):
+        date = attendance.get('date')
+        if not date:
+            return
+        try:
+            keys = period_keys(date)
+        except ValueError:
+            return
+        field = STATUS_FIELDS.get(attendance.get('status'), 'other')
+        hours = attendance.get('hours_worked') or 0
+        scope_ids = {
+            'employee': attendance.get('employee_id'),
+            'department': department,
+            'company': None
+        }
+        for scope, scope_id in scope_ids.items():
+            for period, key in keys.items():
+                by_key = buckets.setdefault((scope, period), {})
+                stats = by_key.setdefault(key, {}).setdefault(scope_id, empty_stats())
+                stats[field] += sign
+                stats['records'] += sign
+                stats['hours'] += sign * hours
+
+    def _compute(self):
+        buckets = {}
+        departments = {}
+        for attendance in self.store.attendance:
+            employee_id = attendance.get('employee_id')
+            if employee_id not in departments:
+                departments[employee_id] = self._department_of(employee_id)
+            self._apply(buckets, attendance, departments[employee_id], 1)
+        return buckets
+
+    def rebuild(self):
+        """Recompute every bucket from the attendance history.
+
+        Writes to attendance and users, including those replayed from other
+        processes, wait for the rebuild to finish, so no update is lost or
+        counted twice.
+        """
+        store = self.store
+        with store.rebuilding(), store.users.writes_paused(), store.attendance.writes_paused():
+            buckets = self._compute()
+            with self._lock:
+                self._buckets = buckets
+
+    def _build_once(self):
+        # Called without the lock: writers are paused before it is taken
+        if self._buckets is None:
+            self.rebuild()
+
+    def _on_attendance(self, action, old, new):
+        with self._lock:
+            if self._buckets is None:
+                return
+            if old:
+                self._apply(self._buckets, old, self._department_of(old.get('employee_id')), -1)
+            if new:
+                self._apply(self._buckets, new, self._department_of(new.get('employee_id')), 1)
+
+    def _on_user(self, action, old, new):
+        # Deleted employees' history moves to the None department, like
+        # attendance of employees that no longer exist
+        department = new.get('department') if new else None
+        if not old or old.get('department') == department:
+            return
+        # Move the employee's history from the old department to the new one
+        employee_id = old['id']
+        with self._lock:
+            if self._buckets is None:
+                return
+            for period in PERIODS:
+                employee_buckets = self._buckets.get(('employee', period), {})
+                department_buckets = self._buckets.setdefault(('department', period), {})
+                for key, by_employee in employee_buckets.items():
+                    stats = by_employee.get(employee_id)
+                    if not stats:
+                        continue
+                    by_department = department_buckets.setdefault(key, {})
+                    source = by_department.setdefault(old.get('department'), empty_stats())
+                    target = by_department.setdefault(department, empty_stats())
+                    for field, value in stats.items():
+                        source[field] -= value
+                        target[field] += value
+
+    def stats(self, scope, scope_id, period, key=None):
+        """Counts for one bucket, e.g. stats('employee', 3, 'month', '2024-01')."""
+        self._build_once()
+        with self._lock:
+            stats = self._buckets.get((scope, period), {}).get(key, {}).get(scope_id)
+            return dict(stats) if stats else empty_stats()
+
+    def range_stats(self, scope, scope_id, start_date, days):
+        """Sum of the daily buckets for ``days`` days starting at ``start_date``."""
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        total = empty_stats()
+        self._build_once()
+        with self._lock:
+            by_day = self._buckets.get((scope, 'day'), {})
+            for offset in range(days):
+                key = (start + timedelta(days=offset)).strftime('%Y-%m-%d')
+                stats = by_day.get(key, {}).get(scope_id)
+                if stats:
+                    for field, value in stats.items():
+                        total[field] += value
+        return total
+
+    def buckets(self, scope, period, key=None):
+        """All non-empty buckets of a scope for one period key: {scope_id: stats}."""
+        self._build_once()
+        with self._lock:
+            by_scope = self._buckets.get((scope, period), {}).get(key, {})
+            return {scope_id: dict(stats) for scope_id, stats in by_scope.items() if stats['records']}
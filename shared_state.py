@@ -0,0 +1,82 @@
+"""
+Coordination between worker processes serving the same database.
+
+Every worker replays the other workers' writes (``ChangeFollower``, plus a
+sync before each request) so its listeners see every change.  Work that
+must happen once per deployment (background jobs, punch consolidation,
+seeding an empty database, crash recovery) runs only in the worker holding
+an exclusive lock on a file next to the database (``LeaderElection``).  When
+that worker exits, the lock is released and another worker takes over.
+"""
+
+import threading
+import time
+import traceback
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class LeaderElection:
+    """Holds ``path`` locked for the life of the process once acquired."""
+
+    def __init__(self, path, retry_interval=5.0):
+        self.path = path
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self._file = None
+
+    def try_acquire(self):
+        """Take the lock if no other process holds it. Returns ``is_leader``."""
+        if self.is_leader:
+            return True
+        lock_file = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file  # kept open: closing it would release the lock
+        self.is_leader = True
+        return True
+
+    def when_elected(self, callback):
+        """Call ``callback()`` now if this process leads, otherwise once it takes over."""
+        if self.try_acquire():
+            callback()
+            return
+
+        def wait():
+            while not self.try_acquire():
+                time.sleep(self.retry_interval)
+            callback()
+
+        threading.Thread(target=wait, name='leader-election', daemon=True).start()
+
+
+class ChangeFollower:
+    """Replays other processes' writes to the local listeners every ``interval`` seconds."""
+
+    def __init__(self, store, interval=0.5):
+        self.store = store
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='change-follower', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.store.sync()
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,494 @@
+"""
+SQLite storage backend for the HR Management System.
+
+Implements the Collection API from store.py on top of a local SQLite file so
+data survives restarts and large histories stay on disk.  Each collection is
+a table holding the record as JSON plus one column per indexed field; the
+index layout from store.COLLECTIONS becomes composite SQL indexes.
+
+When several processes serve the same file, the database can keep a change
+log: every write also appends (action, old record, new record) to a
+``_changes`` table in the same transaction, and ``sync`` replays the writes
+of other processes to this process's listeners, so everything derived from
+them (counters, rollups, caches) matches the data.  State recomputed from
+the data instead is computed inside ``rebuilding``, which lines the
+recomputation up with the changes ``sync`` has replayed.
+
+Listeners are only told about a write once it is committed: writes queue
+their notifications on the thread's transaction, which delivers them after
+the outermost COMMIT and drops them on rollback, so derived state never
+holds a change the database does not.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from store import Observable
+
+CHANGE_LOG_RETENTION = 100000  # changes kept for processes that fall behind
+CHANGE_LOG_PRUNE_EVERY = 1000  # writes between pruning passes
+
+
+class SQLiteDatabase:
+    """A SQLite file shared by all collections, one connection per thread.
+
+    With ``change_log`` every write is also recorded for the other processes
+    using the file; see ``sync``.
+    """
+
+    def __init__(self, path, change_log=False):
+        self.path = path
+        self.change_log = change_log
+        self._collections = {}
+        self._resync_hooks = []
+        self._sync_lock = threading.RLock()
+        self._writes = 0
+        self._reset_process()
+        if change_log:
+            conn = self.connection()
+            conn.execute('CREATE TABLE IF NOT EXISTS _changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'origin TEXT NOT NULL, collection TEXT NOT NULL, action TEXT NOT NULL, '
+                         'old TEXT, new TEXT)')
+            self._synced = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM _changes').fetchone()[0]
+
+    def _reset_process(self):
+        # Connections and the change origin are per process, including forked children
+        self._pid = os.getpid()
+        self._origin = f"{self._pid}-{os.urandom(4).hex()}"
+        self._local = threading.local()
+
+    def connection(self):
+        if self._pid != os.getpid():
+            self._reset_process()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None,
+                                   check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run the block in a write transaction on this thread's connection.
+
+        Nested blocks join the transaction already open on the thread through
+        a savepoint: if one raises, only its own writes are rolled back.
+        Notifications queued with ``after_commit`` are delivered once the
+        outermost block commits; ``on_rollback`` callbacks run for the writes
+        that are rolled back.
+        """
+        conn = self.connection()
+        local = self._local
+        if conn.in_transaction:
+            marks = (len(local.notifications), len(local.undo))
+            conn.execute("SAVEPOINT nested")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK TO nested")
+                conn.execute("RELEASE nested")
+                self._discard(*marks)
+                raise
+            conn.execute("RELEASE nested")
+            return
+        local.notifications, local.undo = [], []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._discard(0, 0)
+            raise
+        notifications, local.notifications, local.undo = local.notifications, [], []
+        for collection, action, old, new in notifications:
+            # Under the collection's writer lock, so its listeners still see writes in order
+            with collection._write_lock:
+                collection._notify(action, old, new)
+
+    def _discard(self, notified, undone):
+        """Drop the notifications queued after ``notified`` and undo the writes after ``undone``."""
+        local = self._local
+        undo = local.undo[undone:]
+        del local.notifications[notified:]
+        del local.undo[undone:]
+        for callback in reversed(undo):
+            callback()
+
+    def after_commit(self, collection, action, old, new):
+        """Queue a notification of ``collection``'s listeners for when the transaction commits."""
+        self._local.notifications.append((collection, action, old, new))
+
+    def on_rollback(self, callback):
+        """Call ``callback()`` if the current transaction (or savepoint) is rolled back."""
+        self._local.undo.append(callback)
+
+    def collection(self, name, indexes=None, derived=None, log_changes=True, ranges=()):
+        collection = SQLiteCollection(self, name, indexes=indexes, derived=derived,
+                                      log_changes=log_changes, ranges=ranges)
+        self._collections[name] = collection
+        return collection
+
+    # Change log
+
+    def log(self, conn, collection, changes):
+        """Record (action, old, new) writes of ``collection`` inside the current transaction."""
+        conn.executemany(
+            'INSERT INTO _changes (origin, collection, action, old, new) VALUES (?, ?, ?, ?, ?)',
+            [(self._origin, collection, action,
+              json.dumps(old) if old is not None else None,
+              json.dumps(new) if new is not None else None) for action, old, new in changes])
+        self._writes += len(changes)
+        if self._writes >= CHANGE_LOG_PRUNE_EVERY:
+            self._writes = 0
+            conn.execute('DELETE FROM _changes WHERE seq <= (SELECT MAX(seq) FROM _changes) - ?',
+                         (CHANGE_LOG_RETENTION,))
+
+    def on_resync(self, hook):
+        """Call ``hook()`` when changes were pruned before this process replayed them.
+
+        Hooks rebuild whatever the listeners maintain from scratch; they run
+        inside ``rebuilding``'s snapshot, before the changes are skipped.
+        """
+        self._resync_hooks.append(hook)
+
+    @contextmanager
+    def _read_snapshot(self, conn):
+        """Run the block in one read transaction on ``conn``, unless one is open already."""
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            conn.execute("COMMIT")
+
+    @contextmanager
+    def rebuilding(self):
+        """Hold off ``sync`` while listener state is recomputed from the data.
+
+        The block reads one snapshot of the database, and the changes of
+        other processes up to that snapshot are replayed before it starts,
+        so ``sync`` afterwards replays exactly the changes the block did not
+        see.  Inside an open transaction (a resync, or a write) the block
+        reads that transaction's view instead.
+        """
+        if not self.change_log:
+            yield
+            return
+        conn = self.connection()
+        with self._sync_lock:
+            if conn.in_transaction:
+                yield
+                return
+            with self._read_snapshot(conn):
+                self._replay(conn)
+                yield
+
+    def sync(self, batch_size=1000):
+        """Replay writes committed by other processes to the local listeners.
+
+        Returns the number of changes replayed.
+        """
+        if not self.change_log:
+            return 0
+        with self._sync_lock:
+            return self._replay(self.connection(), batch_size)
+
+    def _replay(self, conn, batch_size=1000):
+        replayed = 0
+        while True:
+            rows = conn.execute('SELECT seq, origin, collection, action, old, new FROM _changes '
+                                'WHERE seq > ? ORDER BY seq LIMIT ?',
+                                (self._synced, batch_size)).fetchall()
+            if not rows:
+                return replayed
+            if rows[0][0] != self._synced + 1:
+                # Pruned before we saw it: rebuild from the current data, and
+                # skip exactly the changes that data includes
+                with self._read_snapshot(conn):
+                    latest = conn.execute('SELECT MAX(seq) FROM _changes').fetchone()[0]
+                    for hook in self._resync_hooks:
+                        hook()
+                    self._synced = latest
+                return replayed
+            for seq, origin, name, action, old, new in rows:
+                self._synced = seq
+                collection = self._collections.get(name)
+                if origin == self._origin or collection is None:
+                    continue
+                # Under the collection's writer lock, like local writes, so a
+                # rebuild that pauses writes keeps replays out too
+                with collection._write_lock:
+                    collection._notify(action, json.loads(old) if old else None,
+                                       json.loads(new) if new else None)
+                replayed += 1
+
+
+class SQLiteCollection(Observable):
+    """Collection API backed by a SQLite table.
+
+    Records are returned as fresh dicts, so callers must write changes back
+    through ``update`` rather than mutating what they read.  Reads use the
+    thread's own connection and never wait for writers (WAL); writes to one
+    collection are serialized so listeners see them in commit order.
+    """
+
+    def __init__(self, database, name, indexes=None, derived=None, log_changes=True, ranges=()):
+        self.name = name
+        self._listeners = []
+        self._write_lock = threading.RLock()
+        self._db = database
+        self._logged = database.change_log and log_changes
+        self._derived = derived or {}
+        self._index_fields = {}
+        for index_name, fields in (indexes or {}).items():
+            if isinstance(fields, str):
+                fields = (fields,)
+            self._index_fields[index_name] = tuple(fields)
+
+        self._columns = []
+        for fields in self._index_fields.values():
+            for field in fields:
+                if field not in self._columns:
+                    self._columns.append(field)
+
+        # Statements are built once so sqlite3's statement cache reuses them
+        column_list = ''.join(f', "{c}"' for c in self._columns)
+        placeholders = ', ?' * len(self._columns)
+        assignments = ''.join(f', "{c}" = ?' for c in self._columns)
+        self._sql_insert = f'INSERT INTO "{name}" (id, data{column_list}) VALUES (?, ?{placeholders})'
+        self._sql_update = f'UPDATE "{name}" SET data = ?{assignments} WHERE id = ?'
+        self._sql_get = f'SELECT id, data FROM "{name}" WHERE id = ?'
+        self._sql_all = f'SELECT id, data FROM "{name}" ORDER BY id'
+        self._sql_last = f'SELECT id, data FROM "{name}" ORDER BY id DESC LIMIT 1'
+        self._sql_delete = f'DELETE FROM "{name}" WHERE id = ?'
+        self._sql_count_all = f'SELECT COUNT(*) FROM "{name}"'
+        self._sql_page = f'SELECT id, data FROM "{name}" WHERE id > ? ORDER BY id LIMIT ?'
+        self._sql_find = {}
+        self._sql_count = {}
+        self._sql_find_page = {}
+        self._sql_keys = {}
+        for index_name, fields in self._index_fields.items():
+            where = ' AND '.join(f'"{f}" IS ?' for f in fields)
+            cols = ', '.join(f'"{f}"' for f in fields)
+            self._sql_find[index_name] = f'SELECT id, data FROM "{name}" WHERE {where} ORDER BY id'
+            self._sql_count[index_name] = f'SELECT COUNT(*) FROM "{name}" WHERE {where}'
+            self._sql_find_page[index_name] = (f'SELECT id, data FROM "{name}" WHERE {where} '
+                                               f'AND id > ? ORDER BY id LIMIT ?')
+            self._sql_keys[index_name] = f'SELECT DISTINCT {cols} FROM "{name}"'
+        # (index name, has start, has end) -> range scan over the index, in key order
+        self._sql_range = {}
+        for index_name in ranges:
+            fields = self._index_fields[index_name]
+            last = fields[-1]
+            where = ''.join(f'"{f}" IS ? AND ' for f in fields[:-1]) + f'"{last}" IS NOT NULL'
+            for has_start in (False, True):
+                for has_end in (False, True):
+                    bounds = (f' AND "{last}" >= ?' if has_start else '') + (f' AND "{last}" <= ?' if has_end else '')
+                    self._sql_range[(index_name, has_start, has_end)] = (
+                        f'SELECT id, data FROM "{name}" WHERE {where}{bounds} ORDER BY "{last}", id')
+
+        self._create_schema()
+
+    def _create_schema(self):
+        conn = self._db.connection()
+        columns = ''.join(f', "{c}"' for c in self._columns)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.name}" '
+                     f'(id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL{columns})')
+        for index_name, fields in self._index_fields.items():
+            # Indexes that are a prefix of a composite one are still created:
+            # their entries are ordered by id within each key, which keeps
+            # paging through one key (see ``page``) a range scan
+            cols = ', '.join(f'"{f}"' for f in fields)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{self.name}_{index_name}" '
+                         f'ON "{self.name}" ({cols})')
+
+    def _field(self, record, field):
+        if field in self._derived:
+            return self._derived[field](record)
+        return record.get(field)
+
+    def _column_values(self, record):
+        return [self._field(record, c) for c in self._columns]
+
+    def _key_params(self, index_name, key):
+        if len(self._index_fields[index_name]) == 1:
+            return (key,)
+        return tuple(key)
+
+    @staticmethod
+    def _load(row):
+        record = {'id': row[0]}
+        record.update(json.loads(row[1]))
+        return record
+
+    @staticmethod
+    def _dump(record):
+        return json.dumps({k: v for k, v in record.items() if k != 'id'})
+
+    def __len__(self):
+        return self._db.connection().execute(self._sql_count_all).fetchone()[0]
+
+    def __iter__(self):
+        cursor = self._db.connection().execute(self._sql_all)
+        for row in cursor:
+            yield self._load(row)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    # Reads
+
+    def get(self, record_id):
+        """Return the record with the given id, or None."""
+        row = self._db.connection().execute(self._sql_get, (record_id,)).fetchone()
+        return self._load(row) if row else None
+
+    def all(self):
+        """Return every record in id order."""
+        return list(self)
+
+    def last(self):
+        """Return the record with the highest id, or None."""
+        row = self._db.connection().execute(self._sql_last).fetchone()
+        return self._load(row) if row else None
+
+    def find(self, index_name, key):
+        """Return all records whose index key equals ``key``, in id order."""
+        cursor = self._db.connection().execute(self._sql_find[index_name],
+                                               self._key_params(index_name, key))
+        return [self._load(row) for row in cursor]
+
+    def find_one(self, index_name, key):
+        """Return the first record whose index key equals ``key``, or None."""
+        cursor = self._db.connection().execute(self._sql_find[index_name],
+                                               self._key_params(index_name, key))
+        row = cursor.fetchone()
+        return self._load(row) if row else None
+
+    def find_range(self, index_name, start=None, end=None, prefix=()):
+        """Return the records whose index key ends in a value from ``start`` to ``end``.
+
+        ``prefix`` holds the values of the index's other fields; both bounds
+        are inclusive and None leaves that side open.  Records come in key
+        order, and in id order within a key, from one range scan of the index.
+        """
+        sql = self._sql_range[(index_name, start is not None, end is not None)]
+        params = tuple(prefix) + tuple(bound for bound in (start, end) if bound is not None)
+        return [self._load(row) for row in self._db.connection().execute(sql, params)]
+
+    def page(self, index_name=None, key=None, after=None, limit=100):
+        """Return up to ``limit`` records with id greater than ``after``, in id order.
+
+        With ``index_name`` only records whose index key equals ``key`` are
+        returned.  Each page is a range scan, so every page costs the same.
+        """
+        after = after or 0
+        conn = self._db.connection()
+        if index_name is None:
+            cursor = conn.execute(self._sql_page, (after, limit))
+        else:
+            cursor = conn.execute(self._sql_find_page[index_name],
+                                  self._key_params(index_name, key) + (after, limit))
+        return [self._load(row) for row in cursor]
+
+    def count(self, index_name, key):
+        """Return the number of records whose index key equals ``key``."""
+        return self._db.connection().execute(self._sql_count[index_name],
+                                             self._key_params(index_name, key)).fetchone()[0]
+
+    def keys(self, index_name):
+        """Return the distinct keys currently present in an index."""
+        rows = self._db.connection().execute(self._sql_keys[index_name]).fetchall()
+        if len(self._index_fields[index_name]) == 1:
+            return [row[0] for row in rows]
+        return [tuple(row) for row in rows]
+
+    # Writes
+
+    @contextmanager
+    def locked(self):
+        """Hold off other writers of this collection for the ``with`` block.
+
+        The block runs in one write transaction, so a read followed by a
+        write is atomic for other processes using the file as well.  Only
+        write to this collection inside the block.
+        """
+        with self._write_lock, self._db.transaction():
+            yield
+
+    def next_id(self):
+        """Reserve and return a new id. Ids are never reused after a delete."""
+        with self._write_lock, self._db.transaction() as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (self.name,)).fetchone()
+            record_id = (row[0] if row else 0) + 1
+            if row:
+                conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (record_id, self.name))
+            else:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (self.name, record_id))
+        return record_id
+
+    def add(self, record):
+        """Insert a record, assigning it the next id if it has none."""
+        return self.add_many([record])[0]
+
+    def add_many(self, records):
+        """Insert several records in one transaction. Returns them with ids assigned.
+
+        If the insert fails, or the enclosing transaction is rolled back, the
+        records given without an id are left without one again.
+        """
+        unassigned = [record for record in records if record.get('id') is None]
+        with self._write_lock:
+            try:
+                with self._db.transaction() as conn:
+                    self._db.on_rollback(lambda: [record.pop('id', None) for record in unassigned])
+                    for record in records:
+                        cursor = conn.execute(self._sql_insert,
+                                              [record.get('id'), self._dump(record)] + self._column_values(record))
+                        record['id'] = cursor.lastrowid
+                    if self._logged:
+                        self._db.log(conn, self.name, [('add', None, record) for record in records])
+                    for record in records:
+                        self._db.after_commit(self, 'add', None, record)
+            except sqlite3.IntegrityError:
+                if len(records) == 1:
+                    raise KeyError(f"{self.name} record {records[0].get('id')} already exists")
+                raise KeyError(f"{self.name} record already exists")
+        return records
+
+    def update(self, record_id, changes):
+        """Apply ``changes`` to a record and re-index it. Returns the record."""
+        with self._write_lock:
+            with self._db.transaction() as conn:
+                record = self.get(record_id)
+                old = dict(record) if record is not None else None
+                if record is not None:
+                    record.update({k: v for k, v in changes.items() if k != 'id'})
+                    conn.execute(self._sql_update,
+                                 [self._dump(record)] + self._column_values(record) + [record_id])
+                    if self._logged:
+                        self._db.log(conn, self.name, [('update', old, record)])
+                    self._db.after_commit(self, 'update', old, record)
+        return record
+
+    def delete(self, record_id):
+        """Remove a record. Returns the removed record, or None."""
+        with self._write_lock:
+            with self._db.transaction() as conn:
+                record = self.get(record_id)
+                if record is not None:
+                    conn.execute(self._sql_delete, (record_id,))
+                    if self._logged:
+                        self._db.log(conn, self.name, [('delete', record, None)])
+                    self._db.after_commit(self, 'delete', record, None)
+        return record
@@ -10,6 +10,7 @@ document.addEventListener('DOMContentLoaded', function() {
     loadEmployees();
     loadDashboardStats();
     showSection('dashboard');
+    connectLiveUpdates();
     
     // Set today's date as default
     const today = new Date().toISOString().split('T')[0];
@@ -93,24 +94,90 @@ function showSection(section) {
 async function loadDashboardStats() {
     try {
         const response = await fetch('/api/reports/dashboard');
-        const stats = await response.json();
-        
-        document.getElementById('totalEmployees').textContent = stats.total_employees;
-        document.getElementById('activeEmployees').textContent = stats.active_employees;
-        document.getElementById('totalDepartments').textContent = stats.departments;
-        document.getElementById('pendingLeaves').textContent = stats.pending_leaves;
-        document.getElementById('presentToday').textContent = stats.present_today;
-        document.getElementById('avgSalary').textContent = '$' + stats.avg_salary.toLocaleString();
+        renderDashboardStats(await response.json());
     } catch (error) {
         console.error('Error loading dashboard stats:', error);
     }
 }
 
+function renderDashboardStats(stats) {
+    document.getElementById('totalEmployees').textContent = stats.total_employees;
+    document.getElementById('activeEmployees').textContent = stats.active_employees;
+    document.getElementById('totalDepartments').textContent = stats.departments;
+    document.getElementById('pendingLeaves').textContent = stats.pending_leaves;
+    document.getElementById('presentToday').textContent = stats.present_today;
+    document.getElementById('avgSalary').textContent = '$' + stats.avg_salary.toLocaleString();
+}
+
+// Live updates: the server pushes record deltas and dashboard numbers, which
+// are applied to the loaded lists instead of re-fetching them
+let liveRenderPending = false;
+
+function connectLiveUpdates() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/api/events/stream');
+    const lists = {
+        attendance: () => attendance,
+        leave_requests: () => leaveRequests,
+        payroll: () => payrollData,
+        users: () => employees
+    };
+    Object.keys(lists).forEach(name => {
+        source.addEventListener(name, event => {
+            applyDelta(lists[name](), JSON.parse(event.data));
+            scheduleLiveRender();
+        });
+    });
+    source.addEventListener('dashboard', event => renderDashboardStats(JSON.parse(event.data)));
+    // Sent when events were missed: reload whatever is on screen
+    source.addEventListener('reset', () => showSection(currentSection));
+}
+
+function applyDelta(records, delta) {
+    const index = records.findIndex(record => record.id === delta.id);
+    if (delta.action === 'add' && index === -1) {
+        records.push(delta.record);
+    } else if (delta.action === 'update' && index !== -1) {
+        Object.assign(records[index], delta.changes);
+    } else if (delta.action === 'delete' && index !== -1) {
+        records.splice(index, 1);
+    }
+}
+
+// Re-render the visible section at most once per animation frame
+function scheduleLiveRender() {
+    if (liveRenderPending) return;
+    liveRenderPending = true;
+    requestAnimationFrame(() => {
+        liveRenderPending = false;
+        switch(currentSection) {
+            case 'employees': renderEmployeeTable(); break;
+            case 'attendance': renderAttendanceTable(); break;
+            case 'leaves': renderLeaveTable(); break;
+            case 'payroll': renderPayrollTable(); updatePayrollStatistics(); break;
+        }
+    });
+}
+
+// Fetch every record of a list endpoint one page at a time
+async function fetchAllPages(url, pageSize = 500) {
+    const separator = url.includes('?') ? '&' : '?';
+    let records = [];
+    let cursor = '';
+    do {
+        const response = await fetch(`${url}${separator}limit=${pageSize}&cursor=${cursor}`);
+        if (!response.ok) throw new Error(`Failed to load ${url}`);
+        const page = await response.json();
+        records = records.concat(page.items);
+        cursor = page.next_cursor;
+    } while (cursor);
+    return records;
+}
+
 // Load employees from backend
 async function loadEmployees() {
     try {
-        const response = await fetch('/api/users');
-        employees = await response.json();
+        employees = await fetchAllPages('/api/users');
         renderEmployeeTable();
         updateDashboardStats();
     } catch (error) {
@@ -170,8 +237,7 @@ function renderEmployeeTable() {
 // Load payroll data
 async function loadPayroll() {
     try {
-        const response = await fetch('/api/payroll');
-        payrollData = await response.json();
+        payrollData = await fetchAllPages('/api/payroll');
         renderPayrollTable();
         updatePayrollStatistics();
     } catch (error) {
@@ -349,8 +415,17 @@ async function generateMonthlyPayroll() {
         
         if (response.ok) {
             const result = await response.json();
-            console.log('Payroll generation result:', result);
-            showAlert(`✅ Payroll generated successfully for ${result.month}!\n📊 Generated for ${result.count} employees`, 'success', 8000);
+            console.log('Payroll generation started:', result);
+            const run = await waitForPayrollRun(result.status_url);
+            if (run.status === 'Cancelled') {
+                showAlert(`⚠️ Payroll run for ${run.month} was cancelled after ${run.generated_count} employees. Generate payroll for the month again to resume it.`, 'warning', 8000);
+                loadPayroll();
+                return;
+            }
+            if (run.status !== 'Completed') {
+                throw new Error(run.error || 'Payroll run did not complete');
+            }
+            showAlert(`✅ Payroll generated successfully for ${run.month}!\n📊 Generated for ${run.generated_count} employees`, 'success', 8000);
             loadPayroll(); // Reload payroll data
         } else {
             const error = await response.json();
@@ -363,6 +438,23 @@ async function generateMonthlyPayroll() {
     }
 }
 
+// Poll a payroll run until it completes, fails or is cancelled
+const PAYROLL_RUN_DONE = ['Completed', 'Failed', 'Cancelled'];
+
+async function waitForPayrollRun(statusUrl, intervalMs = 1000) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        if (!response.ok) {
+            throw new Error('Failed to fetch payroll run status');
+        }
+        const run = await response.json();
+        if (PAYROLL_RUN_DONE.includes(run.status)) {
+            return run;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 // Load payroll summary
 async function loadPayrollSummary(month = null) {
     try {
@@ -641,52 +733,25 @@ async function addManualPayroll() {
 }
 
 // Export payroll report
-function exportPayrollReport() {
-    const monthFilter = document.getElementById('payrollMonthFilter').value;
-    const statusFilter = document.getElementById('payrollStatusFilter').value;
-    
-    let filteredPayroll = payrollData;
-    
-    if (monthFilter) {
-        filteredPayroll = filteredPayroll.filter(p => p.month === monthFilter);
-    }
-    
-    if (statusFilter) {
-        filteredPayroll = filteredPayroll.filter(p => p.status === statusFilter);
-    }
+// Download a server-side export; the browser streams it straight to disk
+function downloadExport(path, params) {
+    const query = new URLSearchParams({ format: 'csv', gzip: '1' });
+    Object.entries(params).forEach(([key, value]) => {
+        if (value) query.set(key, value);
+    });
     
-    // Create CSV content
-    const headers = ['Employee Name', 'Month', 'Basic Salary', 'HRA', 'Allowances', 'Overtime', 'Bonus', 'Deductions', 'Tax', 'Net Salary', 'Status'];
-    const csvContent = [
-        headers.join(','),
-        ...filteredPayroll.map(payroll => {
-            const employee = employees.find(emp => emp.id === payroll.employee_id);
-            return [
-                employee ? employee.name : 'Unknown',
-                payroll.month,
-                payroll.basic_salary,
-                payroll.hra,
-                payroll.allowances,
-                payroll.overtime,
-                payroll.bonus,
-                payroll.deductions,
-                payroll.tax,
-                payroll.net_salary,
-                payroll.status
-            ].join(',');
-        })
-    ].join('\n');
-    
-    // Download CSV
-    const blob = new Blob([csvContent], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
     const a = document.createElement('a');
-    a.href = url;
-    a.download = `payroll_report_${new Date().toISOString().slice(0, 10)}.csv`;
+    a.href = `${path}?${query.toString()}`;
     document.body.appendChild(a);
     a.click();
     document.body.removeChild(a);
-    window.URL.revokeObjectURL(url);
+}
+
+function exportPayrollReport() {
+    downloadExport('/api/export/payroll', {
+        month: document.getElementById('payrollMonthFilter').value,
+        status: document.getElementById('payrollStatusFilter').value
+    });
     
     showAlert('Payroll report exported successfully', 'success');
 }
@@ -878,8 +943,7 @@ function resetEmployeeModal() {
 // Attendance Management
 async function loadAttendance() {
     try {
-        const response = await fetch('/api/attendance');
-        attendance = await response.json();
+        attendance = await fetchAllPages('/api/attendance');
         renderAttendanceTable();
     } catch (error) {
         console.error('Error loading attendance:', error);
@@ -920,8 +984,7 @@ function getStatusBadgeClass(status) {
 // Leave Management
 async function loadLeaveRequests() {
     try {
-        const response = await fetch('/api/leave-requests');
-        leaveRequests = await response.json();
+        leaveRequests = await fetchAllPages('/api/leave-requests');
         renderLeaveTable();
     } catch (error) {
         console.error('Error loading leave requests:', error);
@@ -1802,71 +1865,12 @@ function showPayrollSummary() {
 
 // Enhanced export function
 function exportDetailedPayrollReport() {
-    const monthFilter = document.getElementById('payrollMonthFilter').value;
-    const statusFilter = document.getElementById('payrollStatusFilter').value;
-    const employeeFilter = document.getElementById('payrollEmployeeFilter').value;
-    
-    let filteredPayroll = payrollData;
-    
-    if (monthFilter) filteredPayroll = filteredPayroll.filter(p => p.month === monthFilter);
-    if (statusFilter) filteredPayroll = filteredPayroll.filter(p => p.status === statusFilter);
-    if (employeeFilter) filteredPayroll = filteredPayroll.filter(p => p.employee_id == employeeFilter);
-    
-    // Create detailed CSV content
-    const headers = [
-        'Employee Name', 'Employee ID', 'Month', 'Pay Period',
-        'Basic Salary', 'HRA', 'Allowances', 'Transport Allowance', 'Medical Allowance', 'Food Allowance',
-        'Overtime', 'Bonus', 'Gross Salary',
-        'PF Deduction', 'ESI Deduction', 'Professional Tax', 'Insurance Premium', 'Loan Deduction', 'Other Deductions', 'Income Tax', 'Total Deductions',
-        'Net Salary', 'Bank Name', 'Account Number', 'Deposit Status', 'Deposit Date', 'Transaction ID'
-    ];
-    
-    const csvContent = [
-        headers.join(','),
-        ...filteredPayroll.map(payroll => {
-            const employee = employees.find(emp => emp.id === payroll.employee_id);
-            return [
-                employee ? employee.name : 'Unknown',
-                employee ? employee.employee_id : 'N/A',
-                payroll.month,
-                payroll.pay_period || payroll.month,
-                payroll.basic_salary || 0,
-                payroll.hra || 0,
-                payroll.allowances || 0,
-                payroll.transport_allowance || 0,
-                payroll.medical_allowance || 0,
-                payroll.food_allowance || 0,
-                payroll.overtime || 0,
-                payroll.bonus || 0,
-                payroll.gross_salary || (payroll.basic_salary + payroll.hra + payroll.allowances + payroll.overtime + payroll.bonus) || 0,
-                payroll.pf_deduction || 0,
-                payroll.esi_deduction || 0,
-                payroll.professional_tax || 0,
-                payroll.insurance_premium || 0,
-                payroll.loan_deduction || 0,
-                payroll.other_deductions || payroll.deductions || 0,
-                payroll.income_tax || payroll.tax || 0,
-                payroll.total_deductions || (payroll.deductions + payroll.tax) || 0,
-                payroll.net_salary || 0,
-                payroll.bank_details?.bank_name || 'N/A',
-                payroll.bank_details?.account_number || 'N/A',
-                payroll.bank_details?.deposit_status || payroll.status || 'Pending',
-                payroll.bank_details?.deposit_date || 'N/A',
-                payroll.bank_details?.transaction_id || 'N/A'
-            ].join(',');
-        })
-    ].join('\n');
-    
-    // Download CSV
-    const blob = new Blob([csvContent], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
-    const a = document.createElement('a');
-    a.href = url;
-    a.download = `detailed_payroll_report_${new Date().toISOString().slice(0, 10)}.csv`;
-    document.body.appendChild(a);
-    a.click();
-    document.body.removeChild(a);
-    window.URL.revokeObjectURL(url);
+    downloadExport('/api/export/payroll', {
+        layout: 'detailed',
+        month: document.getElementById('payrollMonthFilter').value,
+        status: document.getElementById('payrollStatusFilter').value,
+        employee_id: document.getElementById('payrollEmployeeFilter').value
+    });
     
     showAlert('📊 Detailed payroll report exported successfully', 'success');
 }
@@ -2328,52 +2332,11 @@ async function processBulkAttendance() {
 
 // Export attendance report
 function exportAttendanceReport() {
-    const employeeFilter = document.getElementById('attendanceEmployeeFilter').value;
-    const dateFilter = document.getElementById('attendanceDateFilter').value;
-    const statusFilter = document.getElementById('attendanceStatusFilter').value;
-    
-    let filteredAttendance = [...attendance];
-    
-    if (employeeFilter) filteredAttendance = filteredAttendance.filter(a => a.employee_id == employeeFilter);
-    if (dateFilter) filteredAttendance = filteredAttendance.filter(a => a.date === dateFilter);
-    if (statusFilter) filteredAttendance = filteredAttendance.filter(a => a.status === statusFilter);
-    
-    // Create CSV content
-    const headers = [
-        'Employee Name', 'Employee ID', 'Date', 'Day', 'Status', 
-        'Check-in Time', 'Check-out Time', 'Hours Worked', 'Overtime Hours', 'Remarks'
-    ];
-    
-    const csvContent = [
-        headers.join(','),
-        ...filteredAttendance.map(record => {
-            const employee = employees.find(emp => emp.id === record.employee_id);
-            const dayName = new Date(record.date).toLocaleDateString('en-US', { weekday: 'long' });
-            return [
-                employee ? employee.name : 'Unknown',
-                employee ? employee.employee_id : 'N/A',
-                record.date,
-                dayName,
-                record.status,
-                record.check_in || 'N/A',
-                record.check_out || 'N/A',
-                record.hours_worked || 0,
-                record.overtime_hours || 0,
-                record.remarks || 'No remarks'
-            ].join(',');
-        })
-    ].join('\n');
-    
-    // Download CSV
-    const blob = new Blob([csvContent], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
-    const a = document.createElement('a');
-    a.href = url;
-    a.download = `attendance_report_${new Date().toISOString().slice(0, 10)}.csv`;
-    document.body.appendChild(a);
-    a.click();
-    document.body.removeChild(a);
-    window.URL.revokeObjectURL(url);
+    downloadExport('/api/export/attendance', {
+        employee_id: document.getElementById('attendanceEmployeeFilter').value,
+        date: document.getElementById('attendanceDateFilter').value,
+        status: document.getElementById('attendanceStatusFilter').value
+    });
     
     showAlert('📊 Attendance report exported successfully', 'success');
 }
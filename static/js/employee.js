@@ -201,13 +201,16 @@ function changeProfilePhoto() {
 // Load my attendance
 async function loadMyAttendance() {
     try {
-        const response = await fetch('/api/employee/attendance');
-        if (response.ok) {
-            myAttendance = await response.json();
-            renderMyAttendanceTable();
-        } else {
-            throw new Error('Failed to load attendance');
-        }
+        myAttendance = [];
+        let cursor = '';
+        do {
+            const response = await fetch(`/api/employee/attendance?limit=500&cursor=${cursor}`);
+            if (!response.ok) throw new Error('Failed to load attendance');
+            const page = await response.json();
+            myAttendance = myAttendance.concat(page.items);
+            cursor = page.next_cursor;
+        } while (cursor);
+        renderMyAttendanceTable();
     } catch (error) {
         console.error('Error loading attendance:', error);
         showAlert('Error loading attendance', 'danger');
@@ -0,0 +1,549 @@
+"""
+Record store for the HR Management System.
+
+Every collection keeps its records in a primary-key dict plus any number of
+secondary indexes, so route handlers can resolve records by id, employee,
+(employee, date), month or status without scanning the full dataset.
+Indexes named in ``ranges`` also answer ``find_range``: the records whose
+last index field lies between two values, e.g. one employee's attendance
+from one date to another.  The same collection API is implemented on SQLite
+in sqlite_store.py.
+
+Collections are safe to share between request threads: reads run
+concurrently under a per-collection reader-writer lock, writes to one
+collection are serialized (so ids are allocated exactly once and listeners
+see writes in order), and nothing a collection does ever waits on another
+collection's lock.
+"""
+
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import nullcontext
+
+
+class _Held:
+    """``with`` support for a pair of acquire/release methods."""
+
+    __slots__ = ('_acquire', '_release')
+
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self):
+        self._acquire()
+
+    def __exit__(self, *exc_info):
+        self._release()
+
+
+class ReadWriteLock:
+    """Any number of readers or a single writer.
+
+    Used as ``with lock.read:`` and ``with lock.write:``.  Waiting writers
+    go before new readers, so a steady stream of reads cannot starve them.
+    Not reentrant: a thread must not take the lock again while holding it.
+    """
+
+    def __init__(self):
+        # Entered directly for the common uncontended paths; the condition
+        # shares it for waiting
+        self._mutex = threading.Lock()
+        self._condition = threading.Condition(self._mutex)
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+        self.read = _Held(self.acquire_read, self.release_read)
+        self.write = _Held(self.acquire_write, self.release_write)
+
+    def acquire_read(self):
+        with self._mutex:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._mutex:
+            self._readers -= 1
+            if not self._readers and self._writers_waiting:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+
+    def release_write(self):
+        with self._condition:
+            self._writing = False
+            self._condition.notify_all()
+
+
+class Observable:
+    """Notifies subscribed listeners after every write to a collection.
+
+    Listeners are called as ``listener(action, old, new)`` where action is
+    'add', 'update' or 'delete'; ``old`` is None for adds and ``new`` is None
+    for deletes.
+    """
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, action, old, new):
+        for listener in self._listeners:
+            listener(action, old, new)
+
+    def writes_paused(self):
+        """Hold off writes to this collection, and their notifications, for the ``with`` block.
+
+        For listeners that recompute their state from the data: while paused,
+        every write the data shows has been notified, so none is counted
+        twice or lost.  Unlike ``locked()`` it opens no transaction.
+        """
+        return self._write_lock
+
+
+def timeline_add(timelines, prefix, value):
+    """Insert ``value`` into the sorted timeline of ``prefix`` in ``timelines``.
+
+    None, and values that do not compare with the ones already there (a
+    number among date strings), are left out: no range can hold them.
+    """
+    if value is None:
+        return
+    timeline = timelines.setdefault(prefix, [])
+    try:
+        if not timeline or value > timeline[-1]:
+            timeline.append(value)
+        else:
+            insort(timeline, value)
+    except TypeError:
+        pass
+
+
+def timeline_discard(timelines, prefix, value):
+    """Remove ``value`` from the timeline of ``prefix``, if it is there."""
+    timeline = timelines.get(prefix)
+    if not timeline:
+        return
+    try:
+        pos = bisect_left(timeline, value)
+    except TypeError:
+        return
+    if pos < len(timeline) and timeline[pos] == value:
+        del timeline[pos]
+    if not timeline:
+        del timelines[prefix]
+
+
+def timeline_slice(timeline, start=None, end=None):
+    """The values of a sorted timeline from ``start`` to ``end``, inclusive; None is unbounded."""
+    low = bisect_left(timeline, start) if start is not None else 0
+    high = bisect_right(timeline, end) if end is not None else len(timeline)
+    return timeline[low:high]
+
+
+class Collection(Observable):
+    """A set of dict records keyed by ``id`` with secondary indexes.
+
+    ``indexes`` maps an index name to the field (or tuple of fields) it is
+    keyed on.  ``derived`` maps a pseudo-field name to a function computing it
+    from a record, e.g. ``month`` from an attendance ``date``.  Index buckets
+    hold record ids in ascending order so lookups return records in the same
+    order they were created.  ``ranges`` names the indexes ``find_range``
+    works on; each of them also keeps, per value of its other fields, a
+    sorted list of the last field's values (per employee the dates with
+    attendance, for ``employee_date``).  ``log_changes`` only matters to
+    backends shared between processes (see sqlite_store.py) and is ignored
+    here.
+
+    ``_lock`` guards the records and indexes and is only held while they are
+    read or changed, never while listeners run.  ``_write_lock`` serializes
+    writers for the whole write including its notifications; ``locked``
+    exposes it for check-then-write sequences.
+    """
+
+    def __init__(self, name, indexes=None, derived=None, log_changes=True, ranges=()):
+        self.name = name
+        self._listeners = []
+        self._lock = ReadWriteLock()
+        self._write_lock = threading.RLock()
+        self._records = {}
+        self._ids = []  # every id in ascending order, for paging
+        self._next_id = 1
+        self._derived = derived or {}
+        self._index_fields = {}
+        self._indexes = {}
+        for index_name, fields in (indexes or {}).items():
+            if isinstance(fields, str):
+                fields = (fields,)
+            self._index_fields[index_name] = tuple(fields)
+            self._indexes[index_name] = {}
+        # index name -> {other fields' values: sorted last field values}
+        self._timelines = {index_name: {} for index_name in ranges}
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __bool__(self):
+        return bool(self._records)
+
+    def _field(self, record, field):
+        if field in self._derived:
+            return self._derived[field](record)
+        return record.get(field)
+
+    def _index_key(self, index_name, record):
+        fields = self._index_fields[index_name]
+        if len(fields) == 1:
+            return self._field(record, fields[0])
+        return tuple(self._field(record, field) for field in fields)
+
+    def _split_key(self, index_name, key):
+        """(values of the other fields, last field value) of an index key."""
+        if len(self._index_fields[index_name]) == 1:
+            return (), key
+        return key[:-1], key[-1]
+
+    def _index_add(self, record):
+        for index_name, buckets in self._indexes.items():
+            key = self._index_key(index_name, record)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = []
+                if index_name in self._timelines:
+                    timeline_add(self._timelines[index_name], *self._split_key(index_name, key))
+            insort(bucket, record['id'])
+
+    def _index_remove(self, record):
+        for index_name, buckets in self._indexes.items():
+            key = self._index_key(index_name, record)
+            bucket = buckets.get(key)
+            if not bucket:
+                continue
+            pos = bisect_left(bucket, record['id'])
+            if pos < len(bucket) and bucket[pos] == record['id']:
+                del bucket[pos]
+            if not bucket:
+                del buckets[key]
+                if index_name in self._timelines:
+                    timeline_discard(self._timelines[index_name], *self._split_key(index_name, key))
+
+    # Reads
+
+    def get(self, record_id):
+        """Return the record with the given id, or None."""
+        # A single dict lookup, which never sees a half-applied write
+        return self._records.get(record_id)
+
+    def all(self):
+        """Return every record in id order."""
+        with self._lock.read:
+            return list(self._records.values())
+
+    def last(self):
+        """Return the record with the highest id, or None."""
+        with self._lock.read:
+            return self._records[self._ids[-1]] if self._ids else None
+
+    def find(self, index_name, key):
+        """Return all records whose index key equals ``key``, in id order."""
+        with self._lock.read:
+            ids = self._indexes[index_name].get(key, ())
+            return [self._records[record_id] for record_id in ids]
+
+    def find_one(self, index_name, key):
+        """Return the first record whose index key equals ``key``, or None."""
+        with self._lock.read:
+            ids = self._indexes[index_name].get(key)
+            return self._records[ids[0]] if ids else None
+
+    def find_range(self, index_name, start=None, end=None, prefix=()):
+        """Return the records whose index key ends in a value from ``start`` to ``end``.
+
+        ``prefix`` holds the values of the index's other fields, e.g.
+        ``find_range('employee_date', '2024-01-01', '2024-01-31', prefix=(3,))``.
+        Both bounds are inclusive and None leaves that side open.  Records
+        come in key order, and in id order within a key.  The keys are
+        found by bisecting a sorted list, so a range costs the same however
+        much history lies outside it.
+        """
+        prefix = tuple(prefix)
+        with self._lock.read:
+            timeline = self._timelines[index_name].get(prefix, ())
+            buckets = self._indexes[index_name]
+            records = []
+            for value in timeline_slice(timeline, start, end):
+                key = prefix + (value,) if prefix else value
+                records.extend([self._records[record_id] for record_id in buckets[key]])
+            return records
+
+    def page(self, index_name=None, key=None, after=None, limit=100):
+        """Return up to ``limit`` records with id greater than ``after``, in id order.
+
+        With ``index_name`` only records whose index key equals ``key`` are
+        returned.  Pages are found by bisecting a sorted id list, so every
+        page costs the same.
+        """
+        with self._lock.read:
+            if index_name is None:
+                ids = self._ids
+            else:
+                ids = self._indexes[index_name].get(key, ())
+            start = bisect_right(ids, after) if after else 0
+            return [self._records[record_id] for record_id in ids[start:start + limit]]
+
+    def count(self, index_name, key):
+        """Return the number of records whose index key equals ``key``."""
+        with self._lock.read:
+            return len(self._indexes[index_name].get(key, ()))
+
+    def keys(self, index_name):
+        """Return the distinct keys currently present in an index."""
+        with self._lock.read:
+            return list(self._indexes[index_name].keys())
+
+    # Writes
+
+    def locked(self):
+        """Hold off other writers of this collection for the ``with`` block.
+
+        Makes a read followed by a write atomic, e.g. adding a record only if
+        none exists yet for a key.  Readers are not blocked.  Only write to
+        this collection inside the block.
+        """
+        return self._write_lock
+
+    def next_id(self):
+        """Reserve and return a new id. Ids are never reused after a delete."""
+        with self._write_lock:
+            record_id = self._next_id
+            self._next_id += 1
+        return record_id
+
+    def add(self, record):
+        """Insert a record, assigning it the next id if it has none."""
+        with self._write_lock:
+            with self._lock.write:
+                self._insert(record)
+            self._notify('add', None, record)
+        return record
+
+    def _insert(self, record):
+        if record.get('id') is None:
+            record['id'] = self._next_id
+        if record['id'] in self._records:
+            raise KeyError(f"{self.name} record {record['id']} already exists")
+        self._next_id = max(self._next_id, record['id'] + 1)
+        self._records[record['id']] = record
+        if not self._ids or record['id'] > self._ids[-1]:
+            self._ids.append(record['id'])
+        else:
+            insort(self._ids, record['id'])
+        self._index_add(record)
+
+    def add_many(self, records):
+        """Insert several records. Returns them with ids assigned."""
+        inserted = []
+        with self._write_lock:
+            try:
+                with self._lock.write:
+                    for record in records:
+                        self._insert(record)
+                        inserted.append(record)
+            finally:
+                # Listeners hear about every record that went in, even if a later one failed
+                for record in inserted:
+                    self._notify('add', None, record)
+        return records
+
+    def update(self, record_id, changes):
+        """Apply ``changes`` to a record and re-index it. Returns the record."""
+        changes = {k: v for k, v in changes.items() if k != 'id'}
+        with self._write_lock:
+            with self._lock.write:
+                record = self._records.get(record_id)
+                if record is None:
+                    return None
+                old = dict(record) if self._listeners else None
+                self._index_remove(record)
+                record.update(changes)
+                self._index_add(record)
+            self._notify('update', old, record)
+        return record
+
+    def delete(self, record_id):
+        """Remove a record. Returns the removed record, or None."""
+        with self._write_lock:
+            with self._lock.write:
+                record = self._records.pop(record_id, None)
+                if record is not None:
+                    del self._ids[bisect_left(self._ids, record_id)]
+                    self._index_remove(record)
+            if record is not None:
+                self._notify('delete', record, None)
+        return record
+
+    # Snapshots (see record_log.py)
+
+    def dump(self):
+        """Return (state, blocks) holding every record: JSON-serializable state and a list of bytes.
+
+        Call it inside ``locked()`` so no write lands halfway through.
+        """
+        with self._lock.read:
+            records = list(self._records.values())
+            state = {'next_id': self._next_id}
+        return state, [json.dumps(records).encode()]
+
+    def load(self, state, blocks):
+        """Fill an empty collection from dump() output without notifying listeners.
+
+        ``blocks`` may be memoryviews into a mapped file.
+        """
+        records = json.loads(bytes(blocks[0]))
+        with self._write_lock:
+            with self._lock.write:
+                if self._records:
+                    raise ValueError(f"{self.name} must be empty to load a snapshot")
+                for record in records:
+                    self._insert(record)
+                self._next_id = max(self._next_id, state['next_id'])
+
+
+def attendance_month(record):
+    return (record.get('date') or '')[:7]
+
+
+# Index layout shared by every storage backend.  Collections without
+# ``log_changes`` have no listeners and are not replayed to other processes.
+COLLECTIONS = {
+    'users': {
+        'indexes': {
+            'email': 'email',
+            'employee_code': 'employee_id',
+            'status': 'status',
+            'department': 'department',
+        },
+    },
+    'attendance': {
+        'indexes': {
+            'employee_id': 'employee_id',
+            'employee_date': ('employee_id', 'date'),
+            'date': 'date',
+            'month': 'month',
+            'month_employee': ('month', 'employee_id'),
+            'status': 'status',
+        },
+        'derived': {'month': attendance_month},
+        'ranges': ('employee_date', 'date'),
+    },
+    'payroll': {
+        'indexes': {
+            'employee_id': 'employee_id',
+            'month': 'month',
+            'month_employee': ('month', 'employee_id'),
+            'status': 'status',
+        },
+        'ranges': ('month',),
+    },
+    'leave_requests': {
+        'indexes': {
+            'employee_id': 'employee_id',
+            'status': 'status',
+        },
+    },
+    'payroll_runs': {
+        'indexes': {
+            'month': 'month',
+            'status': 'status',
+        },
+        'log_changes': False,
+    },
+    'jobs': {
+        'indexes': {
+            'type': 'type',
+            'status': 'status',
+        },
+        'log_changes': False,
+    },
+    'punches': {
+        'indexes': {
+            'employee_date': ('employee_id', 'date'),
+        },
+        'log_changes': False,
+    },
+    'punch_batches': {'log_changes': False},
+}
+
+
+class Store:
+    """All collections used by the application.
+
+    ``collection_factory`` builds one collection per entry in COLLECTIONS and
+    is what makes the storage backend pluggable; ``factories`` overrides it
+    for single collections by name.  ``database`` is the backend shared with
+    other processes, if any.
+    """
+
+    def __init__(self, collection_factory=Collection, database=None, factories=None):
+        self.database = database
+        factories = factories or {}
+
+        def build(name):
+            return factories.get(name, collection_factory)(name, **COLLECTIONS[name])
+
+        self.users = build('users')
+        self.attendance = build('attendance')
+        self.payroll = build('payroll')
+        self.leave_requests = build('leave_requests')
+        self.payroll_runs = build('payroll_runs')
+        self.jobs = build('jobs')
+        self.punches = build('punches')
+        self.punch_batches = build('punch_batches')
+
+    def sync(self):
+        """Replay writes made by other processes to the listeners. Returns how many."""
+        return self.database.sync() if self.database is not None else 0
+
+    def on_resync(self, hook):
+        """Register ``hook()`` to rebuild derived state when replaying is not possible."""
+        if self.database is not None:
+            self.database.on_resync(hook)
+
+    def rebuilding(self):
+        """Context for recomputing listener state from the data.
+
+        Writes of other processes are replayed up to the data the block
+        reads and not again afterwards; see ``SQLiteDatabase.rebuilding``.
+        """
+        return self.database.rebuilding() if self.database is not None else nullcontext()
+
+
+def create_store(backend='memory', database_path=None, shared=False, columnar=False):
+    """Build a Store on the named backend ('memory' or 'sqlite').
+
+    ``shared`` prepares the store to be used by several processes at once.
+    ``columnar`` keeps attendance in compact typed arrays (see columnar.py)
+    on the memory backend.
+    """
+    if backend == 'memory':
+        if shared:
+            raise ValueError("The memory backend cannot be shared between processes")
+        if columnar:
+            from columnar import attendance_columns
+            return Store(factories={'attendance': attendance_columns})
+        return Store()
+    if backend == 'sqlite':
+        from sqlite_store import SQLiteDatabase
+        database = SQLiteDatabase(database_path or 'hr_data.db', change_log=shared)
+        return Store(database.collection, database)
+    raise ValueError(f"Unknown storage backend: {backend}")
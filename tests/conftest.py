@@ -0,0 +1,67 @@
+"""
+Shared fixtures.
+
+``store`` is a fresh Store on each backend: the dict memory backend, the
+memory backend with columnar attendance, and SQLite in a temporary file.
+``hr`` loads app.py once per storage backend, each copy with its own
+temporary database and generated folder, and ``admin`` is a test client
+logged in as the seeded admin.
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+from unittest import mock
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from store import create_store  # noqa: E402
+
+BACKENDS = ('memory', 'columnar', 'sqlite')
+DEVICE_TOKEN = 'test-device-token'
+
+
+def make_store(backend, directory):
+    if backend == 'sqlite':
+        return create_store('sqlite', os.path.join(directory, 'hr_data.db'))
+    return create_store('memory', columnar=backend == 'columnar')
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    return make_store(request.param, str(tmp_path))
+
+
+@pytest.fixture(scope='session', params=('memory', 'sqlite'))
+def hr(request):
+    """app.py imported as its own module for one storage backend."""
+    directory = tempfile.mkdtemp(prefix=f"hr-test-{request.param}-")
+    env = {
+        'HR_STORAGE_BACKEND': request.param,
+        'HR_DATABASE_PATH': os.path.join(directory, 'hr_data.db'),
+        'HR_GENERATED_FOLDER': os.path.join(directory, 'generated'),
+        'HR_PUNCH_DEVICE_TOKEN': DEVICE_TOKEN,
+        'HR_PAYROLL_WORKERS': '1',
+        'HR_LAZY_STARTUP': '0',
+        'HR_SHARED_STATE': '0',
+    }
+    name = f"app_{request.param}"
+    with mock.patch.dict(os.environ, env):
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, 'app.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    module.app.config['TESTING'] = True
+    return module
+
+
+@pytest.fixture
+def admin(hr):
+    client = hr.app.test_client()
+    response = client.post('/api/login', json={'username': 'admin', 'password': 'admin123', 'user_type': 'admin'})
+    assert response.status_code == 200
+    return client
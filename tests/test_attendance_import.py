@@ -0,0 +1,46 @@
+"""Bulk attendance import (attendance_import.py)."""
+
+import pytest
+
+from attendance_import import AttendanceImporter, read_csv, read_ndjson
+
+
+@pytest.fixture
+def employees(store):
+    return store.users.add_many([{'employee_id': 'EMP001', 'name': 'One'}, {'employee_id': 'EMP002', 'name': 'Two'}])
+
+
+def test_csv_rows_are_upserted_by_employee_and_date(store, employees):
+    store.attendance.add({'employee_id': employees[0]['id'], 'date': '2024-01-02', 'status': 'Absent'})
+    lines = ['employee_id,date,status,hours_worked\n',
+             'EMP001,2024-01-02,Present,7.5\n',
+             f"{employees[1]['id']},2024-01-02,Late,8\n",
+             'EMP002,2024-01-03,,\n']
+    result = AttendanceImporter(store).run(read_csv(lines))
+    assert (result['rows'], result['created'], result['updated'], result['failed']) == (3, 2, 1, 0)
+    first = store.attendance.find_one('employee_date', (employees[0]['id'], '2024-01-02'))
+    assert first['status'] == 'Present' and first['hours_worked'] == 7.5
+    defaulted = store.attendance.find_one('employee_date', (employees[1]['id'], '2024-01-03'))
+    assert defaulted['status'] == 'Present' and defaulted['hours_worked'] == 8
+
+
+def test_malformed_rows_are_reported_without_stopping_the_import(store, employees):
+    lines = ['{"employee_id": "EMP001", "date": "2024-01-02", "status": "Present"}\n',
+             '{"employee_id": ["EMP001"], "date": "2024-01-03"}\n',
+             '{"employee_id": {"code": "EMP001"}, "date": "2024-01-04"}\n',
+             '{"employee_id": true, "date": "2024-01-05"}\n',
+             'not json\n',
+             '[1, 2]\n',
+             '\n',
+             '{"employee_id": "EMP404", "date": "2024-01-06"}\n',
+             '{"employee_id": "EMP002", "date": "2024-01-07", "hours_worked": 30}\n',
+             '{"employee_id": "EMP002", "date": "2024-01-08", "status": "Asleep"}\n',
+             '{"employee_id": "EMP002", "date": "2024-01-09", "check_in": "9am"}\n',
+             '{"employee_id": "EMP002", "date": "2024-01-10"}\n']
+    result = AttendanceImporter(store, batch_size=2).run(read_ndjson(lines))
+    assert result['created'] == 2 and result['failed'] == 9
+    errors = {e['line']: e['error'] for e in result['errors']}
+    assert errors[2] == errors[3] == errors[4] == "employee_id must be an employee id or code"
+    assert sorted(errors) == [2, 3, 4, 5, 6, 8, 9, 10, 11]
+    assert errors[8] == 'Unknown employee EMP404'
+    assert len(store.attendance) == 2
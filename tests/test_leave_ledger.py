@@ -0,0 +1,92 @@
+"""Approved leave totals and balances (leave_ledger.py)."""
+
+import threading
+
+import pytest
+
+from leave_ledger import DEFAULT_LEAVE_LIMITS, LeaveLedger, leave_days
+
+
+def leave(employee_id, start_date, end_date, leave_type='Vacation', status='Approved'):
+    return {'employee_id': employee_id, 'type': leave_type, 'start_date': start_date,
+            'end_date': end_date, 'status': status, 'reason': 'test'}
+
+
+@pytest.fixture
+def employees(store):
+    return store.users.add_many([
+        {'employee_id': 'EMP001', 'name': 'Sales', 'department': 'Sales'},
+        {'employee_id': 'EMP002', 'name': 'Engineer', 'department': 'Engineering'},
+    ])
+
+
+def test_leave_days_counts_both_ends_in_the_starting_year():
+    assert leave_days(leave(1, '2024-03-04', '2024-03-04')) == (2024, 1)
+    assert leave_days(leave(1, '2024-12-30', '2025-01-02')) == (2024, 4)
+
+
+def test_only_approved_requests_are_counted(store, employees):
+    store.leave_requests.add_many([
+        leave(1, '2024-03-04', '2024-03-06'),
+        leave(1, '2024-04-01', '2024-04-01', 'Sick'),
+        leave(1, '2024-05-01', '2024-05-10', status='Pending'),
+        leave(1, '2024-06-01', '2024-06-10', status='Rejected'),
+        leave(1, '2023-03-01', '2023-03-02'),
+        leave(2, '2024-03-01', '2024-03-02'),
+    ])
+    ledger = LeaveLedger(store)
+    assert ledger.used(1, 2024) == {'Vacation': 3, 'Sick': 1}
+    assert ledger.used(1, 2023) == {'Vacation': 2}
+    assert ledger.used(3, 2024) == {}
+
+
+def test_status_changes_edits_and_deletes_update_the_totals(store, employees):
+    ledger = LeaveLedger(store)
+    request = store.leave_requests.add(leave(1, '2024-03-04', '2024-03-06', status='Pending'))
+    assert ledger.used(1, 2024) == {}
+    store.leave_requests.update(request['id'], {'status': 'Approved'})
+    assert ledger.used(1, 2024) == {'Vacation': 3}
+    store.leave_requests.update(request['id'], {'end_date': '2024-03-04', 'type': 'Sick'})
+    assert ledger.used(1, 2024) == {'Vacation': 0, 'Sick': 1}
+    store.leave_requests.delete(request['id'])
+    assert ledger.used(1, 2024) == {'Vacation': 0, 'Sick': 0}
+
+
+def test_balance_applies_department_limits(store, employees):
+    store.leave_requests.add(leave(2, '2024-07-01', '2024-07-17'))
+    store.leave_requests.add(leave(1, '2024-07-01', '2024-07-17'))
+    ledger = LeaveLedger(store, {'Sick': 7, 'departments': {'Engineering': {'Vacation': 20}}})
+
+    engineer = ledger.balance(2, 2024)
+    assert engineer['leave_limits'] == dict(DEFAULT_LEAVE_LIMITS, Sick=7, Vacation=20)
+    assert engineer['used_leaves']['Vacation'] == 17
+    assert engineer['remaining_leaves'] == {'Sick': 7, 'Emergency': 3, 'Vacation': 3}
+
+    sales = ledger.balance(1, 2024)
+    assert sales['leave_limits']['Vacation'] == 15
+    assert sales['remaining_leaves']['Vacation'] == 0  # never negative
+
+
+def test_a_lazy_ledger_is_built_by_the_first_read(store, employees):
+    ledger = LeaveLedger(store, build=False)
+    store.leave_requests.add(leave(1, '2024-03-04', '2024-03-05'))
+    assert ledger.used(1, 2024) == {'Vacation': 2}
+    store.leave_requests.add(leave(1, '2024-04-01', '2024-04-01'))
+    assert ledger.used(1, 2024) == {'Vacation': 3}
+
+
+def test_rebuild_during_writes_counts_each_request_once(store, employees):
+    ledger = LeaveLedger(store)
+    done = threading.Event()
+
+    def approve():
+        for day in range(1, 29):
+            store.leave_requests.add(leave(1, f"2024-02-{day:02d}", f"2024-02-{day:02d}"))
+        done.set()
+
+    writer = threading.Thread(target=approve)
+    writer.start()
+    while not done.is_set():
+        ledger.rebuild()
+    writer.join()
+    assert ledger.used(1, 2024) == {'Vacation': 28}
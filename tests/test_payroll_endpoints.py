@@ -0,0 +1,78 @@
+"""Payroll entry, generation, summary and report endpoints (app.py), on each storage backend."""
+
+import time
+
+from models import payroll_deductions, payroll_gross
+
+
+def finished_job(hr, job_id, timeout=30):
+    """Wait for the app's job workers to finish a job."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = hr.store.jobs.get(job_id)
+        if job['status'] not in ('Queued', 'Running'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def month_report(admin, month):
+    response = admin.get('/api/reports/payroll')
+    assert response.status_code == 200
+    return next(row for row in response.get_json() if row['month'] == month)
+
+
+def test_payroll_endpoints_require_the_admin(hr):
+    client = hr.app.test_client()
+    assert client.get('/api/admin/payroll/summary?month=2031-01').status_code == 401
+    assert client.get('/api/reports/payroll').status_code == 401
+    assert client.post('/api/payroll', json={'employee_id': 1, 'month': '2031-01'}).status_code == 401
+
+
+def test_payroll_without_tax_or_deductions_is_summed_as_zero(hr, admin):
+    response = admin.post('/api/payroll', json={'employee_id': 1, 'month': '2031-01', 'basic_salary': 30000,
+                                                'hra': 10000, 'tax': None, 'net_salary': 40000})
+    assert response.status_code == 201
+    assert response.get_json()['tax'] == 0 and response.get_json()['deductions'] == 0
+    admin.post('/api/payroll', json={'employee_id': 2, 'month': '2031-01', 'basic_salary': 20000,
+                                     'deductions': 1000, 'tax': 500, 'net_salary': 18500})
+
+    response = admin.get('/api/admin/payroll/summary?month=2031-01')
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['total_employees'] == 2
+    assert summary['total_gross_salary'] == 60000
+    assert summary['total_deductions'] == 1500
+    assert summary['total_net_salary'] == 58500
+    assert summary['pending_count'] == 2 and summary['average_salary'] == 29250
+
+    report = month_report(admin, '2031-01')
+    assert (report['total_employees'], report['total_gross'], report['total_deductions'], report['total_net']) == \
+        (2, 60000, 1500, 58500)
+
+
+def test_records_missing_amounts_in_the_store_do_not_break_the_totals(hr, admin):
+    # Records written before the amounts were defaulted can lack them entirely
+    hr.store.payroll.add({'employee_id': 3, 'month': '2031-02', 'basic_salary': 1000, 'net_salary': 1000,
+                          'tax': None})
+    assert admin.get('/api/admin/payroll/summary?month=2031-02').get_json()['total_gross_salary'] == 1000
+    assert month_report(admin, '2031-02')['total_deductions'] == 0
+
+
+def test_generated_payroll_shows_up_in_the_summary_and_report(hr, admin):
+    response = admin.post('/api/admin/generate-payroll', json={'month': '2031-03'})
+    assert response.status_code == 202
+    run = response.get_json()
+    assert finished_job(hr, run['job_id'])['status'] == 'Completed'
+    assert admin.get(run['status_url']).get_json()['status'] == 'Completed'
+    assert admin.post('/api/admin/generate-payroll', json={'month': '2031-03'}).status_code == 400
+
+    records = hr.store.payroll.find('month', '2031-03')
+    employees = [u for u in hr.store.users if u.get('status') == 'Active' and u.get('salary')]
+    assert sorted(p['employee_id'] for p in records) == sorted(u['id'] for u in employees)
+
+    summary = admin.get('/api/admin/payroll/summary?month=2031-03').get_json()
+    assert summary['total_employees'] == len(records)
+    assert summary['total_gross_salary'] == sum(payroll_gross(p) for p in records)
+    assert summary['total_deductions'] == sum(payroll_deductions(p) for p in records)
+    assert month_report(admin, '2031-03')['total_net'] == sum(p['net_salary'] for p in records)
@@ -0,0 +1,99 @@
+"""Chunked payroll runs and resuming them (payroll_runs.py)."""
+
+import pytest
+
+import payroll_runs
+from jobs import JobQueue
+from payroll_runs import PayrollRunner, plan_chunks
+
+MONTH = '2024-01'
+
+
+@pytest.fixture
+def runner(store):
+    store.users.add_many([{'employee_id': f"EMP{n:03d}", 'name': f"Employee {n}", 'status': 'Active',
+                           'salary': 40000 + n * 1000} for n in range(1, 8)])
+    store.users.add({'employee_id': 'EMP099', 'name': 'Former', 'status': 'Inactive', 'salary': 50000})
+    store.users.add({'employee_id': 'EMP098', 'name': 'Unpaid', 'status': 'Active', 'salary': 0})
+    store.attendance.add_many([{'employee_id': employee_id, 'date': f"{MONTH}-{day:02d}",
+                                'status': 'Late' if day == 1 else 'Present', 'hours_worked': 8}
+                               for employee_id in (1, 2, 3) for day in range(1, 11)])
+    # Workers are not started: each test runs the queued job itself
+    return PayrollRunner(store, JobQueue(store), max_workers=1, chunk_size=3)
+
+
+def paid_employees(store):
+    return sorted(p['employee_id'] for p in store.payroll.find('month', MONTH))
+
+
+def test_plan_chunks_splits_sorted_ids():
+    employees = [{'id': i} for i in (9, 1, 4, 2, 7)]
+    assert plan_chunks(employees, 2) == [[1, 2], [4, 7], [9, 9]]
+    assert plan_chunks([], 2) == []
+
+
+def test_run_generates_one_record_per_payable_employee(store, runner):
+    run = runner.start(MONTH, '2024-02-01', created_by='admin')
+    assert run['status'] == 'Queued'
+    assert run['total_chunks'] == 3 and run['employee_count'] == 7
+
+    job = runner.jobs.run(run['job_id'])
+    assert job['status'] == 'Completed'
+    assert job['result']['generated_count'] == 7
+
+    run = store.payroll_runs.get(run['id'])
+    assert run['status'] == 'Completed'
+    assert sorted(run['completed_chunks']) == [0, 1, 2]
+    assert paid_employees(store) == list(range(1, 8))
+    first = store.payroll.find_one('employee_id', 1)
+    assert first['present_days'] == 10
+    assert first['net_salary'] == first['basic_salary'] + first['hra'] + first['allowances'] + \
+        first['overtime'] + first['bonus'] - first['deductions'] - first['tax']
+    assert store.payroll.find_one('employee_id', 4)['present_days'] == 0
+
+
+def test_failed_run_resumes_from_its_checkpoint_without_paying_twice(store, runner, monkeypatch):
+    compute_chunk = payroll_runs.compute_chunk
+    calls = []
+
+    def fail_second_chunk(employees, *args):
+        calls.append([e['id'] for e in employees])
+        if len(calls) == 2:
+            raise RuntimeError('worker died')
+        return compute_chunk(employees, *args)
+
+    monkeypatch.setattr(payroll_runs, 'compute_chunk', fail_second_chunk)
+    run = runner.start(MONTH, '2024-02-01')
+    assert runner.jobs.run(run['job_id'])['status'] == 'Failed'
+    run = store.payroll_runs.get(run['id'])
+    assert run['status'] == 'Failed' and run['error'] == 'worker died'
+    assert run['completed_chunks'] == [0]
+    assert paid_employees(store) == [1, 2, 3]
+
+    monkeypatch.setattr(payroll_runs, 'compute_chunk', compute_chunk)
+    failed_job_id = run['job_id']
+    resumed = runner.resume(run['id'])
+    assert resumed['status'] == 'Queued' and resumed['job_id'] != failed_job_id
+    assert runner.jobs.run(resumed['job_id'])['status'] == 'Completed'
+    run = store.payroll_runs.get(run['id'])
+    assert run['status'] == 'Completed'
+    assert run['generated_count'] == 7
+    assert paid_employees(store) == list(range(1, 8))
+
+
+def test_resume_leaves_completed_and_active_runs_alone(store, runner):
+    run = runner.start(MONTH, '2024-02-01')
+    assert runner.resume(run['id'])['job_id'] == run['job_id']  # still queued
+    runner.jobs.run(run['job_id'])
+    assert runner.resume(run['id'])['status'] == 'Completed'
+    assert len(store.jobs) == 1
+    assert runner.resume(12345) is None
+
+
+def test_runs_interrupted_with_their_process_become_resumable(store, runner):
+    run = runner.start(MONTH, '2024-02-01')
+    store.jobs.update(run['job_id'], {'status': 'Failed'})
+    runner.recover_interrupted()
+    run = store.payroll_runs.get(run['id'])
+    assert run['status'] == 'Failed' and run['error'] == 'Interrupted before completion'
+    assert runner.find_run(MONTH)['id'] == run['id']
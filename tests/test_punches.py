@@ -0,0 +1,142 @@
+"""Time-clock punch ingestion and consolidation (punches.py)."""
+
+import pytest
+
+from attendance_import import find_employee
+from conftest import DEVICE_TOKEN
+from punches import Backpressure, PunchPipeline, parse_punches
+
+
+@pytest.fixture
+def employees(store):
+    return store.users.add_many([{'employee_id': 'EMP001', 'name': 'One'}, {'employee_id': 'EMP002', 'name': 'Two'}])
+
+
+def resolver(store):
+    def resolve(value):
+        employee = find_employee(store, value)
+        return employee['id'] if employee else None
+    return resolve
+
+
+def punches(store, *events):
+    records, errors = parse_punches([{'employee_id': employee, 'timestamp': timestamp}
+                                     for employee, timestamp in events], resolver(store))
+    assert errors == []
+    return records
+
+
+def test_parse_punches_accepts_every_payload_shape_and_reports_bad_punches(store, employees):
+    resolve = resolver(store)
+    one = {'employee_id': 'EMP001', 'timestamp': '2024-01-02T09:01', 'direction': 'in', 'device_id': 'door-1'}
+    records, errors = parse_punches(one, resolve)
+    assert errors == []
+    assert records[0]['employee_id'] == employees[0]['id']
+    assert records[0]['date'] == '2024-01-02' and records[0]['timestamp'] == '2024-01-02T09:01:00'
+    assert len(parse_punches({'punches': [one, one]}, resolve)[0]) == 2
+
+    records, errors = parse_punches([one, 'x', dict(one, employee_id='EMP404'), dict(one, timestamp='noon'),
+                                     dict(one, direction='sideways')], resolve)
+    assert len(records) == 1
+    assert [e['index'] for e in errors] == [1, 2, 3, 4]
+    assert errors[1]['error'] == 'Unknown employee EMP404'
+
+
+def test_consolidate_day_derives_status_hours_and_overtime(store):
+    pipeline = PunchPipeline(store, shift_start='09:00', grace_minutes=15, standard_hours=8)
+
+    def day(*times):
+        return pipeline.consolidate_day([{'timestamp': f"2024-01-02T{t}"} for t in times])
+
+    present = day('17:30', '09:10', '12:00')
+    assert present == {'status': 'Present', 'check_in': '09:10', 'check_out': '17:30', 'hours_worked': 8.33,
+                       'overtime_hours': 0.33, 'punch_count': 3}
+    assert day('09:16', '18:00')['status'] == 'Late'
+    assert day('09:00', '12:00')['status'] == 'Half Day'
+    assert day('09:00')['check_out'] is None
+
+
+def test_flush_turns_pending_punches_into_attendance(store, employees):
+    pipeline = PunchPipeline(store)
+    assert pipeline.submit(punches(store, ('EMP001', '2024-01-02T08:55'), ('EMP002', '2024-01-02T09:30'))) == 2
+    assert pipeline.submit(punches(store, ('EMP001', '2024-01-02T17:05'))) == 3
+
+    batch = pipeline.flush()
+    assert batch['punches'] == 3 and batch['days'] == 2
+    assert batch['last_punch_id'] == store.punches.last()['id']
+    assert pipeline.pending == 0 and pipeline.flush() is None
+
+    first = store.attendance.find_one('employee_date', (employees[0]['id'], '2024-01-02'))
+    assert first['status'] == 'Present' and first['check_out'] == '17:05'
+    assert first['created_by'] == 'Time Clock'
+    assert store.attendance.find_one('employee_date', (employees[1]['id'], '2024-01-02'))['status'] == 'Late'
+
+    # A later punch recomputes the whole day in place
+    pipeline.submit(punches(store, ('EMP002', '2024-01-02T18:00')))
+    pipeline.flush()
+    second = store.attendance.find('employee_date', (employees[1]['id'], '2024-01-02'))
+    assert len(second) == 1 and second[0]['check_out'] == '18:00'
+
+
+def test_attendance_entered_by_hr_is_kept(store, employees):
+    store.attendance.add({'employee_id': employees[0]['id'], 'date': '2024-01-02', 'status': 'Absent',
+                          'created_by': 'admin'})
+    pipeline = PunchPipeline(store)
+    pipeline.submit(punches(store, ('EMP001', '2024-01-02T09:00'), ('EMP001', '2024-01-02T17:00')))
+    batch = pipeline.flush()
+    assert batch['days'] == 0 and batch['skipped_days'] == 1
+    assert store.attendance.find_one('employee_date', (employees[0]['id'], '2024-01-02'))['status'] == 'Absent'
+
+
+def test_submit_refuses_punches_beyond_the_backlog_limit(store, employees):
+    pipeline = PunchPipeline(store, max_pending=2, flush_interval=2)
+    pipeline.submit(punches(store, ('EMP001', '2024-01-02T09:00')))
+    with pytest.raises(Backpressure) as refused:
+        pipeline.submit(punches(store, ('EMP001', '2024-01-02T12:00'), ('EMP001', '2024-01-02T17:00')))
+    assert refused.value.retry_after == 2
+    assert pipeline.stats['rejected'] == 2 and len(store.punches) == 1
+    pipeline.flush()
+    assert pipeline.submit(punches(store, ('EMP001', '2024-01-02T12:00'), ('EMP001', '2024-01-02T17:00'))) == 2
+
+
+def test_recover_picks_up_punches_logged_after_the_last_batch(store, employees):
+    pipeline = PunchPipeline(store)
+    pipeline.submit(punches(store, ('EMP001', '2024-01-02T09:00')))
+    pipeline.flush()
+    pipeline.submit(punches(store, ('EMP001', '2024-01-02T17:00'), ('EMP002', '2024-01-03T09:00')))
+
+    restarted = PunchPipeline(store)
+    restarted.recover()
+    assert restarted.pending == 2
+    batch = restarted.flush()
+    assert batch['punches'] == 2 and batch['days'] == 2
+    assert store.attendance.find_one('employee_date', (employees[0]['id'], '2024-01-02'))['check_out'] == '17:00'
+
+
+def test_shared_pipeline_reads_its_work_from_the_log(store, employees):
+    writers = [PunchPipeline(store, shared=True) for _ in range(2)]
+    writers[0].submit(punches(store, ('EMP001', '2024-01-02T09:00')))
+    writers[1].submit(punches(store, ('EMP002', '2024-01-02T09:00')))
+    assert writers[0].pending == 2
+    batch = writers[1].flush()
+    assert batch['days'] == 2
+    assert writers[0].pending == 0 and writers[0].flush() is None
+
+
+def test_punch_endpoint_takes_device_punches(hr, admin):
+    client = hr.app.test_client()
+    payload = {'punches': [{'employee_id': 'EMP001', 'timestamp': '2031-03-04T09:00'},
+                           {'employee_id': 'EMP001', 'timestamp': '2031-03-04T17:30'},
+                           {'employee_id': 'NOBODY', 'timestamp': '2031-03-04T09:00'}]}
+    assert client.post('/api/punches', json=payload).status_code == 401
+
+    response = client.post('/api/punches', json=payload, headers={'X-Device-Token': DEVICE_TOKEN})
+    assert response.status_code == 202
+    assert response.get_json()['accepted'] == 2
+    assert response.get_json()['errors'] == [{'index': 2, 'error': 'Unknown employee NOBODY'}]
+
+    # The app's consolidator may take the batch first; either way the day is written once flush returns
+    assert admin.post('/api/admin/punches/flush').status_code == 200
+    employee = hr.store.users.find_one('employee_code', 'EMP001')
+    attendance = hr.store.attendance.find_one('employee_date', (employee['id'], '2031-03-04'))
+    assert attendance['status'] == 'Present' and attendance['hours_worked'] == 8.5
@@ -0,0 +1,139 @@
+"""Restoring and replaying the record log (record_log.py)."""
+
+import os
+import time
+
+import pytest
+
+from record_log import RecordLog, SegmentRemoved
+from store import create_store
+
+
+def writer(directory, columnar=False, **options):
+    store = create_store('memory', columnar=columnar)
+    log = RecordLog(store, str(directory), **options)
+    log.restore()
+    log.open()
+    return store, log
+
+
+def restored(directory, columnar=False, **options):
+    store = create_store('memory', columnar=columnar)
+    log = RecordLog(store, str(directory), **options)
+    return store, log, log.restore()
+
+
+def write_month(store, employees=3, days=10):
+    store.attendance.add_many([{'employee_id': employee_id, 'date': f"2024-01-{day:02d}", 'status': 'Present',
+                                'hours_worked': 8, 'remarks': f"day {day}"}
+                               for employee_id in range(1, employees + 1) for day in range(1, days + 1)])
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_restart_replays_every_write_without_a_snapshot(tmp_path, columnar):
+    store, _ = writer(tmp_path, columnar)
+    write_month(store)
+    store.attendance.update(2, {'status': 'Absent'})
+    store.attendance.delete(3)
+    store.users.add({'employee_id': 'EMP100', 'name': 'Test User'})
+
+    copy, _, replayed = restored(tmp_path, columnar)
+    assert replayed == 30 + 3
+    assert copy.attendance.all() == store.attendance.all()
+    assert copy.users.all() == store.users.all()
+    assert copy.attendance.count('status', 'Absent') == 1
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_restart_loads_the_snapshot_and_replays_only_what_follows(tmp_path, columnar):
+    store, log = writer(tmp_path, columnar)
+    write_month(store)
+    log.snapshot()
+    store.attendance.update(1, {'status': 'Late'})
+    store.attendance.add({'employee_id': 9, 'date': '2024-02-01', 'status': 'Present'})
+
+    copy, _, replayed = restored(tmp_path, columnar)
+    assert replayed == 2
+    assert copy.attendance.all() == store.attendance.all()
+    assert copy.attendance.find_one('employee_date', (9, '2024-02-01')) is not None
+    # New ids carry on after the restored ones
+    assert copy.attendance.next_id() == store.attendance.next_id()
+
+
+def test_snapshot_removes_segments_no_longer_needed(tmp_path):
+    store, log = writer(tmp_path, names=('attendance',))
+    for _ in range(4):
+        write_month(store, employees=1, days=2)
+        log.snapshot()
+    names = sorted(os.listdir(tmp_path))
+    assert names == ['attendance.00000003.log', 'attendance.00000003.snapshot',
+                     'attendance.00000004.log', 'attendance.00000004.snapshot']
+    copy, _, replayed = restored(tmp_path, names=('attendance',))
+    assert replayed == 0
+    assert len(copy.attendance) == 8
+
+
+def test_a_half_written_frame_is_ignored_and_overwritten(tmp_path):
+    store, log = writer(tmp_path, names=('attendance',))
+    write_month(store, employees=1, days=3)
+    log.logs[0]._file.close()
+    path = tmp_path / 'attendance.00000000.log'
+    with open(path, 'ab') as f:
+        f.write(b'\x40\x00\x00\x00torn')
+
+    copy, copy_log, replayed = restored(tmp_path, names=('attendance',))
+    assert replayed == 3
+    copy_log.open()
+    copy.attendance.add({'employee_id': 2, 'date': '2024-01-01', 'status': 'Present'})
+
+    again, _, replayed = restored(tmp_path, names=('attendance',))
+    assert replayed == 4
+    assert again.attendance.all() == copy.attendance.all()
+
+
+@pytest.mark.parametrize('fsync', ['always', 'batch', 'never'])
+def test_every_fsync_policy_logs_every_write(tmp_path, fsync):
+    store, log = writer(tmp_path, fsync=fsync)
+    write_month(store, employees=1, days=5)
+    for collection_log in log.logs:
+        collection_log.sync()
+    copy, _, _ = restored(tmp_path)
+    assert copy.attendance.all() == store.attendance.all()
+
+
+def test_unknown_fsync_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        RecordLog(create_store('memory'), str(tmp_path), fsync='sometimes')
+
+
+def test_replica_applies_the_writers_frames_across_segments(tmp_path):
+    store, log = writer(tmp_path, names=('attendance',))
+    write_month(store, employees=1, days=2)
+    replica, replica_log, _ = restored(tmp_path, replica=True, names=('attendance',))
+    seen = []
+    replica.attendance.subscribe(lambda action, old, new: seen.append(action))
+
+    store.attendance.update(1, {'status': 'Absent'})
+    log.snapshot()
+    store.attendance.delete(2)
+    assert replica_log.logs[0].poll() == 2
+    assert seen == ['update', 'delete']
+    assert replica.attendance.all() == store.attendance.all()
+    with pytest.raises(RuntimeError):
+        replica_log.open()
+
+
+def test_replica_stops_following_when_its_segment_was_removed(tmp_path):
+    store, log = writer(tmp_path, names=('attendance',))
+    replica, replica_log, _ = restored(tmp_path, replica=True, names=('attendance',))
+    for _ in range(3):
+        store.attendance.add({'employee_id': 1, 'date': '2024-01-01', 'status': 'Present'})
+        log.snapshot()
+    with pytest.raises(SegmentRemoved):
+        replica_log.logs[0].poll()
+
+    replica_log.start(interval=0.01)
+    deadline = time.monotonic() + 5
+    while not replica_log.stopped and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert replica_log.stopped == ['attendance']
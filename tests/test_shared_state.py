@@ -0,0 +1,133 @@
+"""Derived state of workers sharing one SQLite file (sqlite_store.py sync and rebuilding)."""
+
+import os
+import threading
+
+import pytest
+
+import sqlite_store
+from dashboard import DashboardCounters
+from leave_ledger import LeaveLedger
+from rollups import AttendanceRollups
+from store import create_store
+
+
+@pytest.fixture
+def workers(tmp_path):
+    path = os.path.join(str(tmp_path), 'hr_data.db')
+    return create_store('sqlite', path, shared=True), create_store('sqlite', path, shared=True)
+
+
+def employee(n):
+    return {'employee_id': f"EMP{n:03d}", 'name': f"Employee {n}", 'department': 'Sales',
+            'status': 'Active', 'salary': 50000}
+
+
+def derived(store, build=True):
+    return (DashboardCounters(store, build=build), AttendanceRollups(store, build=build),
+            LeaveLedger(store, build=build))
+
+
+def assert_consistent(store, counters, rollups, ledger):
+    assert counters.check() == {}
+    expected = LeaveLedger(store)
+    for leave in store.leave_requests:
+        assert ledger.used(leave['employee_id'], 2024) == expected.used(leave['employee_id'], 2024)
+    assert rollups.stats('company', None, 'all', None)['records'] == len(store.attendance)
+
+
+def write_some(store, n):
+    user = store.users.add(employee(n))
+    store.attendance.add({'employee_id': user['id'], 'date': '2024-01-02', 'status': 'Present',
+                          'hours_worked': 8})
+    store.leave_requests.add({'employee_id': user['id'], 'type': 'Sick', 'start_date': '2024-03-04',
+                              'end_date': '2024-03-05', 'status': 'Approved'})
+
+
+@pytest.mark.parametrize('build', [True, False])
+def test_state_built_after_another_workers_writes_is_not_counted_twice(workers, build):
+    a, b = workers
+    counters, rollups, ledger = derived(b, build=False)
+    write_some(a, 1)
+    if build:
+        counters.rebuild()
+        rollups.rebuild()
+        ledger.rebuild()
+    # A lazy build happens here, on the first read
+    assert counters.snapshot('2024-01-02')['total_employees'] == 1
+    b.sync()
+    assert counters.snapshot('2024-01-02')['total_employees'] == 1
+    assert counters.snapshot('2024-01-02')['present_today'] == 1
+    assert_consistent(b, counters, rollups, ledger)
+
+    write_some(a, 2)
+    assert b.sync() == 3
+    assert counters.snapshot('2024-01-02')['total_employees'] == 2
+    assert_consistent(b, counters, rollups, ledger)
+
+
+def test_eager_build_after_another_workers_writes(workers):
+    a, b = workers
+    write_some(a, 1)
+    counters, rollups, ledger = derived(b)
+    b.sync()
+    assert counters.snapshot('2024-01-02')['total_employees'] == 1
+    assert_consistent(b, counters, rollups, ledger)
+
+
+def test_rebuild_replays_pending_changes_to_other_listeners(workers):
+    a, b = workers
+    seen = []
+    b.payroll.subscribe(lambda action, old, new: seen.append(action))
+    counters = DashboardCounters(b)
+    a.payroll.add({'employee_id': 1, 'month': '2024-01', 'net_salary': 1})
+    a.users.add(employee(1))
+    counters.rebuild()
+    assert seen == ['add']
+    assert b.sync() == 0
+    assert counters.check() == {}
+
+
+def test_resync_rebuilds_once_and_skips_what_the_rebuild_read(workers, monkeypatch):
+    a, b = workers
+    counters, rollups, ledger = derived(b)
+    for hook in (counters.rebuild, rollups.rebuild, ledger.rebuild):
+        b.on_resync(hook)
+    monkeypatch.setattr(sqlite_store, 'CHANGE_LOG_PRUNE_EVERY', 1)
+    monkeypatch.setattr(sqlite_store, 'CHANGE_LOG_RETENTION', 1)
+    for n in range(1, 4):
+        write_some(a, n)
+    assert b.sync() == 0  # pruned: rebuilt instead of replayed
+    assert counters.snapshot('2024-01-02')['total_employees'] == 3
+    assert_consistent(b, counters, rollups, ledger)
+    write_some(a, 4)
+    assert counters.snapshot('2024-01-02')['total_employees'] == 3
+    b.sync()
+    assert counters.snapshot('2024-01-02')['total_employees'] == 4
+    assert_consistent(b, counters, rollups, ledger)
+
+
+def test_rebuilds_racing_replays_count_each_write_once(workers):
+    a, b = workers
+    counters, rollups, ledger = derived(b)
+    done = threading.Event()
+
+    def replay():
+        while not done.is_set():
+            b.sync()
+
+    follower = threading.Thread(target=replay)
+    follower.start()
+    try:
+        for n in range(1, 31):
+            write_some(a, n)
+            if n % 3 == 0:
+                counters.rebuild()
+                rollups.rebuild()
+                ledger.rebuild()
+    finally:
+        done.set()
+        follower.join()
+    b.sync()
+    assert counters.snapshot('2024-01-02')['total_employees'] == 30
+    assert_consistent(b, counters, rollups, ledger)
@@ -0,0 +1,176 @@
+"""The collection API every storage backend implements (store.py)."""
+
+import pytest
+
+from store import COLLECTIONS, Collection
+
+
+def attendance(employee_id, date, status='Present', **fields):
+    return dict({'employee_id': employee_id, 'date': date, 'status': status, 'hours_worked': 8}, **fields)
+
+
+def test_add_assigns_increasing_ids_and_get_returns_the_record(store):
+    first = store.attendance.add(attendance(1, '2024-01-01'))
+    second = store.attendance.add(attendance(1, '2024-01-02'))
+    assert second['id'] > first['id']
+    assert store.attendance.get(first['id']) == first
+    assert store.attendance.get(999999) is None
+    assert len(store.attendance) == 2
+    assert store.attendance.last() == second
+
+
+def test_ids_are_not_reused_after_a_delete(store):
+    records = store.attendance.add_many([attendance(1, f"2024-01-0{day}") for day in range(1, 4)])
+    store.attendance.delete(records[-1]['id'])
+    assert store.attendance.add(attendance(2, '2024-01-01'))['id'] > records[-1]['id']
+    assert store.attendance.next_id() > records[-1]['id'] + 1
+
+
+def test_find_and_count_use_single_and_composite_indexes(store):
+    store.attendance.add_many([
+        attendance(1, '2024-01-01'),
+        attendance(1, '2024-01-02', status='Absent'),
+        attendance(2, '2024-01-01'),
+        attendance(2, '2024-02-01'),
+    ])
+    assert [a['date'] for a in store.attendance.find('employee_id', 1)] == ['2024-01-01', '2024-01-02']
+    assert store.attendance.find_one('employee_date', (2, '2024-02-01'))['employee_id'] == 2
+    assert store.attendance.find_one('employee_date', (3, '2024-02-01')) is None
+    assert store.attendance.count('month', '2024-01') == 3
+    assert store.attendance.count('month_employee', ('2024-01', 2)) == 1
+    assert store.attendance.count('status', 'Absent') == 1
+    assert sorted(store.attendance.keys('month')) == ['2024-01', '2024-02']
+
+
+def test_update_reindexes_and_delete_removes_from_indexes(store):
+    record = store.attendance.add(attendance(1, '2024-01-01'))
+    updated = store.attendance.update(record['id'], {'status': 'Late', 'id': 12345})
+    assert updated['id'] == record['id'] and updated['status'] == 'Late'
+    assert store.attendance.count('status', 'Present') == 0
+    assert store.attendance.count('status', 'Late') == 1
+    assert store.attendance.update(999999, {'status': 'Late'}) is None
+
+    assert store.attendance.delete(record['id'])['status'] == 'Late'
+    assert store.attendance.find('employee_id', 1) == []
+    assert store.attendance.delete(record['id']) is None
+
+
+def test_page_walks_all_records_and_one_key_in_id_order(store):
+    store.attendance.add_many([attendance(day % 3, f"2024-03-{day:02d}") for day in range(1, 26)])
+    ids = []
+    after = None
+    while True:
+        page = store.attendance.page(after=after, limit=7)
+        if not page:
+            break
+        ids += [a['id'] for a in page]
+        after = page[-1]['id']
+    assert ids == [a['id'] for a in store.attendance.all()]
+
+    by_key = store.attendance.page('employee_id', 1, limit=3)
+    assert [a['employee_id'] for a in by_key] == [1, 1, 1]
+    assert by_key == store.attendance.find('employee_id', 1)[:3]
+
+
+def test_find_range_is_inclusive_and_in_key_order(store):
+    store.attendance.add_many([
+        attendance(1, '2024-01-31'),
+        attendance(1, '2024-01-03'),
+        attendance(2, '2024-01-05'),
+        attendance(1, '2024-02-02'),
+        attendance(1, '2024-01-10'),
+    ])
+    dates = [a['date'] for a in store.attendance.find_range('employee_date', '2024-01-03', '2024-01-31', prefix=(1,))]
+    assert dates == ['2024-01-03', '2024-01-10', '2024-01-31']
+    assert [a['date'] for a in store.attendance.find_range('employee_date', start='2024-02-01', prefix=(1,))] == \
+        ['2024-02-02']
+    assert len(store.attendance.find_range('date', end='2024-01-05')) == 2
+    assert len(store.attendance.find_range('date')) == 5
+
+
+def test_listeners_see_every_write(store):
+    seen = []
+    store.attendance.subscribe(lambda action, old, new: seen.append(
+        (action, old and old['status'], new and new['status'])))
+    record = store.attendance.add(attendance(1, '2024-01-01'))
+    store.attendance.update(record['id'], {'status': 'Absent'})
+    store.attendance.delete(record['id'])
+    assert seen == [('add', None, 'Present'), ('update', 'Present', 'Absent'), ('delete', 'Absent', None)]
+
+
+def test_locked_block_makes_read_then_write_atomic(store):
+    with store.attendance.locked():
+        if store.attendance.find_one('employee_date', (1, '2024-01-01')) is None:
+            store.attendance.add(attendance(1, '2024-01-01'))
+    assert store.attendance.count('employee_date', (1, '2024-01-01')) == 1
+
+
+@pytest.mark.parametrize('factory', ['dicts', 'columnar'])
+def test_dump_and_load_round_trip_the_memory_backend(factory):
+    if factory == 'columnar':
+        from columnar import attendance_columns as factory
+    else:
+        factory = Collection
+    source = factory('attendance', **COLLECTIONS['attendance'])
+    source.add_many([attendance(employee_id, f"2024-01-{day:02d}", remarks=f"note {day}")
+                     for employee_id in (1, 2) for day in range(1, 11)])
+    source.delete(3)
+    state, blocks = source.dump()
+    restored = factory('attendance', **COLLECTIONS['attendance'])
+    restored.load(state, blocks)
+    assert restored.all() == source.all()
+    assert restored.find_range('employee_date', '2024-01-02', '2024-01-05', prefix=(2,)) == \
+        source.find_range('employee_date', '2024-01-02', '2024-01-05', prefix=(2,))
+    assert restored.add(attendance(3, '2024-01-01'))['id'] == source.next_id()
+
+
+def test_sqlite_listeners_only_see_committed_writes(tmp_path):
+    from conftest import make_store
+    store = make_store('sqlite', str(tmp_path))
+    seen = []
+    store.attendance.subscribe(lambda action, old, new: seen.append(action))
+    kept = store.attendance.add(attendance(1, '2024-01-01'))
+    batch = [attendance(2, '2024-01-01'), attendance(3, '2024-01-01')]
+    with pytest.raises(RuntimeError):
+        with store.attendance.locked():
+            store.attendance.add_many(batch)
+            store.attendance.update(kept['id'], {'status': 'Absent'})
+            assert seen == ['add']  # nothing is delivered before the commit
+            raise RuntimeError('roll back')
+    assert seen == ['add']
+    assert len(store.attendance) == 1
+    assert store.attendance.get(kept['id'])['status'] == 'Present'
+    assert all('id' not in record for record in batch)
+
+
+def test_sqlite_failed_insert_inside_a_block_only_undoes_itself(tmp_path):
+    from conftest import make_store
+    store = make_store('sqlite', str(tmp_path))
+    existing = store.attendance.add(attendance(1, '2024-01-01'))
+    seen = []
+    store.attendance.subscribe(lambda action, old, new: seen.append(new['employee_id']))
+    batch = [attendance(3, '2024-01-01'), dict(attendance(4, '2024-01-01'), id=existing['id'])]
+    with store.attendance.locked():
+        store.attendance.add(attendance(2, '2024-01-01'))
+        with pytest.raises(KeyError):
+            store.attendance.add_many(batch)
+    assert seen == [2]
+    assert sorted(a['employee_id'] for a in store.attendance.all()) == [1, 2]
+    assert 'id' not in batch[0]
+
+
+def test_columnar_collections_keep_their_own_value_tables(monkeypatch):
+    import columnar
+    monkeypatch.setattr(columnar, 'REMARKS_LIMIT', 3)
+    first = columnar.attendance_columns('attendance', **COLLECTIONS['attendance'])
+    second = columnar.attendance_columns('attendance', **COLLECTIONS['attendance'])
+    first.add_many([attendance(1, f"2024-01-0{day}", remarks=f"note {day}") for day in range(1, 5)])
+    second.add(attendance(2, '2024-02-01', remarks='other'))
+
+    state, _ = second.dump()
+    assert state['values']['remarks'] == ['other']
+    assert state['values']['date'] == [738917]  # 2024-02-01 only
+    # The limit is per collection: the first one's remarks do not use up the second's
+    second.add_many([attendance(2, f"2024-02-0{day}", remarks=f"more {day}") for day in range(2, 4)])
+    assert second.dump()[0]['values']['remarks'] == ['other', 'more 2', 'more 3']
+    assert first.find_one('employee_date', (1, '2024-01-04'))['remarks'] == 'note 4'
@@ -0,0 +1,94 @@
+"""
+WSGI entry point for serving with several worker processes.
+
+    gunicorn -c gunicorn.conf.py               # production: workers and threads from gunicorn.conf.py
+    python wsgi.py --workers 4 --port 8000     # development only: Werkzeug workers on a shared socket
+
+Every worker process imports the application itself (nothing is preloaded
+before the fork), opens its own SQLite connections and runs with
+``HR_SHARED_STATE=1``: writes made by one worker are replayed to the others
+before their next request, and a single elected worker runs background jobs
+and punch consolidation.  See shared_state.py.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+
+def create_app():
+    """Return the Flask application configured for multi-process serving."""
+    if 'app' in sys.modules and not sys.modules['app'].app.config['SHARED_STATE']:
+        raise RuntimeError("app was imported before create_app(); shared state would be disabled")
+    os.environ['HR_SHARED_STATE'] = '1'
+    import app as hr
+    return hr.app
+
+
+# Development fallback for trying multi-process setups without gunicorn.  It
+# has none of gunicorn's worker timeouts, graceful reloads or request
+# hardening; deployments use gunicorn.conf.py.
+
+def run_worker(host, port, fd, threads=True):
+    """Serve requests on an inherited listening socket with the Werkzeug server."""
+    from werkzeug.serving import make_server
+    server = make_server(host, port, create_app(), threaded=threads, fd=fd)
+    server.serve_forever()
+
+
+def serve(host='127.0.0.1', port=8000, workers=2):
+    """Bind once and run ``workers`` processes accepting on the shared socket.
+
+    Workers that exit are restarted until the parent is interrupted or terminated.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    command = [sys.executable, os.path.abspath(__file__), '--host', host, '--port', str(port),
+               '--worker-fd', str(sock.fileno())]
+
+    def spawn():
+        return subprocess.Popen(command, pass_fds=(sock.fileno(),))
+
+    processes = [spawn() for _ in range(workers)]
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    print(f"Serving on http://{host}:{port} with {workers} development workers "
+          f"(use gunicorn -c gunicorn.conf.py in production)", flush=True)
+    try:
+        while not stopping:
+            for i, process in enumerate(processes):
+                if process.poll() is not None:
+                    processes[i] = spawn()
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the HR app with several development worker processes.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--worker-fd', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker_fd is not None:
+        run_worker(args.host, args.port, args.worker_fd)
+    else:
+        serve(args.host, args.port, args.workers)
+
+
+if __name__ == '__main__':
+    main()